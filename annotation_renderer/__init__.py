@@ -0,0 +1 @@
+from .annotation_renderer import AnnotationRenderer, Sprite
\ No newline at end of file
@@ -0,0 +1,239 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import get_center_of_bbox, get_bbox_width, get_foot_position, blend_rectangle
+from instrumentation import instrument
+
+
+class Sprite:
+    """
+    Pre-rendered label: its pixels drawn over black, the coverage of every pixel (255 where the label is
+    opaque, less on anti-aliased text edges) and the position of its top-left corner relative to the anchor
+    point it is drawn at.
+    """
+
+    def __init__(self, pixels, alpha, offset, draw):
+        self.pixels = pixels
+        self.alpha = alpha
+        self.offset = offset
+        self.draw = draw
+        # Weight of the background under every pixel, per channel
+        self.background_weight = cv2.merge([255 - alpha] * 3)
+
+    def paste(self, frame, x, y):
+        # Composite the label onto the frame at the anchor (x, y), clipped to the frame borders
+        x1, y1 = x + self.offset[0], y + self.offset[1]
+        height, width = self.alpha.shape
+        fx1, fy1 = max(x1, 0), max(y1, 0)
+        fx2, fy2 = min(x1 + width, frame.shape[1]), min(y1 + height, frame.shape[0])
+        if fx1 >= fx2 or fy1 >= fy2:
+            return frame
+        if (fx2 - fx1, fy2 - fy1) != (width, height):
+            # OpenCV clips shapes at the frame border slightly differently, so cut labels are drawn directly
+            self.draw(frame, (x, y), False)
+            return frame
+
+        # The label's pixels are already weighted by their coverage, so only the background is weighted here
+        region = frame[fy1:fy2, fx1:fx2]
+        background = cv2.multiply(region, self.background_weight, scale=1 / 255)
+        cv2.add(self.pixels, background, dst=region)
+        return frame
+
+
+def render_sprite(draw, left, top, right, bottom):
+    """
+    Renders a label once so it can be pasted instead of drawn.
+
+    Parameters:
+    - draw (callable): draw(image, origin, mask) draws the label onto image with its anchor at origin; with mask
+      set every shape is drawn in white, which gives the coverage of each pixel.
+    - left, top, right, bottom (int): Extent of the label relative to its anchor (inclusive).
+
+    Returns:
+    - sprite (Sprite): The rendered label.
+    """
+    size = (bottom - top + 1, right - left + 1)
+    origin = (-left, -top)
+    pixels = np.zeros(size + (3,), dtype=np.uint8)
+    alpha = np.zeros(size, dtype=np.uint8)
+    draw(pixels, origin, False)
+    draw(alpha, origin, True)
+    return Sprite(pixels, alpha, (left, top), draw)
+
+
+class AnnotationRenderer:
+    def __init__(self, max_cached_sprites=4096):
+        """
+        Draws all annotations of a frame in a single pass: players, referees and ball, the ball control
+        panel, the camera movement panel and the speed and distance labels.
+
+        Every frame is copied at most once and the panels are blended in their own regions only. Labels
+        that repeat from frame to frame (track ID badges, possession markers and texts such as speeds,
+        which stay constant over a speed window) are rendered once and pasted afterwards. The result is
+        the same as drawing with Tracker.draw_annotations, CameraMovementEstimator.draw_camera_movement
+        and SpeedAndDistance_Estimator.draw_speed_and_distance one after another, up to rounding on the
+        edges of anti-aliased text.
+
+        Parameters:
+        - max_cached_sprites (int): Number of pre-rendered labels kept; the cache starts over when it is full.
+        """
+        self.max_cached_sprites = max_cached_sprites
+        self.sprites = {}
+
+    def get_sprite(self, key, build):
+        # Cached sprite for a key, rendering it on first use
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            if len(self.sprites) >= self.max_cached_sprites:
+                self.sprites.clear()  # Labels repeat over long stretches, so starting over costs little
+            sprite = self.sprites[key] = build()
+        return sprite
+
+    def text_sprite(self, text, font_scale, color, thickness):
+        # Text drawn with cv2.putText, anchored at the text origin (bottom-left corner)
+        def build():
+            (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            pad = thickness + 2
+
+            def draw(image, origin, mask):
+                cv2.putText(image, text, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                            255 if mask else color, thickness)
+            return render_sprite(draw, -pad, -text_height - pad, text_width + pad, baseline + pad)
+        return self.get_sprite(("text", text, font_scale, color, thickness), build)
+
+    def badge_sprite(self, track_id, color):
+        # Track ID badge below a player's ellipse, anchored at the bottom centre of the bounding box
+        def build():
+            text = f"{track_id}"
+            (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+            text_x = -8 if track_id <= 99 else -18  # Same placement as Tracker.draw_ellipse
+            pad = 4
+
+            def draw(image, origin, mask):
+                x, y = origin
+                cv2.rectangle(image, (x - 20, y + 5), (x + 20, y + 25), 255 if mask else color, cv2.FILLED)
+                cv2.putText(image, text, (x + text_x, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                            255 if mask else (0, 0, 0), 2)
+            return render_sprite(draw, min(-20, text_x) - pad, min(5, 20 - text_height) - pad,
+                                 max(20, text_x + text_width) + pad, max(25, 20 + baseline) + pad)
+        return self.get_sprite(("badge", track_id, color), build)
+
+    def triangle_sprite(self, color):
+        # Triangle pointing at the top centre of a bounding box (ball and player with the ball)
+        def build():
+            def draw(image, origin, mask):
+                x, y = origin
+                points = np.array([[x, y], [x - 10, y - 20], [x + 10, y - 20]])
+                cv2.drawContours(image, [points], 0, 255 if mask else color, cv2.FILLED)
+                cv2.drawContours(image, [points], 0, 255 if mask else (0, 0, 0), 2)
+            return render_sprite(draw, -14, -24, 14, 4)
+        return self.get_sprite(("triangle", color), build)
+
+    def draw_ellipse(self, frame, bbox, color, track_id=None):
+        # Ellipse under an object, plus its track ID badge if given
+        y2 = int(bbox[3])
+        x_center, _ = get_center_of_bbox(bbox)
+        width = get_bbox_width(bbox)
+
+        # The ellipse depends on the box size, so it is drawn directly
+        cv2.ellipse(frame, center=(x_center, y2), axes=(int(width), int(0.35 * width)), angle=0.0,
+                    startAngle=-45, endAngle=235, color=color, thickness=2, lineType=cv2.LINE_4)
+        if track_id is not None:
+            self.badge_sprite(track_id, tuple(float(c) for c in color)).paste(frame, x_center, y2)
+
+    def draw_triangle(self, frame, bbox, color):
+        x, _ = get_center_of_bbox(bbox)
+        self.triangle_sprite(color).paste(frame, x, int(bbox[1]))
+
+    def draw_text(self, frame, text, position, font_scale, color, thickness):
+        self.text_sprite(text, font_scale, color, thickness).paste(frame, position[0], position[1])
+
+    @instrument("annotation_renderer.render_frame", frames=1)
+    def render_frame(self, frame, frame_tracks, ball_control, camera_movement=None, copy=True):
+        """
+        Draws every annotation of one frame.
+
+        Parameters:
+        - frame (ndarray): The video frame.
+        - frame_tracks (dict): The "players", "referees" and "ball" tracks of this frame.
+        - ball_control (tuple): Fractions of frames Team A and Team B had ball control so far.
+        - camera_movement (list): Camera movement of this frame; the camera panel is left out when None.
+        - copy (bool): Draw on a copy of the frame; without it the frame is drawn on in place.
+
+        Returns:
+        - frame (ndarray): The annotated frame.
+        """
+        if copy:
+            frame = frame.copy()  # The only copy of the frame
+
+        # Players, with their team colour, track ID badge and a marker if they have the ball
+        for track_id, player in frame_tracks["players"].items():
+            self.draw_ellipse(frame, player["bbox"], player.get("team_color", (0, 255, 0)), track_id)
+            if player.get('has_ball', False):
+                self.draw_triangle(frame, player["bbox"], (0, 0, 255))
+
+        for _, referee in frame_tracks["referees"].items():
+            self.draw_ellipse(frame, referee["bbox"], (255, 0, 0))
+
+        for _, ball in frame_tracks["ball"].items():
+            self.draw_triangle(frame, ball["bbox"], (0, 255, 0))
+
+        # Ball control panel
+        team_1, team_2 = ball_control
+        blend_rectangle(frame, (1050, 0), (1600, 100), (255, 255, 255), 0.9)
+        self.draw_text(frame, f"Team A Ball Control: {team_1 * 100:.2f}%", (1100, 40), 1, (0, 0, 255), 3)
+        self.draw_text(frame, f"Team B Ball Control: {team_2 * 100:.2f}%", (1100, 80), 1, (255, 0, 0), 3)
+
+        # Camera movement panel
+        if camera_movement is not None:
+            x_movement, y_movement = camera_movement
+            blend_rectangle(frame, (400, 0), (950, 100), (255, 255, 255), 0.9)
+            self.draw_text(frame, f"Camera Movement X: {x_movement:.2f}", (450, 40), 1, (0, 0, 255), 3)
+            self.draw_text(frame, f"Camera Movement Y: {y_movement:.2f}", (450, 80), 1, (255, 0, 0), 3)
+
+        # Speed and distance of the players, below their feet
+        for object_type, object_tracks in frame_tracks.items():
+            if object_type == "ball" or object_type == "referees":
+                continue
+            for _, track_info in object_tracks.items():
+                speed = track_info.get('speed', None)
+                distance = track_info.get('distance', None)
+                if speed is None or distance is None:
+                    continue
+                x, y = get_foot_position(track_info['bbox'])
+                self.draw_text(frame, f"{speed:.2f} km/h", (x, y + 40), 0.5, (74, 7, 20), 2)
+                self.draw_text(frame, f"{distance:.2f} m", (x, y + 60), 0.5, (74, 7, 20), 2)
+
+        return frame
+
+    @instrument("annotation_renderer.render", frames="video_frames")
+    def render(self, video_frames, tracks, ball_control, camera_movement_per_frame=None):
+        """
+        Annotates every frame of a video.
+
+        Parameters:
+        - video_frames (list): Video frames; they are not modified.
+        - tracks (dict or TrackStore): Tracks of players, referees and ball.
+        - ball_control (ndarray): Running ball control shares per frame (Tracker.get_ball_control_percentages).
+        - camera_movement_per_frame (list): Optional camera movement per frame.
+
+        Returns:
+        - output_video_frames (list): Annotated copies of the frames.
+        """
+        return list(self.render_frames_stream(video_frames, tracks, ball_control, camera_movement_per_frame))
+
+    def render_frames_stream(self, video_frames, tracks, ball_control, camera_movement_per_frame=None):
+        # Annotate the frames of a video one at a time, e.g. for save_video_stream to encode each frame as it is
+        # drawn; parameters as in render, the frames are not modified
+        for frame_num, frame in enumerate(video_frames):
+            frame_tracks = {obj_type: object_tracks[frame_num] for obj_type, object_tracks in tracks.items()}
+            camera_movement = None if camera_movement_per_frame is None else camera_movement_per_frame[frame_num]
+            yield self.render_frame(frame, frame_tracks, ball_control[frame_num], camera_movement)
+
+    def render_stream(self, packets, copy=True):
+        # Annotate a stream of frame packets with "frame", "tracks", "ball_control" and "camera_movement"
+        for packet in packets:
+            packet["frame"] = self.render_frame(packet["frame"], packet["tracks"], packet["ball_control"],
+                                                packet.get("camera_movement"), copy)
+            yield packet
@@ -1,11 +1,15 @@
 import streamlit as st
 import os
-import subprocess
+import time
+from job_queue import JobQueue, WorkerPool, QUEUED, RUNNING, DONE, FAILED
 
-# Path to your Input and Output folders
-INPUT_FOLDER = "inputs_videos"
-OUTPUT_FOLDER = "output_videos"
-MAIN_FILE = "main.py"
+# Folder holding the job queue and one working directory per analysis
+JOBS_FOLDER = "jobs"
+MODEL_PATH = "models/best.pt"
+# Analyses that can run at the same time; each worker process keeps its own copy of the model loaded
+NUM_WORKERS = int(os.environ.get("NUM_WORKERS", 2))
+# Seconds between status updates while an analysis is running
+POLL_INTERVAL = 2
 
 # Set max upload size to 200 MB
 st.set_option('deprecation.showfileUploaderEncoding', False)
@@ -50,9 +54,20 @@ st.markdown("""
     </div>
     """, unsafe_allow_html=True)
 
-# Initialize session state to track if analysis is complete
-if 'analysis_complete' not in st.session_state:
-    st.session_state.analysis_complete = False
+@st.cache_resource
+def get_job_queue():
+    # One queue and one pool of warm workers for the whole server, shared by every user session
+    job_queue = JobQueue(JOBS_FOLDER)
+    worker_pool = WorkerPool(NUM_WORKERS, JOBS_FOLDER, MODEL_PATH).start()
+    return job_queue, worker_pool
+
+
+job_queue, worker_pool = get_job_queue()
+worker_pool.check()  # Replace workers that died since the last page update
+
+# Jobs submitted in this browser session
+if 'job_ids' not in st.session_state:
+    st.session_state.job_ids = []
 
 # Upload video file with increased text size and rainbow gradient
 st.markdown(
@@ -61,41 +76,37 @@ st.markdown(
 )
 uploaded_file = st.file_uploader("", type=["mp4"], accept_multiple_files=False)
 
-if uploaded_file:
-    # Save the uploaded video to the Input folder
-    with open(os.path.join(INPUT_FOLDER, "video.mp4"), "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    st.success("File uploaded successfully!")
-
-# Create 'Analyze' button to trigger the analysis
-if st.button("Analyze"):
-    # Run the main.py file to perform the analysis
-    try:
-        st.info("Running analysis... This may take a few moments.")
-        subprocess.run(["python", MAIN_FILE], check=True)
-        st.success("Analysis complete! Check the Output folder for results.")
+# Create 'Analyze' button to queue the analysis; the page stays responsive while a worker runs it
+if uploaded_file and st.button("Analyze"):
+    job_id = job_queue.submit(bytes(uploaded_file.getbuffer()), name=uploaded_file.name)
+    st.session_state.job_ids.append(job_id)
+    st.success("File uploaded successfully! The analysis has been queued.")
 
-        # Set analysis as complete in session state
-        st.session_state.analysis_complete = True
-
-    except subprocess.CalledProcessError as e:
-        st.error(f"Error during analysis: {e}")
-
-# Show the 'Show Analysis Video' button only if analysis is complete
-if st.session_state.analysis_complete:
-    if st.button("Show Analysis Video"):
-        output_video_path = os.path.join(OUTPUT_FOLDER, "output_video.mp4")
+# Show the status of every analysis of this session, newest first
+for job in job_queue.jobs(st.session_state.job_ids):
+    st.subheader(job["name"] or job["id"])
+    if job["status"] in (QUEUED, RUNNING):
+        st.progress(float(job["progress"]), text=job["message"])
+    elif job["status"] == FAILED:
+        st.error(f"Error during analysis: {job['error']}")
+    elif job["status"] == DONE:
+        output_video_path = os.path.join(job_queue.output_dir(job), "output_video.mp4")
         if os.path.exists(output_video_path):
             # Display the MP4 video in Streamlit
             st.video(output_video_path)
             # Provide a download button
             with open(output_video_path, "rb") as video_file:
-                video_bytes = video_file.read()
-            st.download_button(
-                label="Download Analysis Video",
-                data=video_bytes,
-                file_name="output_video.mp4",
-                mime="video/mp4"
-            )
+                st.download_button(
+                    label="Download Analysis Video",
+                    data=video_file.read(),
+                    file_name="output_video.mp4",
+                    mime="video/mp4",
+                    key=f"download_{job['id']}"
+                )
         else:
             st.warning("Output video not found!")
+
+# Poll for updates while any analysis of this session is still waiting or running
+if any(job["status"] in (QUEUED, RUNNING) for job in job_queue.jobs(st.session_state.job_ids)):
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
@@ -0,0 +1 @@
+from .ball_tracker import BallTracker
\ No newline at end of file
@@ -0,0 +1,158 @@
+from collections import deque
+import numpy as np
+
+
+class BallTracker:
+    def __init__(self, lookahead=48, gate=9.21, max_misses=6, acceleration_noise=10.0, measurement_noise=2.0):
+        """
+        Online ball tracker: a constant-velocity Kalman filter on the ball centre picks the ball among the
+        ball detections of every frame, and gaps are filled with a bounded lookahead.
+
+        Parameters:
+        - lookahead (int): Frames a gap may be held back waiting for the ball to reappear; longer gaps hold the
+          last known ball. None waits until the end of the clip.
+        - gate (float): Squared Mahalanobis distance a detection may have from the predicted ball
+          (9.21 keeps 99% of the detections of a correctly predicted ball).
+        - max_misses (int): Frames without a detection inside the gate after which the tracker re-acquires
+          the most confident detection wherever it is.
+        - acceleration_noise (float): Standard deviation of the ball's acceleration, in pixels per frame squared.
+        - measurement_noise (float): Standard deviation of a detected ball centre, in pixels.
+        """
+        self.lookahead = lookahead
+        self.gate = gate
+        self.max_misses = max_misses
+        self.acceleration_noise = acceleration_noise
+        self.measurement_noise = measurement_noise
+
+        # Constant-velocity model over one frame, state (x, y, vx, vy); only the centre is measured
+        self.transition = np.array([[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=np.float64)
+        self.observation = np.eye(2, 4)
+        axis_noise = np.array([[0.25, 0.5], [0.5, 1.0]]) * acceleration_noise ** 2
+        self.process_covariance = np.zeros((4, 4))
+        self.process_covariance[np.ix_([0, 2], [0, 2])] = axis_noise
+        self.process_covariance[np.ix_([1, 3], [1, 3])] = axis_noise
+        self.measurement_covariance = np.eye(2) * measurement_noise ** 2
+        self.reset()
+
+    def config(self):
+        # Parameters that change which detection is picked, e.g. for result cache keys
+        return {"gate": self.gate, "max_misses": self.max_misses,
+                "acceleration_noise": self.acceleration_noise, "measurement_noise": self.measurement_noise}
+
+    def reset(self):
+        # Forget the ball, e.g. for a new video or segment
+        self.state = None
+        self.covariance = None
+        self.misses = 0
+
+    def get_state(self):
+        # Snapshot of the filter, e.g. to continue tracking in a later chunk
+        return {"state": None if self.state is None else self.state.copy(),
+                "covariance": None if self.covariance is None else self.covariance.copy(),
+                "misses": self.misses}
+
+    def set_state(self, state):
+        # Restore a snapshot taken with get_state
+        self.state = None if state["state"] is None else state["state"].copy()
+        self.covariance = None if state["covariance"] is None else state["covariance"].copy()
+        self.misses = state["misses"]
+
+    def start(self, center):
+        # Start a new track at a detected centre with an unknown velocity
+        self.state = np.array([center[0], center[1], 0.0, 0.0])
+        self.covariance = np.diag([self.measurement_noise ** 2] * 2 + [(4 * self.acceleration_noise) ** 2] * 2)
+        self.misses = 0
+
+    def update(self, bboxes, confidences=None, frame_step=1):
+        """
+        Advances the filter to the next analysed frame and picks the ball among the frame's ball detections.
+
+        Parameters:
+        - bboxes (np.ndarray): Ball detections of the frame, shape (N, 4); may be empty.
+        - confidences (np.ndarray): Detection confidences, shape (N,); None treats all detections alike.
+        - frame_step (int): Frames since the previously analysed frame, more than 1 when frames were skipped.
+
+        Returns:
+        - bbox (list): Bounding box of the chosen detection, or None when no detection is the ball.
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        confidences = np.ones(len(bboxes)) if confidences is None else np.asarray(confidences, dtype=np.float64)
+        centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+
+        if self.state is None:
+            if len(bboxes) == 0:
+                return None
+            best = int(np.argmax(confidences))
+            self.start(centers[best])
+            return bboxes[best].tolist()
+
+        # Predict the ball frame by frame up to this frame, so skipped frames widen the gate as they should
+        for _ in range(frame_step):
+            self.state = self.transition @ self.state
+            self.covariance = self.transition @ self.covariance @ self.transition.T + self.process_covariance
+
+        if len(bboxes) > 0:
+            # Gate the detections by their Mahalanobis distance to the prediction and take the nearest
+            innovation_covariance = self.observation @ self.covariance @ self.observation.T + self.measurement_covariance
+            residuals = centers - self.observation @ self.state
+            distances = np.einsum('ij,jk,ik->i', residuals, np.linalg.inv(innovation_covariance), residuals)
+            if distances.min() < self.gate:
+                best = int(np.argmin(distances))
+                gain = self.covariance @ self.observation.T @ np.linalg.inv(innovation_covariance)
+                self.state = self.state + gain @ residuals[best]
+                self.covariance = (np.eye(4) - gain @ self.observation) @ self.covariance
+                self.misses = 0
+                return bboxes[best].tolist()
+
+        # No detection fits the prediction; after a while the ball is re-acquired wherever it is detected
+        self.misses += frame_step
+        if self.misses > self.max_misses and len(bboxes) > 0:
+            best = int(np.argmax(confidences))
+            self.start(centers[best])
+            return bboxes[best].tolist()
+        return None
+
+    def fill_gaps_stream(self, ball_bboxes):
+        """
+        Fills the frames without a ball, holding back at most `lookahead` frames.
+
+        A gap that closes within the lookahead is interpolated linearly between the balls around it (before
+        the first ball, the first ball is used). A longer gap, and the end of the clip, hold the last known ball.
+
+        Parameters:
+        - ball_bboxes (iterable): Ball bounding box per frame, None for frames without a ball.
+
+        Yields:
+        - bbox (list): Ball bounding box per frame in input order, None only while no ball has been seen.
+        """
+        last_ball = None  # (frame_num, bbox) of the last frame released with a ball
+        gap = deque()  # Frame numbers of the frames held back without a ball
+
+        for frame_num, bbox in enumerate(ball_bboxes):
+            if bbox is None:
+                gap.append(frame_num)
+                if self.lookahead is not None and len(gap) > self.lookahead:
+                    # The gap outlasts the lookahead; release its oldest frame with the last known ball
+                    held_frame_num = gap.popleft()
+                    if last_ball is not None:
+                        last_ball = (held_frame_num, last_ball[1])
+                        yield list(last_ball[1])
+                    else:
+                        yield None
+                continue
+
+            # The gap ends here: interpolate it as numpy.interp does, or back-fill before the first ball
+            for held_frame_num in gap:
+                if last_ball is None:
+                    yield list(bbox)
+                else:
+                    previous_frame_num, previous_bbox = last_ball
+                    yield [(n - p) / (frame_num - previous_frame_num) * (held_frame_num - previous_frame_num) + p
+                           for p, n in zip(previous_bbox, bbox)]
+            gap.clear()
+            last_ball = (frame_num, bbox)
+            yield bbox
+
+        # The clip ends inside a gap: hold the last known ball
+        for _ in gap:
+            yield None if last_ball is None else list(last_ball[1])
@@ -0,0 +1,22 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from ball_tracker import BallTracker
+
+
+def ball(x, y=300.0):
+    return np.array([[x - 5.0, y - 5.0, x + 5.0, y + 5.0]])
+
+
+def test_skipped_frames_advance_the_prediction():
+    # A ball moving 20 pixels a frame, then seen again 5 frames later
+    tracker = BallTracker()
+    for frame_num in range(10):
+        assert tracker.update(ball(100.0 + 20 * frame_num)) is not None
+
+    skipped = BallTracker()
+    skipped.set_state(tracker.get_state())
+
+    assert tracker.update(ball(100.0 + 20 * 14)) is None  # Predicted one frame ahead, the ball falls outside the gate
+    assert skipped.update(ball(100.0 + 20 * 14), frame_step=5) == ball(100.0 + 20 * 14)[0].tolist()
+    assert skipped.misses == 0
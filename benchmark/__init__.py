@@ -0,0 +1,3 @@
+from .benchmark import run_benchmark, run_suite, StageTimer, DEFAULT_CONFIGS
+from .synthetic_video import generate_synthetic_video, generate_synthetic_frames
+from .stub_detector import StubDetector
\ No newline at end of file
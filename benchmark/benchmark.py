@@ -0,0 +1,177 @@
+import json
+import os
+import platform
+import resource
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video, save_video_stream, get_video_fps
+from trackers import Tracker
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from annotation_renderer import AnnotationRenderer
+from track_store import TrackStore
+from .synthetic_video import generate_synthetic_video
+from .stub_detector import StubDetector
+
+# Clips of the default suite: three broadcast resolutions, plus a longer clip to expose per-frame growth
+DEFAULT_CONFIGS = [
+    {"name": "360p_10s", "width": 640, "height": 360, "num_frames": 250},
+    {"name": "720p_10s", "width": 1280, "height": 720, "num_frames": 250},
+    {"name": "1080p_10s", "width": 1920, "height": 1080, "num_frames": 250},
+    {"name": "720p_40s", "width": 1280, "height": 720, "num_frames": 1000},
+]
+
+
+def peak_rss_mb():
+    # High-water mark of the resident memory of this process (ru_maxrss is in KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
+
+
+class StageTimer:
+    def __init__(self):
+        # Wall time and memory high-water mark of every stage, in the order the stages ran
+        self.stages = {}
+
+    def run(self, name, function, *args, **kwargs):
+        # Run one stage and record its wall time and the memory high-water mark after it
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.stages[name] = {"seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+        return result
+
+    def report(self, num_frames):
+        # Per-stage frames per second and share of the total time
+        total_seconds = sum(stage["seconds"] for stage in self.stages.values())
+        stages = {name: {"seconds": round(stage["seconds"], 4),
+                         "frames_per_second": round(num_frames / stage["seconds"], 2) if stage["seconds"] > 0 else None,
+                         "share": round(stage["seconds"] / total_seconds, 4) if total_seconds > 0 else None,
+                         "peak_rss_mb": stage["peak_rss_mb"]}
+                  for name, stage in self.stages.items()}
+        return {"frames": num_frames,
+                "total_seconds": round(total_seconds, 4),
+                "frames_per_second": round(num_frames / total_seconds, 2) if total_seconds > 0 else None,
+                "peak_rss_mb": peak_rss_mb(),
+                "stages": stages}
+
+
+def run_benchmark(video_path, output_path, detector="stub", model_path='models/best.pt', batch_size=20):
+    """
+    Runs the full analysis of main.main on one video and times every stage.
+
+    Parameters:
+    - video_path (str): Input video, e.g. a synthetic clip from generate_synthetic_video.
+    - output_path (str): Path the annotated video is encoded to.
+    - detector (str): "stub" for the colour-based StubDetector (synthetic clips, no weights needed) or "yolo"
+      for the YOLO model at model_path.
+    - model_path (str): Path to the YOLO model weights.
+    - batch_size (int): Number of frames sent to the detector at once.
+
+    Returns:
+    - report (dict): Frames, total time, frames per second, peak memory and per-stage "seconds",
+      "frames_per_second", "share" of the total time and "peak_rss_mb" (see StageTimer.report).
+    """
+    timer = StageTimer()
+    fps = get_video_fps(video_path)
+
+    frames = timer.run("decode", read_video, video_path)
+
+    tracker = Tracker(model_path, model=StubDetector() if detector == "stub" else None)
+    detections = timer.run("detect", tracker.detect_frames, frames, batch_size)
+
+    def track():
+        tracks = {"players": [], "referees": [], "ball": []}
+        for detection in detections:
+            for obj_type, frame_track in tracker.get_frame_tracks(detection).items():
+                tracks[obj_type].append(frame_track)
+        tracks = TrackStore.from_tracks(tracks)
+        tracker.add_position_to_tracks(tracks)
+        tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+        return tracks
+    tracks = timer.run("track", track)
+
+    def camera_motion():
+        camera_movement_estimator = CameraMovementEstimator(frames[0])
+        camera_movement_per_frame = camera_movement_estimator.get_camera_movement(frames)
+        camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+        return camera_movement_per_frame
+    camera_movement_per_frame = timer.run("camera_motion", camera_motion)
+
+    timer.run("homography", ViewTransformer().add_transformed_position_to_tracks, tracks)
+
+    timer.run("speed_and_distance",
+              SpeedAndDistance_Estimator(frame_rate=fps).add_speed_and_distance_to_tracks, tracks)
+
+    def team_assignment():
+        team_assigner = TeamAssigner(temporal=True)
+        team_assigner.assign_team_color(frames[0], tracks['players'][0])
+        team_assigner.add_team_to_tracks(frames, tracks)
+    timer.run("team_assignment", team_assignment)
+
+    def possession():
+        player_assigner = PlayerBallAssigner()
+        _, assigned_teams = player_assigner.assign_ball_to_tracks(tracks)
+        return player_assigner.get_team_ball_control(assigned_teams)
+    team_ball_control = timer.run("possession", possession)
+
+    # Frames are encoded as they are drawn, as in main.main, so rendering and encoding are one stage
+    output_video_frames = AnnotationRenderer().render_frames_stream(
+        frames, tracks, tracker.get_ball_control_percentages(team_ball_control), camera_movement_per_frame)
+    timer.run("render_and_encode", save_video_stream, output_video_frames, output_path, fps)
+
+    report = timer.report(len(frames))
+    report["video"] = {"path": video_path, "width": frames[0].shape[1] if frames else 0,
+                       "height": frames[0].shape[0] if frames else 0, "fps": fps}
+    report["detector"] = detector
+    return report
+
+
+def run_suite(output_dir='benchmarks', configs=None, detector="stub", model_path='models/best.pt', batch_size=20):
+    """
+    Benchmarks the pipeline on synthetic clips and writes the results to <output_dir>/report.json.
+
+    The clips are generated on first use and kept in <output_dir>/videos, so later runs measure the same
+    input. Every clip is analysed in a fresh process, so the peak memory of one run does not carry over
+    into the next.
+
+    Parameters:
+    - output_dir (str): Directory for the clips, the annotated videos and the report.
+    - configs (list): Clip settings ("name", "width", "height", "num_frames", optional "fps" and "seed");
+      DEFAULT_CONFIGS by default.
+    - detector (str): "stub" or "yolo", see run_benchmark.
+    - model_path (str): Path to the YOLO model weights.
+    - batch_size (int): Number of frames sent to the detector at once.
+
+    Returns:
+    - report (dict): Environment information and the run_benchmark report of every clip.
+    """
+    configs = DEFAULT_CONFIGS if configs is None else configs
+    os.makedirs(os.path.join(output_dir, 'videos'), exist_ok=True)
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "numpy": np.__version__, "opencv": cv2.__version__},
+        "runs": {},
+    }
+    for config in configs:
+        video_path = os.path.join(output_dir, 'videos', f"{config['name']}.mp4")
+        if not os.path.exists(video_path):
+            generate_synthetic_video(video_path, config["width"], config["height"], config["num_frames"],
+                                     config.get("fps", 25), seed=config.get("seed", 0))
+
+        output_path = os.path.join(output_dir, f"{config['name']}_output.mp4")
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            report["runs"][config["name"]] = executor.submit(run_benchmark, video_path, output_path, detector,
+                                                             model_path, batch_size).result()
+
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
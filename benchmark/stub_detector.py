@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from trackers.detection_result import DetectionResult
+from result_cache import make_key
+from .synthetic_video import TEAM_SHIRT_COLORS, REFEREE_SHIRT_COLOR, HEAD_END, SHIRT_END
+
+# Class names of the football model
+CLASS_NAMES = {0: 'ball', 1: 'goalkeeper', 2: 'player', 3: 'referee'}
+
+
+class StubDetector:
+    def __init__(self, min_saturation=110, min_value=70):
+        """
+        Stand-in for the YOLO model on synthetic clips (see generate_synthetic_video): finds players, referees and
+        the ball by their colours, so benchmarks run on any CPU without model weights or a network connection.
+
+        Players and referees are found by their shirts and their boxes are extended to the whole person; the ball
+        is a small, round, white blob (so it is missed while it touches a pitch line, like a real detector
+        sometimes misses it).
+
+        Parameters:
+        - min_saturation (int): Smallest HSV saturation of a shirt pixel.
+        - min_value (int): Smallest HSV value of a shirt pixel.
+        """
+        self.min_saturation = min_saturation
+        self.min_value = min_value
+        hues = cv2.cvtColor(np.array([TEAM_SHIRT_COLORS + [REFEREE_SHIRT_COLOR]], dtype=np.uint8), cv2.COLOR_BGR2HSV)[0, :, 0]
+        # (class ID, shirt hue) of every kind of person
+        self.shirts = [(2, int(hues[0])), (2, int(hues[1])), (3, int(hues[2]))]
+
+    def fingerprint(self):
+        # Identifies the detector's settings for result cache keys, in place of a weights file
+        return make_key(detector="StubDetector", min_saturation=self.min_saturation, min_value=self.min_value)
+
+    def detect(self, frame, scale=1.0):
+        # Detect the objects of one frame; with a scale below 1 the frame is searched at a lower resolution
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        # Shirts are about 0.14 * height² for people 9% of the frame high; smaller blobs are colour bleeding
+        min_area = max(int((frame.shape[0] * 0.09) ** 2 * 0.03), 4)
+
+        boxes, confidences, class_ids = [], [], []
+        for class_id, shirt_hue in self.shirts:
+            # Shirt pixels: within 8 of the shirt's hue (hue wraps around at 180 in OpenCV) and saturated
+            mask = None
+            for low_hue, high_hue in ((shirt_hue - 8, shirt_hue + 8), (shirt_hue + 172, shirt_hue + 188), (shirt_hue - 188, shirt_hue - 172)):
+                if high_hue < 0 or low_hue > 179:
+                    continue
+                in_range = cv2.inRange(hsv, (max(low_hue, 0), self.min_saturation, self.min_value), (min(high_hue, 179), 255, 255))
+                mask = in_range if mask is None else cv2.bitwise_or(mask, in_range)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for contour in contours:
+                if cv2.contourArea(contour) < min_area:
+                    continue
+                x, y, w, h = cv2.boundingRect(contour)
+                # The shirt covers HEAD_END to SHIRT_END of the person's height
+                person_height = h / (SHIRT_END - HEAD_END)
+                top = y - person_height * HEAD_END
+                boxes.append([x, top, x + w, top + person_height])
+                confidences.append(0.9)
+                class_ids.append(class_id)
+
+        # The ball: a small white blob that roughly fills a square
+        white = cv2.inRange(hsv, (0, 0, 201), (179, 49, 255))
+        contours, _ = cv2.findContours(white, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        max_size = max(frame.shape[0] * 0.03, 6)
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            # The area inside the contour of a filled disc is at least 0.4 of its bounding square, even when small
+            if w <= max_size and h <= max_size and 0.5 <= w / h <= 2.0 and cv2.contourArea(contour) >= 0.4 * w * h:
+                boxes.append([x, y, x + w, y + h])
+                confidences.append(0.6)
+                class_ids.append(0)
+
+        xyxy = np.array(boxes, dtype=np.float32).reshape(-1, 4) / scale
+        return DetectionResult(xyxy, np.array(confidences, dtype=np.float32), np.array(class_ids, dtype=np.float32),
+                               CLASS_NAMES)
+
+    def predict(self, frames, conf=0.25, imgsz=None, **kwargs):
+        # Same call as YOLO.predict on a list of frames; imgsz lowers the resolution like it does for YOLO
+        results = []
+        for frame in frames:
+            scale = 1.0 if imgsz is None else min(imgsz / max(frame.shape[:2]), 1.0)
+            result = self.detect(frame, scale)
+            keep = result.boxes.conf.values >= conf
+            results.append(DetectionResult(result.boxes.xyxy.values[keep], result.boxes.conf.values[keep],
+                                           result.boxes.cls.values[keep], CLASS_NAMES))
+        return results
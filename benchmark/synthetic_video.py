@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import save_video_stream
+
+# Colours (BGR) of the synthetic clips; the stub detector finds objects by these colours
+TEAM_SHIRT_COLORS = [(0, 0, 210), (200, 90, 0)]  # Red and blue shirts
+REFEREE_SHIRT_COLOR = (0, 215, 235)  # Yellow
+SKIN_COLOR = (120, 160, 205)
+SHORTS_COLOR = (30, 30, 30)
+BALL_COLOR = (255, 255, 255)
+
+# Vertical layout of a player, as fractions of its height: head, shirt, then shorts and legs
+HEAD_END = 0.2
+SHIRT_END = 0.6
+
+
+def draw_pitch(width, height, rng):
+    # Grass with mowing stripes, a little texture for optical flow to lock on to, and white lines
+    pitch = np.empty((height, width, 3), dtype=np.uint8)
+    stripe_width = max(width // 24, 1)
+    stripes = (np.arange(width) // stripe_width) % 2
+    pitch[:] = np.where(stripes[None, :, None] == 0, np.array([40, 140, 50], np.uint8), np.array([45, 155, 60], np.uint8))
+    texture = rng.normal(0, 6, (height // 4 + 1, width // 4 + 1, 1))
+    texture = cv2.resize(texture, (width, height), interpolation=cv2.INTER_LINEAR)[:, :, None]
+    pitch = np.clip(pitch + texture, 0, 255).astype(np.uint8)
+
+    line_thickness = max(height // 240, 2)
+    top, bottom = int(height * 0.12), int(height * 0.98)
+    left, right = int(width * 0.02), int(width * 0.98)
+    cv2.rectangle(pitch, (left, top), (right, bottom), BALL_COLOR, line_thickness)
+    cv2.line(pitch, (width // 2, top), (width // 2, bottom), BALL_COLOR, line_thickness)
+    cv2.circle(pitch, (width // 2, (top + bottom) // 2), int(height * 0.15), BALL_COLOR, line_thickness)
+    box_height = int((bottom - top) * 0.55)
+    for x, direction in ((left, 1), (right, -1)):
+        box_top = (top + bottom - box_height) // 2
+        cv2.rectangle(pitch, (x, box_top), (x + direction * int(width * 0.08), box_top + box_height), BALL_COLOR, line_thickness)
+    return pitch
+
+
+def draw_person(frame, foot, person_height, shirt_color):
+    # A person standing on its foot position: skin-coloured head, shirt, dark shorts and legs
+    x, y = int(foot[0]), int(foot[1])
+    half_width = max(int(person_height * 0.18), 2)
+    top = y - person_height
+    head_radius = max(int(person_height * HEAD_END / 2), 1)
+    cv2.circle(frame, (x, top + head_radius), head_radius, SKIN_COLOR, cv2.FILLED)
+    cv2.rectangle(frame, (x - half_width, top + int(person_height * HEAD_END)),
+                  (x + half_width, top + int(person_height * SHIRT_END)), shirt_color, cv2.FILLED)
+    cv2.rectangle(frame, (x - half_width + 1, top + int(person_height * SHIRT_END) + 1), (x + half_width - 1, y),
+                  SHORTS_COLOR, cv2.FILLED)
+
+
+def generate_synthetic_frames(width=1280, height=720, num_frames=250, fps=25, num_players=22, num_referees=1,
+                              pan_seconds=8.0, seed=0):
+    """
+    Generates the frames of a synthetic broadcast clip: two teams of coloured players and a referee running
+    around a striped pitch, a ball passed between players, and a camera panning left and right.
+
+    Parameters:
+    - width, height (int): Frame size.
+    - num_frames (int): Length of the clip.
+    - fps (float): Frame rate the motion is generated for.
+    - num_players (int): Players of both teams together.
+    - num_referees (int): Referees.
+    - pan_seconds (float): Duration of one left-right-left camera pan.
+    - seed (int): Seed of the random motion, so a configuration always gives the same clip.
+
+    Yields:
+    - frame (ndarray): BGR frame.
+    """
+    rng = np.random.default_rng(seed)
+    pitch_width = int(width * 1.6)
+    pitch = draw_pitch(pitch_width, height, rng)
+
+    # People move with a random acceleration, up to a sprint of about a fifth of the frame height per second
+    num_people = num_players + num_referees
+    person_height = max(int(height * 0.09), 12)
+    low = np.array([pitch_width * 0.03, height * 0.2 + person_height])
+    high = np.array([pitch_width * 0.97, height * 0.97])
+    positions = rng.uniform(low, high, (num_people, 2))
+    velocities = rng.normal(0, height * 0.05, (num_people, 2))
+    max_speed = height * 0.2
+    shirt_colors = [TEAM_SHIRT_COLORS[i % 2] for i in range(num_players)] + [REFEREE_SHIRT_COLOR] * num_referees
+
+    # The ball is passed to a new player every couple of seconds
+    ball_radius = max(int(height * 0.007), 3)
+    ball = positions[0].copy()
+    receiver = 0
+    pass_frames = max(int(fps * 2), 1)
+
+    for frame_num in range(num_frames):
+        velocities += rng.normal(0, height * 0.02, velocities.shape)
+        speeds = np.linalg.norm(velocities, axis=1, keepdims=True)
+        velocities *= np.minimum(1.0, max_speed / np.maximum(speeds, 1e-6))
+        positions += velocities / fps
+        # Bounce off the edges of the pitch
+        outside = (positions < low) | (positions > high)
+        velocities[outside] *= -1
+        positions = np.clip(positions, low, high)
+
+        if frame_num % pass_frames == 0:
+            receiver = int(rng.integers(num_players))
+        target = positions[receiver] + [person_height * 0.25, -ball_radius]
+        ball += (target - ball) * min(1.0, 4.0 / fps)
+
+        # Camera pan: the visible window slides smoothly over the wider pitch
+        camera_x = int((pitch_width - width) * 0.5 * (1 - np.cos(2 * np.pi * frame_num / (pan_seconds * fps))))
+        frame = pitch[:, camera_x:camera_x + width].copy()
+
+        # Draw from the back of the pitch to the front, so nearer people overlap farther ones
+        for person in np.argsort(positions[:, 1]):
+            draw_person(frame, positions[person] - [camera_x, 0], person_height, shirt_colors[person])
+        cv2.circle(frame, (int(ball[0]) - camera_x, int(ball[1])), ball_radius, BALL_COLOR, cv2.FILLED)
+        yield frame
+
+
+def generate_synthetic_video(output_path, width=1280, height=720, num_frames=250, fps=25, **kwargs):
+    """
+    Writes a synthetic broadcast clip (see generate_synthetic_frames) to a video file.
+
+    Returns:
+    - num_frames (int): Number of frames written.
+    """
+    frames = generate_synthetic_frames(width, height, num_frames, fps, **kwargs)
+    return save_video_stream(frames, output_path, fps=fps)
@@ -1,16 +1,38 @@
+import hashlib
 import pickle
 import cv2
 import numpy as np
 import os
+import time
 import sys
 sys.path.append('../') 
-from utils import measure_distance, measure_xy_distance  
+from utils import blend_rectangle
+from track_store import TrackStore
+from result_cache import make_key
+from instrumentation import instrument
 
 class CameraMovementEstimator():
 
-    def __init__(self, frame):
+    def __init__(self, frame, method='median', scale=0.5, inlier_threshold=1.0):
+        """
+        Estimates the camera movement between consecutive frames from Lucas-Kanade optical flow of
+        corner features near the touchlines.
+
+        Parameters:
+        - frame (np.ndarray): First frame of the video; sets the frame size.
+        - method (str): How the movement is fitted to the feature displacements: 'median' (per-axis median),
+          'ransac' (RANSAC partial affine model, the movement being the mean displacement of its inliers)
+          or 'max' (the displacement of the feature that moved most, as in earlier versions).
+        - scale (float): Scale of the grey frames the features are tracked on; movement is reported in pixels
+          of the full frame.
+        - inlier_threshold (float): Distance in full-frame pixels within which a displacement agrees with the model.
+        """
         # Initialize the class with the first video frame and setup necessary parameters
         self.minimum_distance = 5  # Minimum movement threshold for considering camera movement
+        self.method = method
+        self.scale = scale
+        self.inlier_threshold = inlier_threshold
+        self.min_tracked_features = 10  # Features are detected again when fewer are still tracked
 
         # Parameters for the Lucas-Kanade optical flow algorithm
         self.lk_params = dict(
@@ -19,13 +41,18 @@ class CameraMovementEstimator():
             criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)  # Criteria for termination
         )
 
-        # Convert the first frame to grayscale
-        first_frame_grayscale = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
+        # Column bands where features are detected, as fractions of the frame width
+        # (the left edge and the band around x = 900..1050 of a 1920 pixel wide frame)
+        self.mask_columns = [(0.0, 20 / 1920), (900 / 1920, 1050 / 1920)]
+
+        # Grey frames are tracked at the reduced scale
+        frame_height, frame_width = frame.shape[:2]
+        self.gray_size = (max(int(round(frame_width * scale)), 1), max(int(round(frame_height * scale)), 1))
+
         # Create a mask to limit the area where feature points are detected
-        mask_features = np.zeros_like(first_frame_grayscale)
-        mask_features[:, 0:20] = 1  # Mark the left side of the frame for tracking
-        mask_features[:, 900:1050] = 1  # Mark the right side of the frame for tracking
+        mask_features = np.zeros((self.gray_size[1], self.gray_size[0]), dtype=np.uint8)
+        for start, end in self.mask_columns:
+            mask_features[:, int(start * self.gray_size[0]):int(end * self.gray_size[0])] = 1
 
         # Parameters for detecting good features to track (corners)
         self.features = dict(
@@ -36,92 +63,214 @@ class CameraMovementEstimator():
             mask=mask_features  # Use the custom mask for corner detection
         )
 
+        # State carried from one frame to the next while estimating movement
+        self.reset()
+
+    @instrument("camera_movement.add_adjust_positions_to_tracks", frames="tracks")
     def add_adjust_positions_to_tracks(self, tracks, camera_movement_per_frame):
-        # Adjust the object positions in the tracks according to the camera movement
+        # Adjust the object positions in the tracks according to the camera movement,
+        # subtracting the movement from all positions of a frame (or the whole clip) at once
+        camera_movement_per_frame = np.asarray(camera_movement_per_frame, dtype=np.float32).reshape(-1, 2)
         for object, object_tracks in tracks.items():
+            if isinstance(tracks, TrackStore):
+                # Columnar tracks: look up the movement of every row's frame and subtract in one step
+                camera_movement = camera_movement_per_frame[object_tracks.frames[:object_tracks.size]]
+                object_tracks.set_column('position_adjusted', object_tracks.column('position') - camera_movement)
+                continue
+
             for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    position = track_info['position']
-                    camera_movement = camera_movement_per_frame[frame_num]
-                    # Adjust the position of the object based on the camera movement
-                    position_adjusted = (position[0] - camera_movement[0], position[1] - camera_movement[1])
-                    tracks[object][frame_num][track_id]['position_adjusted'] = position_adjusted
-                    
-    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None):
-        # If a saved result (stub) is available, load it to avoid recomputing
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
-            with open(stub_path, 'rb') as f:
-                return pickle.load(f)
+                if not track:
+                    continue
+                positions = np.array([track_info['position'] for track_info in track.values()], dtype=np.float32)
+                # Adjust the position of every object in the frame based on the camera movement
+                positions_adjusted = (positions - camera_movement_per_frame[frame_num]).tolist()
+                for track_info, position_adjusted in zip(track.values(), positions_adjusted):
+                    track_info['position_adjusted'] = tuple(position_adjusted)
+
+    def reset(self):
+        # Forget the previous frame so the next frame starts a new motion sequence
+        self.old_gray = None
+        self.old_features = None
+        # Per-frame inlier ratios and the time spent estimating, see report()
+        self.inlier_ratios = []
+        self.estimation_seconds = 0.0
 
-        # Initialize camera movement for each frame
-        camera_movement = [[0, 0]] * len(frames)
+    def get_state(self):
+        # Snapshot of the state carried between frames, e.g. to continue estimation in a later chunk
+        return {"old_gray": self.old_gray, "old_features": self.old_features}
 
-        # Convert the first frame to grayscale and detect good features to track
-        old_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray, **self.features)
+    def set_state(self, state):
+        # Restore a snapshot taken with get_state
+        self.old_gray = state["old_gray"]
+        self.old_features = state["old_features"]
 
-        # Loop through the remaining frames
-        for frame_num in range(1, len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num], cv2.COLOR_BGR2GRAY)  # Convert current frame to grayscale
-            # Calculate optical flow to get the new positions of the tracked features
-            new_features, _, _ = cv2.calcOpticalFlowPyrLK(old_gray, frame_gray, old_features, None, **self.lk_params)
+    def report(self):
+        # Throughput and fit quality of the frames estimated since the last reset
+        frames = len(self.inlier_ratios)
+        return {
+            "frames": frames,
+            "seconds": round(self.estimation_seconds, 4),
+            "frames_per_second": round(frames / self.estimation_seconds, 2) if self.estimation_seconds > 0 else None,
+            "mean_inlier_ratio": round(float(np.mean(self.inlier_ratios)), 4) if frames else None,
+        }
 
-            max_distance = 0  # Initialize maximum distance
-            camera_movement_x, camera_movement_y = 0, 0  # Initialize camera movement
+    def to_gray(self, frame):
+        # Grey frame at the tracking scale; grey frames (e.g. from a FrameCache) are used as they are
+        frame_gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.gray_size != (frame_gray.shape[1], frame_gray.shape[0]):
+            frame_gray = cv2.resize(frame_gray, self.gray_size, interpolation=cv2.INTER_AREA)
+        return frame_gray
 
-            # Compare the old and new feature positions to estimate camera movement
-            for i, (new, old) in enumerate(zip(new_features, old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
+    def fit_movement(self, old_points, new_points):
+        # Fit the camera movement (old minus new position, in full-frame pixels) to the displacements of all
+        # features at once; returns the movement and the share of displacements that agree with it
+        displacements = (old_points - new_points) / self.scale
 
-                # Measure the distance between old and new feature points
-                distance = measure_distance(new_features_point, old_features_point)
-                if distance > max_distance:
-                    max_distance = distance  # Update maximum distance
-                    # Measure the X and Y distances between feature points
-                    camera_movement_x, camera_movement_y = measure_xy_distance(old_features_point, new_features_point)
+        if self.method == 'max':
+            # The displacement of the feature that moved most
+            distances = np.linalg.norm(displacements, axis=1)
+            movement = displacements[np.argmax(distances)]
+            inliers = np.linalg.norm(displacements - movement, axis=1) <= self.inlier_threshold
+        elif self.method == 'ransac' and len(displacements) >= 3:
+            # Partial affine model (translation, rotation, zoom) fitted with RANSAC; only its inliers are averaged
+            _, inliers = cv2.estimateAffinePartial2D(old_points, new_points, method=cv2.RANSAC,
+                                                     ransacReprojThreshold=self.inlier_threshold * self.scale)
+            inliers = inliers.ravel().astype(bool) if inliers is not None else np.zeros(len(displacements), dtype=bool)
+            movement = displacements[inliers].mean(axis=0) if inliers.any() else np.median(displacements, axis=0)
+        else:
+            # Per-axis median, robust to the players and the ball moving through the feature bands
+            # (also used by 'ransac' when there are too few features for a model)
+            movement = np.median(displacements, axis=0)
+            inliers = np.linalg.norm(displacements - movement, axis=1) <= self.inlier_threshold
 
+        return movement, float(inliers.mean())
+
+    @instrument("camera_movement.estimate_frame_movement", frames=1)
+    def estimate_frame_movement(self, frame):
+        # Estimate the camera movement between the previously seen frame and this one
+        start = time.perf_counter()
+        frame_gray = self.to_gray(frame)  # Grey, downscaled current frame
+
+        # The first frame of a sequence has no movement; detect good features to track on it
+        if self.old_gray is None or self.old_features is None or len(self.old_features) == 0:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+            self.inlier_ratios.append(1.0)
+            self.estimation_seconds += time.perf_counter() - start
+            return [0, 0]
+
+        # Calculate optical flow to get the new positions of the tracked features
+        new_features, status, _ = cv2.calcOpticalFlowPyrLK(self.old_gray, frame_gray, self.old_features, None, **self.lk_params)
+
+        # Features the flow lost are left out, except by the 'max' method which always used every feature
+        tracked = status.ravel() == 1 if self.method != 'max' else np.ones(len(new_features), dtype=bool)
+        camera_movement = [0, 0]
+        inlier_ratio = 0.0
+        redetect = tracked.sum() < self.min_tracked_features
+
+        if tracked.any():
+            movement, inlier_ratio = self.fit_movement(self.old_features.reshape(-1, 2)[tracked],
+                                                       new_features.reshape(-1, 2)[tracked])
             # If the movement exceeds the minimum distance threshold, update the camera movement for this frame
-            if max_distance > self.minimum_distance:
-                camera_movement[frame_num] = [camera_movement_x, camera_movement_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)  # Detect new features
+            if np.hypot(movement[0], movement[1]) > self.minimum_distance:
+                camera_movement = [float(movement[0]), float(movement[1])]
+                redetect = True
+
+        if redetect:
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)  # Detect new features
+
+        self.old_gray = frame_gray  # Update the previous frame for the next iteration
+        self.inlier_ratios.append(inlier_ratio)
+        self.estimation_seconds += time.perf_counter() - start
+        return camera_movement
+
+    def get_camera_movement_stream(self, packets):
+        # Estimate camera movement over a stream of frame packets, one frame at a time
+        self.reset()
+        for packet in packets:
+            packet["camera_movement"] = self.estimate_frame_movement(packet["frame"])
+            yield packet
 
-            old_gray = frame_gray.copy()  # Update the previous frame for the next iteration
+    def config(self):
+        # Every estimation parameter, including a digest of the feature mask, e.g. for result cache keys
+        features = {name: value for name, value in self.features.items() if name != 'mask'}
+        mask = self.features['mask']
+        return {"minimum_distance": self.minimum_distance,
+                "method": self.method,
+                "scale": self.scale,
+                "inlier_threshold": self.inlier_threshold,
+                "min_tracked_features": self.min_tracked_features,
+                "lk_params": self.lk_params,
+                "features": features,
+                "mask": [mask.shape, hashlib.sha256(np.ascontiguousarray(mask).tobytes()).hexdigest()]}
+
+    def cache_key(self, cache, video_path):
+        # Result cache key of the camera movement stage: the video contents plus every estimation parameter
+        return make_key(stage="camera_movement", video=cache.fingerprint(video_path), **self.config())
+
+    @instrument("camera_movement.get_camera_movement", frames="frames")
+    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None, cache=None, video_path=None):
+        # If a saved result (stub) is available, load it to avoid recomputing
+        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
+            with open(stub_path, 'rb') as f:
+                return pickle.load(f)
+
+        # Check if the movement of this exact video and these parameters is cached
+        if cache is not None and video_path is not None:
+            key = self.cache_key(cache, video_path)
+            camera_movement = cache.get("camera_movement", key)
+            if camera_movement is not None:
+                return camera_movement
+
+        # Estimate the camera movement for each frame
+        self.reset()
+        camera_movement = [self.estimate_frame_movement(frame) for frame in frames]
 
         # Save the camera movement to a stub if a path is provided
         if stub_path is not None:
             with open(stub_path, 'wb') as f:
                 pickle.dump(camera_movement, f)
 
+        # Optionally store the camera movement in the result cache
+        if cache is not None and video_path is not None:
+            cache.put("camera_movement", key, camera_movement)
+
         return camera_movement
 
-    def draw_camera_movement(self, frames, camera_movement_per_frame):
-          # Overlay camera movement annotations on each frame
-          output_frames = []
+    def draw_frame_camera_movement(self, frame, camera_movement):
+        # Draw the camera movement panel on a single frame
+        # Blend a white background for the text into the panel area only
+        alpha = 0.9   # Higher alpha for a more opaque white background
+        blend_rectangle(frame, (400, 0), (950, 100), (255, 255, 255), alpha)
 
-          for frame_num, frame in enumerate(frames):
-              frame = frame.copy()  # Make a copy of the current frame
+        # Get the camera movement for the current frame
+        x_movement, y_movement = camera_movement
 
-              # Create an overlay rectangle for the text
-              overlay = frame.copy()
-              cv2.rectangle(overlay, (400, 0), (950, 100), (255, 255, 255), -1)  # White background for text
-              alpha = 0.9   # Higher alpha for a more opaque white background
-              cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)  # Apply the overlay
+        # Annotate the X movement in red (RGB: (255, 0, 0) => BGR: (0, 0, 255))
+        frame = cv2.putText(frame, f"Camera Movement X: {x_movement:.2f}", 
+                      (450, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, 
+                      (0, 0, 255), 3)  # Red text for X movement
 
-              # Get the camera movement for the current frame
-              x_movement, y_movement = camera_movement_per_frame[frame_num]
+        # Annotate the Y movement in green (RGB: (0, 255, 0) => BGR: (0, 255, 0))
+        frame = cv2.putText(frame, f"Camera Movement Y: {y_movement:.2f}", 
+                      (450, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, 
+                      (255, 0, 0), 3)  # Blue text for Y movement
 
-              # Annotate the X movement in red (RGB: (255, 0, 0) => BGR: (0, 0, 255))
-              frame = cv2.putText(frame, f"Camera Movement X: {x_movement:.2f}", 
-                            (450, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, 
-                            (0, 0, 255), 3)  # Red text for X movement
+        return frame
 
-              # Annotate the Y movement in green (RGB: (0, 255, 0) => BGR: (0, 255, 0))
-              frame = cv2.putText(frame, f"Camera Movement Y: {y_movement:.2f}", 
-                            (450, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, 
-                            (255, 0, 0), 3)  # Blue text for Y movement
+    def draw_camera_movement(self, frames, camera_movement_per_frame):
+          # Overlay camera movement annotations on each frame
+          output_frames = []
 
+          for frame_num, frame in enumerate(frames):
+              frame = frame.copy()  # Make a copy of the current frame
+              frame = self.draw_frame_camera_movement(frame, camera_movement_per_frame[frame_num])
               output_frames.append(frame)  # Add the annotated frame to the output list
 
           return output_frames  # Return the list of annotated frames
 
+    def draw_camera_movement_stream(self, packets):
+        # Overlay camera movement annotations on a stream of frame packets, drawing in place
+        for packet in packets:
+            packet["frame"] = self.draw_frame_camera_movement(packet["frame"], packet["camera_movement"])
+            yield packet
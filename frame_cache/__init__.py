@@ -0,0 +1 @@
+from .frame_cache import FrameCache
\ No newline at end of file
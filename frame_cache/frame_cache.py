@@ -0,0 +1,204 @@
+import json
+import os
+import time
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video_stream, get_video_frame_count
+from result_cache import ResultCache, make_key
+
+
+class FrameCache:
+    def __init__(self, cache_dir='cache/frames', max_bytes=16 * 1024 ** 3, result_cache=None):
+        """
+        On-disk cache of decoded video frames, memory-mapped so that repeated passes over a video get
+        zero-copy random access instead of decoding the video again.
+
+        Every variant of a video (colour or greyscale, full size or downscaled) is one raw uint8 file with a
+        JSON sidecar holding its shape; the sidecar is written last and marks the entry as complete. The least
+        recently used entries are removed once the cache would grow beyond max_bytes, and videos that alone
+        exceed it are not cached. Temporary files of writes in progress count towards the limit; those not
+        written to for stale_seconds are leftovers of interrupted writes and are removed.
+
+        Parameters:
+        - cache_dir (str): Directory holding the cache.
+        - max_bytes (int): Size limit of all entries together.
+        - result_cache (ResultCache): Result cache whose memoised video fingerprints are shared; by default one
+          is kept in cache_dir.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # A temporary file not written to for this long belongs to a write that was interrupted
+        self.stale_seconds = 600
+        os.makedirs(cache_dir, exist_ok=True)
+        # The result cache is only used for its memoised video fingerprints
+        self.result_cache = ResultCache(cache_dir) if result_cache is None else result_cache
+
+    def entry_paths(self, video_path, gray=False, scale=1.0):
+        # Paths of the frame data and the sidecar of one variant of a video
+        key = make_key(stage="frames", video=self.result_cache.fingerprint(video_path), gray=gray, scale=scale)
+        base = os.path.join(self.cache_dir, key)
+        return base + '.frames', base + '.json'
+
+    def convert(self, frame, gray, scale):
+        # Bring a decoded frame into the cached variant
+        if gray:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale != 1.0:
+            # Same size rounding as CameraMovementEstimator, so it can use the cached frames as they are
+            size = (max(int(round(frame.shape[1] * scale)), 1), max(int(round(frame.shape[0] * scale)), 1))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def get(self, video_path, gray=False, scale=1.0):
+        """
+        Returns the cached frames of a video, or None if they are not cached.
+
+        Returns:
+        - frames (np.memmap): Read-only array of shape (frames, height, width[, 3]).
+        """
+        data_path, meta_path = self.entry_paths(video_path, gray, scale)
+        # Workers share the cache, so an entry may be evicted by another one at any point; that is a miss
+        try:
+            with open(meta_path, 'r') as f:
+                shape = tuple(json.load(f)["shape"])
+            os.utime(meta_path)  # Mark the entry as recently used
+            if shape[0] == 0:
+                return np.zeros(shape, dtype=np.uint8)
+            # Once mapped, the frames stay readable even if the entry is removed afterwards
+            return np.memmap(data_path, dtype=np.uint8, mode='r', shape=shape)
+        except FileNotFoundError:
+            return None
+
+    def get_or_create(self, video_path, gray=False, scale=1.0, frames=None):
+        """
+        Returns the cached frames of a video, decoding and caching them first if needed.
+
+        Parameters:
+        - video_path (str): Path to the video.
+        - gray (bool): Cache greyscale frames.
+        - scale (float): Scale of the cached frames, e.g. 0.5 for the camera movement estimator.
+        - frames (sequence): Already decoded frames of the video (e.g. its cached colour frames) to convert
+          instead of decoding the video again.
+
+        Returns:
+        - frames (np.memmap): Read-only array of shape (frames, height, width[, 3]), or None if the video is
+          too large for the cache (read it with read_video_stream instead).
+        """
+        cached_frames = self.get(video_path, gray, scale)
+        if cached_frames is not None:
+            return cached_frames
+
+        # Size of the entry, from the first frame and the frame count of the container
+        if frames is None:
+            first_frame = next(read_video_stream(video_path, 0, 1), None)
+            frame_count = get_video_frame_count(video_path)
+        else:
+            first_frame = frames[0] if len(frames) else None
+            frame_count = len(frames)
+        if first_frame is None:
+            return None
+        frame_shape = self.convert(first_frame, gray, scale).shape
+        expected_bytes = frame_count * int(np.prod(frame_shape))
+        if expected_bytes > self.max_bytes:
+            return None
+        self.evict(self.max_bytes - expected_bytes)
+
+        # Decode once, appending the frames to the raw file; the sidecar is only written when all frames are in
+        data_path, meta_path = self.entry_paths(video_path, gray, scale)
+        # Workers analysing the same upload at once each write their own temporary file
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        num_frames = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for frame in (read_video_stream(video_path) if frames is None else frames):
+                    f.write(np.ascontiguousarray(self.convert(frame, gray, scale)).tobytes())
+                    num_frames += 1
+            os.replace(tmp_path, data_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        tmp_meta_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta_path, 'w') as f:
+            json.dump({"video": os.path.abspath(video_path), "shape": [num_frames, *frame_shape]}, f)
+        os.replace(tmp_meta_path, meta_path)
+
+        return self.get(video_path, gray, scale)
+
+    def entries(self):
+        # List (last use time, size, data path, sidecar path) of every complete entry
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json') or name == 'fingerprints.json':
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            data_path = meta_path[:-len('.json')] + '.frames'
+            try:
+                last_use = os.stat(meta_path).st_mtime_ns
+            except FileNotFoundError:
+                continue  # Evicted by another worker in the meantime
+            try:
+                size = os.path.getsize(data_path)
+            except FileNotFoundError:
+                size = 0
+            entries.append((last_use, size, data_path, meta_path))
+        return entries
+
+    def temp_files(self):
+        # List (last write time, size, path) of the temporary files of writes in progress or interrupted
+        temp_files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # The write finished in the meantime
+            temp_files.append((stat.st_mtime_ns, stat.st_size, path))
+        return temp_files
+
+    def evict(self, max_bytes=None):
+        # Remove leftovers of interrupted writes, then the least recently used entries until the cache holds
+        # at most max_bytes; files still being written count towards the limit but are kept
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        stale_before = time.time_ns() - int(self.stale_seconds * 1e9)
+        total_bytes = 0
+        for mtime, size, path in self.temp_files():
+            if mtime < stale_before:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            else:
+                total_bytes += size
+
+        entries = sorted(self.entries())
+        total_bytes += sum(size for _, size, _, _ in entries)
+        for _, size, data_path, meta_path in entries:
+            if total_bytes <= max_bytes:
+                break
+            self._remove_entry(data_path, meta_path)
+            total_bytes -= size
+
+    def clear(self):
+        # Remove every cached entry, including leftovers of interrupted writes
+        for _, _, data_path, meta_path in self.entries():
+            self._remove_entry(data_path, meta_path)
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp') or (name.endswith('.frames') and not os.path.exists(
+                    os.path.join(self.cache_dir, name[:-len('.frames')] + '.json'))):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    def _remove_entry(self, data_path, meta_path):
+        # The sidecar goes first, so a half-removed entry is never taken for a complete one
+        for path in (meta_path, data_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
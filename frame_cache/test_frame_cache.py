@@ -0,0 +1,68 @@
+import os
+import time
+import numpy as np
+import sys
+sys.path.append('../')
+from frame_cache import FrameCache
+from benchmark import generate_synthetic_video
+
+
+def write_temp_file(cache, name, size, age_seconds=0):
+    path = os.path.join(cache.cache_dir, name)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evict_removes_stale_temp_files_and_counts_live_ones(tmp_path):
+    video_path = str(tmp_path / "clip.avi")
+    generate_synthetic_video(video_path, 64, 48, 5, 25)
+    cache = FrameCache(str(tmp_path / "frames"))
+    frames = cache.get_or_create(video_path)
+    entry_bytes = frames.nbytes
+
+    # Leftovers of writes interrupted long ago, named as get_or_create names its temporary files
+    stale_data = write_temp_file(cache, "abc.frames.123.tmp", 1000, age_seconds=2 * cache.stale_seconds)
+    stale_meta = write_temp_file(cache, "abc.json.123.tmp", 10, age_seconds=2 * cache.stale_seconds)
+    # A write still in progress in another worker
+    live_data = write_temp_file(cache, "def.frames.456.tmp", 1000)
+
+    # The live file alone leaves no room for the complete entry
+    cache.evict(entry_bytes + 500)
+
+    assert not os.path.exists(stale_data) and not os.path.exists(stale_meta)
+    assert os.path.exists(live_data)
+    assert cache.get(video_path) is None
+
+
+def test_clear_removes_every_temp_file(tmp_path):
+    video_path = str(tmp_path / "clip.avi")
+    generate_synthetic_video(video_path, 64, 48, 5, 25)
+    cache = FrameCache(str(tmp_path / "frames"))
+    assert isinstance(cache.get_or_create(video_path), np.ndarray)
+    write_temp_file(cache, "abc.frames.123.tmp", 100)
+    write_temp_file(cache, "abc.json.123.tmp", 10)
+
+    cache.clear()
+
+    assert cache.get(video_path) is None
+    assert not [name for name in os.listdir(cache.cache_dir) if name.endswith('.tmp')]
+
+
+def test_entries_evicted_by_another_worker_are_misses(tmp_path, monkeypatch):
+    video_path = str(tmp_path / "clip.avi")
+    generate_synthetic_video(video_path, 64, 48, 5, 25)
+    cache = FrameCache(str(tmp_path / "frames"))
+    cache.get_or_create(video_path)
+    data_path, meta_path = cache.entry_paths(video_path)
+    names = os.listdir(cache.cache_dir)
+
+    # Another worker evicts the entry after this one listed the directory
+    os.remove(data_path)
+    os.remove(meta_path)
+    monkeypatch.setattr(os, "listdir", lambda path: names)
+
+    assert cache.entries() == []
+    assert cache.get(video_path) is None
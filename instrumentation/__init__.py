@@ -0,0 +1 @@
+from .instrumentation import Metrics, metrics, instrument
\ No newline at end of file
@@ -0,0 +1,207 @@
+import functools
+import inspect
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+
+def _peak_rss_bytes():
+    # High-water mark of the resident memory of this process (ru_maxrss is in KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class StageMetrics:
+    def __init__(self):
+        # Counters of one instrumented stage
+        self.calls = 0
+        self.frames = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.peak_rss_bytes = 0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "frames": self.frames,
+            "seconds": round(self.seconds, 6),
+            "max_seconds": round(self.max_seconds, 6),
+            "frames_per_second": round(self.frames / self.seconds, 2) if self.seconds > 0 and self.frames else None,
+            "peak_rss_bytes": self.peak_rss_bytes,
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        """
+        Registry of per-stage measurements: wall time, calls, frames processed and the memory high-water mark
+        after each stage, plus the largest depth seen on every queue.
+
+        Stages are recorded by methods decorated with instrument(). While the registry is disabled a decorated
+        method costs one attribute check on top of the call, so the instrumentation can stay in place in
+        production and be switched on when a job is slow. Nested stages are recorded separately, so the time
+        of an inner stage is also part of the outer one.
+
+        Parameters:
+        - enabled (bool): Start recording right away.
+        """
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        # Forget everything recorded so far
+        with self.lock:
+            self.stages = {}
+            self.queue_depths = {}
+            self.started = time.time()
+
+    def record(self, stage, seconds, frames=0):
+        # Add one call of a stage
+        peak_rss_bytes = _peak_rss_bytes()
+        with self.lock:
+            metrics = self.stages.get(stage)
+            if metrics is None:
+                metrics = self.stages[stage] = StageMetrics()
+            metrics.calls += 1
+            metrics.frames += frames
+            metrics.seconds += seconds
+            metrics.max_seconds = max(metrics.max_seconds, seconds)
+            metrics.peak_rss_bytes = max(metrics.peak_rss_bytes, peak_rss_bytes)
+
+    def observe_queue(self, queue_name, depth):
+        # Remember the largest depth seen on a queue
+        if not self.enabled:
+            return
+        with self.lock:
+            self.queue_depths[queue_name] = max(self.queue_depths.get(queue_name, 0), depth)
+
+    def snapshot(self):
+        """
+        Returns everything recorded so far.
+
+        Returns:
+        - snapshot (dict): "stages" (stage name -> calls, frames, seconds, max_seconds, frames_per_second and
+          peak_rss_bytes), "max_queue_depths", "peak_rss_bytes" of the process and the "started" and "time"
+          timestamps.
+        """
+        with self.lock:
+            return {
+                "started": self.started,
+                "time": time.time(),
+                "stages": {stage: metrics.to_dict() for stage, metrics in self.stages.items()},
+                "max_queue_depths": dict(self.queue_depths),
+                "peak_rss_bytes": _peak_rss_bytes(),
+            }
+
+    def write_log(self, path, **labels):
+        """
+        Appends the snapshot as structured log records to a JSON lines file: one record per stage and one per
+        queue, each with the timestamp and the given labels (e.g. job="video.mp4").
+        """
+        snapshot = self.snapshot()
+        records = [{"time": snapshot["time"], "type": "stage", "stage": stage, **labels, **values}
+                   for stage, values in snapshot["stages"].items()]
+        records += [{"time": snapshot["time"], "type": "queue", "queue": queue_name, "max_depth": depth, **labels}
+                    for queue_name, depth in snapshot["max_queue_depths"].items()]
+        records.append({"time": snapshot["time"], "type": "process", "peak_rss_bytes": snapshot["peak_rss_bytes"], **labels})
+        with open(path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+    def to_prometheus(self, prefix="football"):
+        # The snapshot in the Prometheus text exposition format
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for label, value in samples:
+                lines.append(f"{prefix}_{name}{label} {value}")
+
+        def label(name, value):
+            # Label values escape backslashes, double quotes and line feeds, as the text format requires
+            value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return '{' + name + '="' + value + '"}'
+
+        stages = snapshot["stages"].items()
+        metric("stage_seconds_total", "counter", "Wall time spent in a pipeline stage.",
+               [(label("stage", stage), values["seconds"]) for stage, values in stages])
+        metric("stage_calls_total", "counter", "Calls of a pipeline stage.",
+               [(label("stage", stage), values["calls"]) for stage, values in stages])
+        metric("stage_frames_total", "counter", "Video frames processed by a pipeline stage.",
+               [(label("stage", stage), values["frames"]) for stage, values in stages])
+        metric("stage_max_seconds", "gauge", "Longest single call of a pipeline stage.",
+               [(label("stage", stage), values["max_seconds"]) for stage, values in stages])
+        metric("stage_peak_rss_bytes", "gauge", "Memory high-water mark of the process after a pipeline stage.",
+               [(label("stage", stage), values["peak_rss_bytes"]) for stage, values in stages])
+        metric("queue_max_depth", "gauge", "Largest number of items seen waiting on a queue.",
+               [(label("queue", queue_name), depth) for queue_name, depth in snapshot["max_queue_depths"].items()])
+        metric("peak_rss_bytes", "gauge", "Memory high-water mark of the process.", [("", snapshot["peak_rss_bytes"])])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix="football"):
+        # Write the Prometheus text file atomically, so a node_exporter textfile collector never reads half a file
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus(prefix))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+# Registry the pipeline records into; set PIPELINE_METRICS=1 to enable it from the start
+metrics = Metrics(enabled=os.environ.get("PIPELINE_METRICS", "") not in ("", "0"))
+
+
+def count_frames(value):
+    # Frames in a stage argument: a list of frames or detections, or a tracks dictionary / TrackStore
+    if hasattr(value, 'values'):
+        return max((len(object_tracks) for object_tracks in value.values()), default=0)
+    return len(value)
+
+
+def instrument(stage, frames=None):
+    """
+    Decorator that records the wall time of every call of a function or method as a stage of the registry.
+
+    Parameters:
+    - stage (str): Stage name, e.g. "tracker.predict".
+    - frames (int or str): Frames processed per call: a fixed number, or the name of the argument the frames
+      are counted from (a list of frames or detections, or a tracks dictionary / TrackStore).
+    """
+    def decorator(function):
+        if isinstance(frames, str):
+            # Position of the counted argument, for calls that pass it positionally
+            frames_index = list(inspect.signature(function).parameters).index(frames)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            if isinstance(frames, str):
+                frame_count = count_frames(args[frames_index] if frames_index < len(args) else kwargs[frames])
+            else:
+                frame_count = frames or 0
+            metrics.record(stage, seconds, frame_count)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,2 @@
+from .job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from .worker import WorkerPool, run_worker
\ No newline at end of file
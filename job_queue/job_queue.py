@@ -0,0 +1,165 @@
+from contextlib import closing
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+# Job states, in the order a job goes through them
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    name TEXT,
+    work_dir TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker_pid INTEGER,
+    error TEXT
+)
+"""
+
+
+class JobQueue:
+    def __init__(self, jobs_dir='jobs'):
+        """
+        Local job queue for video analyses, kept in a SQLite database so the web app and any number of worker
+        processes can share it.
+
+        Every job gets its own working directory <jobs_dir>/<job id> holding the uploaded video (input.mp4) and
+        the results (output/), so concurrent analyses never overwrite each other's files.
+
+        Parameters:
+        - jobs_dir (str): Directory holding the database (jobs.sqlite) and the job directories.
+        """
+        self.jobs_dir = jobs_dir
+        self.db_path = os.path.join(jobs_dir, 'jobs.sqlite')
+        os.makedirs(jobs_dir, exist_ok=True)
+        with closing(self.connect()) as connection:
+            # Write-ahead logging lets the web app read while a worker writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+
+    def connect(self):
+        # A new connection per operation, as connections must not be shared between processes or threads
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def input_path(self, job):
+        return os.path.join(job["work_dir"], 'input.mp4')
+
+    def output_dir(self, job):
+        return os.path.join(job["work_dir"], 'output')
+
+    def submit(self, video, name=None):
+        """
+        Queues the analysis of a video.
+
+        Parameters:
+        - video (str or bytes): Path of the video to copy into the job directory, or its contents (e.g. the
+          buffer of an upload).
+        - name (str): Name to show for the job, e.g. the name of the uploaded file.
+
+        Returns:
+        - job_id (str): ID of the new job.
+        """
+        job_id = uuid.uuid4().hex[:16]
+        work_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(os.path.join(work_dir, 'output'))
+
+        # The input is complete before the job becomes visible to the workers
+        input_path = os.path.join(work_dir, 'input.mp4')
+        if isinstance(video, str):
+            shutil.copyfile(video, input_path)
+            name = name or os.path.basename(video)
+        else:
+            with open(input_path, 'wb') as f:
+                f.write(video)
+
+        with closing(self.connect()) as connection:
+            connection.execute("INSERT INTO jobs (id, status, message, name, work_dir, created) VALUES (?, ?, ?, ?, ?, ?)",
+                               (job_id, QUEUED, "Waiting for a worker", name, work_dir, time.time()))
+        return job_id
+
+    def claim(self, worker_pid):
+        """
+        Takes the oldest queued job for a worker; None when no job is waiting.
+
+        The job is marked running inside one write transaction, so two workers never get the same job.
+        """
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute("UPDATE jobs SET status = ?, message = ?, started = ?, worker_pid = ? WHERE id = ?",
+                               (RUNNING, "Starting", time.time(), worker_pid, row["id"]))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return self.get(row["id"])
+
+    def set_progress(self, job_id, progress, message=None):
+        # Progress of a running job, from 0 to 1, with a short description of the current step
+        with closing(self.connect()) as connection:
+            connection.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?", (progress, message, job_id))
+
+    def finish(self, job_id):
+        with closing(self.connect()) as connection:
+            connection.execute("UPDATE jobs SET status = ?, progress = 1, message = ?, finished = ? WHERE id = ?",
+                               (DONE, "Done", time.time(), job_id))
+
+    def fail(self, job_id, error):
+        with closing(self.connect()) as connection:
+            connection.execute("UPDATE jobs SET status = ?, message = ?, error = ?, finished = ? WHERE id = ?",
+                               (FAILED, "Failed", error, time.time(), job_id))
+
+    def fail_orphaned(self, worker_pid):
+        # Fail the running job of a worker that died (e.g. killed for running out of memory)
+        with closing(self.connect()) as connection:
+            rows = connection.execute("SELECT id FROM jobs WHERE status = ? AND worker_pid = ?",
+                                      (RUNNING, worker_pid)).fetchall()
+        for row in rows:
+            self.fail(row["id"], f"Worker process {worker_pid} exited during the analysis")
+
+    def get(self, job_id):
+        # The job as a dictionary of its columns, or None for an unknown ID
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else dict(row)
+
+    def jobs(self, job_ids=None, limit=100):
+        # The given jobs, or the most recent ones, newest first
+        with closing(self.connect()) as connection:
+            if job_ids is None:
+                rows = connection.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                placeholders = ",".join("?" * len(job_ids))
+                rows = connection.execute(f"SELECT * FROM jobs WHERE id IN ({placeholders}) ORDER BY created DESC",
+                                          list(job_ids)).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove(self, job_id):
+        # Delete a finished job and its working directory
+        job = self.get(job_id)
+        if job is None:
+            return
+        if job["status"] in (QUEUED, RUNNING):
+            raise ValueError(f"Job {job_id} is still {job['status']}")
+        with closing(self.connect()) as connection:
+            connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(job["work_dir"], ignore_errors=True)
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import time
+import traceback
+import sys
+sys.path.append('../')
+from instrumentation import metrics
+from .job_queue import JobQueue
+
+
+def run_worker(jobs_dir='jobs', model_path='models/best.pt', poll_interval=1.0, stop_event=None, model=None):
+    """
+    Worker loop: loads the YOLO model once and analyses queued jobs one after another until stopped.
+
+    Parameters:
+    - jobs_dir (str): Directory of the JobQueue.
+    - model_path (str): Path to the YOLO model weights.
+    - poll_interval (float): Seconds to wait before looking for a job again when the queue is empty.
+    - stop_event (multiprocessing.Event): Set to stop the worker after its current job.
+    - model: Optional ready detector object instead of loading model_path (see Tracker).
+    """
+    # Imported here so that importing the job queue (e.g. in the web app) does not load the model libraries
+    from trackers import Tracker
+    from main import main as analyse_video
+
+    # With MODEL_SERVER set, the workers share the warm model of a model server instead of loading their own
+    if model is None and os.environ.get("MODEL_SERVER"):
+        from model_server import ModelClient
+        model = ModelClient(os.environ["MODEL_SERVER"])
+
+    job_queue = JobQueue(jobs_dir)
+    tracker = Tracker(model_path, model=model)  # Loaded once and kept warm for every job of this worker
+
+    while stop_event is None or not stop_event.is_set():
+        job = job_queue.claim(os.getpid())
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        def progress(fraction, message, job_id=job["id"]):
+            job_queue.set_progress(job_id, fraction, message)
+
+        try:
+            metrics.reset()  # Metrics, when enabled, are written per job
+            analyse_video(job_queue.input_path(job), job_queue.output_dir(job), tracker=tracker, progress=progress)
+            job_queue.finish(job["id"])
+        except Exception:
+            job_queue.fail(job["id"], traceback.format_exc())
+
+
+class WorkerPool:
+    def __init__(self, num_workers=2, jobs_dir='jobs', model_path='models/best.pt', poll_interval=1.0, model=None):
+        """
+        Pool of worker processes (see run_worker) serving a JobQueue, so several videos are analysed at once
+        while the web app stays responsive. A worker that dies is replaced and its job is marked failed.
+
+        Parameters:
+        - num_workers (int): Number of worker processes; each holds its own copy of the model.
+        - jobs_dir (str): Directory of the JobQueue.
+        - model_path (str): Path to the YOLO model weights.
+        - poll_interval (float): Seconds an idle worker waits before looking for a job again.
+        - model: Optional ready detector object for every worker instead of loading model_path.
+        """
+        self.num_workers = num_workers
+        self.jobs_dir = jobs_dir
+        self.model_path = model_path
+        self.poll_interval = poll_interval
+        self.model = model
+        self.job_queue = JobQueue(jobs_dir)
+        # Fresh interpreters, so workers never inherit the web server's threads or locks
+        self.context = multiprocessing.get_context('spawn')
+        self.stop_event = self.context.Event()
+        self.processes = []
+
+    def start_worker(self):
+        process = self.context.Process(target=run_worker, daemon=True,
+                                       args=(self.jobs_dir, self.model_path, self.poll_interval, self.stop_event, self.model))
+        process.start()
+        return process
+
+    def start(self):
+        self.stop_event.clear()
+        self.processes = [self.start_worker() for _ in range(self.num_workers)]
+        return self
+
+    def check(self):
+        # Replace dead workers and fail the jobs they were running
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                self.job_queue.fail_orphaned(process.pid)
+                self.processes[i] = self.start_worker()
+
+    def serve(self, check_interval=5.0):
+        # Keep the pool running until interrupted
+        self.start()
+        try:
+            while True:
+                time.sleep(check_interval)
+                self.check()
+        finally:
+            self.stop()
+
+    def stop(self, timeout=None):
+        # Let every worker finish its current job, then stop it
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+        self.processes = []
@@ -1,55 +1,89 @@
-from utils import read_video, save_video
-from trackers import Tracker
-import cv2
+from itertools import islice
+from utils import read_video, save_video_stream, read_video_stream, get_video_fps
+from trackers import Tracker, compare_inference_modes
 import numpy as np
 from team_assigner import TeamAssigner
 from player_ball_assigner import PlayerBallAssigner
 from camera_movement_estimator import CameraMovementEstimator
 from view_transformer import ViewTransformer
 from speed_and_distance_estimator import SpeedAndDistance_Estimator
-from converter import convert_avi_to_mp4
+from pipeline import StreamingPipeline, ChunkedPipeline, BatchRunner, LivePipeline
+from track_store import TrackStore
+from track_archive import export_tracks
+from result_cache import ResultCache
+from frame_cache import FrameCache
+from annotation_renderer import AnnotationRenderer
+from benchmark import run_suite
+from instrumentation import metrics
+from job_queue import WorkerPool
+from model_server import ModelServer, ModelClient, DEFAULT_ADDRESS
 import os
 
-def main():
-    # Read the video frames
-    # video_frames = read_video("inputs_videos/football_video_01.mp4")
-    video_frames = read_video("inputs_videos/video.mp4")
-
-
-    # Initialize the Tracker with the path to the YOLO model
-    tracker = Tracker('models/best.pt')
-
-    # Get object tracks from the video frames, optionally loading from a stub file
+def main(video_path="inputs_videos/video.mp4", output_dir="output_videos", tracker=None, progress=None,
+         smoothing_seconds=None):
+    # Analyse one video and write the annotated video and the statistics to output_dir. A worker passes its
+    # already loaded tracker, so the YOLO model stays warm between jobs, and a progress(fraction, message)
+    # callback to report how far the analysis is. smoothing_seconds (e.g. 0.5) smooths the court positions
+    # against detection jitter before speeds and distances are measured; by default they are not smoothed
+    progress = progress or (lambda fraction, message: None)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Results are cached by the contents of the video, the model and the stage parameters,
+    # so re-running on an unchanged video skips detection and a new upload never reuses old tracks
+    cache = ResultCache('cache')
+
+    # The video is decoded once into a memory-mapped frame cache that every pass below reads from;
+    # videos too large for the cache are read into memory as before
+    frame_cache = FrameCache('cache/frames', result_cache=cache)
+    video_frames = frame_cache.get_or_create(video_path)
+    if video_frames is None:
+        video_frames = read_video(video_path)
+    if len(video_frames) == 0:
+        raise ValueError(f"Could not read any frames from {video_path}")
+    progress(0.1, "Detecting and tracking players")
+
+    # Initialize the Tracker with the path to the YOLO model, or start a fresh ByteTrack on the warm one
+    if tracker is None:
+        # With MODEL_SERVER set to the address of a running model server (see main_model_server), detection
+        # runs on its warm model instead of loading the weights in this process
+        model_server = os.environ.get("MODEL_SERVER")
+        tracker = Tracker('models/best.pt', model=ModelClient(model_server) if model_server else None)
+    else:
+        tracker.reset_tracker()
+
+    # Get object tracks from the video frames, loading them from the cache when available
     tracks = tracker.get_object_tracks(video_frames,
-                                       read_from_stub=True,
-                                       stub_path='stubs/track_stubs.pkl')
+                                       cache=cache,
+                                       video_path=video_path)
+
+    # Keep the tracks in a columnar store so the later stages can run on whole arrays
+    tracks = TrackStore.from_tracks(tracks)
     
     # Add object positions to the tracks
     tracker.add_position_to_tracks(tracks)
 
+    progress(0.5, "Estimating camera movement")
+
     # Initialize the CameraMovementEstimator with the first frame of the video
     camera_movement_estimator = CameraMovementEstimator(video_frames[0])
 
-    # Estimate camera movement per frame, optionally loading from a stub file
-    camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
-                                                                                read_from_stub=True,
-                                                                                stub_path='stubs/camera_movement_stub.pkl')
+    # The estimator only needs grey frames at its tracking scale, which are cached separately
+    camera_frames = frame_cache.get_or_create(video_path, gray=True, scale=camera_movement_estimator.scale,
+                                              frames=video_frames)
+    if camera_frames is None:
+        camera_frames = video_frames
+
+    # Estimate camera movement per frame, loading it from the cache when available
+    camera_movement_per_frame = camera_movement_estimator.get_camera_movement(camera_frames,
+                                                                                cache=cache,
+                                                                                video_path=video_path)
 
     
     # Adjust positions in tracks based on estimated camera movement
     camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
-    
-    # # save croppeed image of a players
-    # for tracks_id, player in tracks["players"][0].items():
-    #     bbox = player["bbox"]
-    #     frame = video_frames[0]
 
-    #     # croppeed bbox from images
-    #     cropped_image = frame[int(bbox[1]):int(bbox[3]), int(bbox[0]):int(bbox[2])]
+    progress(0.6, "Measuring positions, speeds and teams")
 
-    #     # save croppeed image of a players
-    #     cv2.imwrite(f"output_videos/cropped_image.jpg", cropped_image)
-    
     # Initialize the ViewTransformer
     view_transformer = ViewTransformer()
 
@@ -59,76 +93,144 @@ def main():
     # Interpolate missing ball positions in the tracks
     tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
 
-    # Initialize the SpeedAndDistance_Estimator
-    speed_and_distance_estimator = SpeedAndDistance_Estimator()
+    # Initialize the SpeedAndDistance_Estimator at the frame rate of the video
+    speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=get_video_fps(video_path),
+                                                              smoothing_seconds=smoothing_seconds)
 
     # Add speed and distance information to the tracks
     speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
 
     # Initialize the TeamAssigner
-    team_assigner = TeamAssigner()
+    team_assigner = TeamAssigner(temporal=True)
 
     # Assign team colors to players based on their appearance in the first frame
     team_assigner.assign_team_color(video_frames[0], tracks['players'][0])
     
     # Assign teams to players for each frame
-    for frame_num, player_track in enumerate(tracks['players']):
-        for player_id, track in player_track.items():
-            # Determine the team for each player
-            team = team_assigner.get_player_team(video_frames[frame_num], 
-                                                 track['bbox'],
-                                                 player_id)
-            # Update the player's team and team color in the track
-            tracks['players'][frame_num][player_id]['team'] = team 
-            tracks['players'][frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
+    team_assigner.add_team_to_tracks(video_frames, tracks)
 
     # Initialize the PlayerBallAssigner
     player_assigner = PlayerBallAssigner()
 
-    # Initialize a list to keep track of ball control by teams
-    team_ball_control = []
-
-    # Assign the ball to a player and track team ball control for each frame
-    for frame_num, player_track in enumerate(tracks['players']):
-        # Get the bounding box of the ball
-        ball_bbox = tracks['ball'][frame_num][1]['bbox']
-        # Assign the ball to a player based on the ball's bounding box
-        assigned_player = player_assigner.assign_ball_to_player(player_track, ball_bbox)
-
-        # Update ball ownership status and team ball control list
-        if assigned_player != -1:
-            tracks['players'][frame_num][assigned_player]['has_ball'] = True
-            team_ball_control.append(tracks['players'][frame_num][assigned_player]['team'])
-        else:
-            # Maintain the previous team's ball control if no player is assigned
-            team_ball_control.append(team_ball_control[-1])
-    
-    # Convert the list of team ball control to a numpy array
-    team_ball_control = np.array(team_ball_control)
-
-    # Annotate video frames with object tracks
-    output_video_frames = tracker.draw_annotations(video_frames, tracks, team_ball_control)
+    # Assign the ball to the nearest player in every frame and mark that player with has_ball
+    assigned_players, assigned_teams = player_assigner.assign_ball_to_tracks(tracks)
 
-    # Annotate video frames with camera movement information
-    output_video_frames = camera_movement_estimator.draw_camera_movement(output_video_frames, camera_movement_per_frame)
+    # The team of the last player with the ball keeps control until the other team gets it
+    team_ball_control = player_assigner.get_team_ball_control(assigned_teams)
 
-    # Annotate video frames with speed and distance information
-    speed_and_distance_estimator.draw_speed_and_distance(output_video_frames, tracks)
+    # Consecutive frames in which the same player holds the ball
+    possession_runs = player_assigner.get_possession_runs(assigned_players, assigned_teams)
+    np.savetxt(os.path.join(output_dir, "possession_runs.csv"), possession_runs, fmt='%d', delimiter=',',
+               header=','.join(possession_runs.dtype.names), comments='')
 
-    # Save the annotated video frames as a new video file
-    save_video(output_video_frames, "output_videos/output_video.avi")
+    # Top speed, sprints and distance of every player, with the distance split into 5 minute intervals
+    player_stats, distance_per_interval = speed_and_distance_estimator.get_player_stats(tracks)
+    np.savetxt(os.path.join(output_dir, "player_stats.csv"),
+               np.column_stack([player_stats[name] for name in player_stats.dtype.names] + [distance_per_interval]),
+               fmt=['%d', '%.2f', '%d', '%.2f'] + ['%.2f'] * distance_per_interval.shape[1], delimiter=',', comments='',
+               header=','.join(list(player_stats.dtype.names) + [f"distance_interval_{i}" for i in range(distance_per_interval.shape[1])]))
 
-################################### video saved as .mp4 ###############################################
-    # # Define paths
-    # INPUT_FOLDER = "output_videos"
-    # OUTPUT_FOLDER = "output_videos"
+    # Export the tracks and per-frame results as a memory-mappable columnar archive for analytics
+    export_tracks(os.path.join(output_dir, "tracks"), tracks, camera_movement_per_frame, team_ball_control, possession_runs)
     
-    # # After running your analysis and saving the .avi file, convert it to .mp4
-    # input_video_path = os.path.join(OUTPUT_FOLDER, "output_video.avi")
-    # output_video_path = os.path.join(OUTPUT_FOLDER, "output_video.mp4")
-
-    # # Convert the .avi file to .mp4
-    # convert_avi_to_mp4(input_video_path, output_video_path)
+    progress(0.8, "Rendering the annotated video")
+
+    # Annotate video frames with object tracks, ball control, camera movement and speed and distance,
+    # all in a single pass over the frames
+    renderer = AnnotationRenderer()
+    ball_control = tracker.get_ball_control_percentages(team_ball_control)
+    output_video_frames = renderer.render_frames_stream(video_frames, tracks, ball_control, camera_movement_per_frame)
+
+    # Encode every annotated frame as soon as it is drawn, straight to H.264 MP4 at the source frame rate, for
+    # the web app to play; the encoder runs on a background thread alongside the rendering, only a few frames
+    # are held in memory and no AVI to MP4 conversion is needed afterwards
+    save_video_stream(output_video_frames, os.path.join(output_dir, "output_video.mp4"), fps=get_video_fps(video_path))
+
+    # With PIPELINE_METRICS=1, write the wall time, frames, queue depths and memory high-water mark of every
+    # stage as a structured log and as Prometheus text (e.g. for a node_exporter textfile collector)
+    if metrics.enabled:
+        metrics.write_log(os.path.join(output_dir, "metrics.jsonl"), video=video_path)
+        metrics.write_prometheus(os.path.join(output_dir, "metrics.prom"))
+    progress(1.0, "Done")
+
+def main_streaming(window_size=48, batch_size=20, queue_depth=None, keyframe_interval=None):
+    # Analyse the video in a single streaming pass; memory is bounded by window_size frames plus one
+    # speed window instead of the length of the video, so full matches can be processed.
+    # With a queue_depth, decoding, YOLO inference and tracking overlap on separate threads;
+    # with a keyframe_interval, YOLO only runs on keyframes and boxes are propagated in between
+    pipeline = StreamingPipeline('models/best.pt', window_size=window_size, batch_size=batch_size,
+                                 queue_depth=queue_depth, keyframe_interval=keyframe_interval)
+    pipeline.run("inputs_videos/video.mp4", "output_videos/output_video.mp4")
+
+    # Print the per-stage throughput to help size the batches
+    if pipeline.detection_pipeline is not None:
+        print(pipeline.detection_pipeline.report())
+    if pipeline.keyframe_detector is not None:
+        print(pipeline.keyframe_detector.report())
+
+    # With PIPELINE_METRICS=1, write the wall time, frames, queue depths and memory high-water mark of every
+    # stage as a structured log and as Prometheus text (e.g. for a node_exporter textfile collector)
+    if metrics.enabled:
+        metrics.write_log("output_videos/metrics.jsonl", video="inputs_videos/video.mp4")
+        metrics.write_prometheus("output_videos/metrics.prom")
+
+def main_live(source="inputs_videos/video.mp4", latency_budget=0.5):
+    # Analyse a live feed (an RTSP/UDP URL or camera index; a video file is replayed at its frame rate as a
+    # stand-in) with causal stages only, dropping frames when the analysis falls behind the latency budget
+    pipeline = LivePipeline('models/best.pt', latency_budget=latency_budget)
+    print(pipeline.run(source, "output_videos/live_output.mp4"))
+
+def main_chunked(chunk_size=1500):
+    # Analyse a full-length match in resumable chunks: detections, tracks and camera movement are
+    # checkpointed per chunk, so a crash resumes from the last completed chunk instead of frame 0
+    video_path = "inputs_videos/video.mp4"
+    pipeline = StreamingPipeline('models/best.pt')
+    chunked_pipeline = ChunkedPipeline(pipeline.tracker, 'chunks/video', chunk_size=chunk_size,
+                                       result_cache=ResultCache('cache'))
+    tracks, camera_movement_per_frame = chunked_pipeline.run(video_path)
+
+    # Annotate and write the video in a streaming pass over the stitched results
+    pipeline.run(video_path, "output_videos/output_video.mp4", tracks, camera_movement_per_frame)
+
+def main_batch(video_paths, num_workers=None, segment_length=None):
+    # Analyse a backlog of matches (or segments of one long match) on all CPU cores;
+    # returns the merged tracks and ball control statistics per video
+    runner = BatchRunner('models/best.pt', num_workers=num_workers, segment_length=segment_length)
+    return runner.run(video_paths)
+
+def main_workers(num_workers=2, jobs_dir="jobs"):
+    # Serve the web app's job queue with a pool of worker processes that keep the YOLO model loaded;
+    # every job is analysed in its own directory under jobs_dir
+    WorkerPool(num_workers, jobs_dir, 'models/best.pt').serve()
+
+def main_model_server(address=DEFAULT_ADDRESS, max_batch_size=32, max_wait_seconds=0.01):
+    # Keep the YOLO model loaded in one long-lived process that serves detection requests over a Unix socket
+    # (or "host:port" on localhost); concurrent requests of several pipeline runs are merged into larger batches.
+    # Start the runs with MODEL_SERVER=<address> to use it
+    ModelServer('models/best.pt', address, max_batch_size, max_wait_seconds).serve_forever()
+
+def main_inference_report(num_frames=120):
+    # Compare YOLO input sizes and the pitch region of interest against full-resolution inference on
+    # the first frames of the video, to pick the fastest setting that is still accurate enough
+    tracker = Tracker('models/best.pt')
+    frames = list(islice(read_video_stream("inputs_videos/video.mp4"), num_frames))
+    modes = {
+        "imgsz_960": {"imgsz": 960},
+        "imgsz_640": {"imgsz": 640},
+        "roi": {"roi": ViewTransformer().pixel_vertices},
+        "roi_imgsz_640": {"roi": ViewTransformer().pixel_vertices, "imgsz": 640},
+    }
+    for mode_name, result in compare_inference_modes(tracker, frames, modes).items():
+        print(mode_name, result)
+
+def main_benchmark(output_dir="benchmarks", detector="stub"):
+    # Time every stage of the pipeline on synthetic clips at several resolutions and lengths; with the stub
+    # detector this runs on any CPU without model weights. Compare the report against a previous run to spot
+    # regressions
+    report = run_suite(output_dir, detector=detector)
+    for name, run in report["runs"].items():
+        print(name, run["frames_per_second"], "fps,", run["peak_rss_mb"], "MB peak,",
+              {stage: result["share"] for stage, result in run["stages"].items()})
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
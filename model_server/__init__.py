@@ -0,0 +1 @@
+from .model_server import ModelServer, ModelClient, DEFAULT_ADDRESS, parse_address
\ No newline at end of file
@@ -0,0 +1,328 @@
+from collections import deque
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import numpy as np
+import sys
+sys.path.append('../')
+from trackers.detection_result import DetectionResult
+from result_cache import file_fingerprint
+
+# Unix socket the server listens on unless another address is given
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), 'football_model_server.sock')
+
+# Every message is a JSON header followed by a binary payload, each preceded by its length
+_LENGTHS = struct.Struct('>QQ')
+
+
+def parse_address(address):
+    # "host:port" is a TCP address on localhost, anything else the path of a Unix socket
+    if isinstance(address, str) and ':' in address and '/' not in address:
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return address
+
+
+def _send_message(sock, header, buffers=()):
+    # Send the header and the payload buffers without first joining the buffers into one copy
+    header = json.dumps(header).encode('utf-8')
+    buffers = [memoryview(buffer).cast('B') for buffer in buffers]
+    sock.sendall(_LENGTHS.pack(len(header), sum(buffer.nbytes for buffer in buffers)) + header)
+    for buffer in buffers:
+        sock.sendall(buffer)
+
+
+def _recv_exactly(sock, num_bytes):
+    data = bytearray(num_bytes)
+    view = memoryview(data)
+    received = 0
+    while received < num_bytes:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed in the middle of a message")
+        received += count
+    return data
+
+
+def _recv_message(sock):
+    # Receive one message; None when the other side closed the connection between messages
+    lengths = sock.recv(_LENGTHS.size, socket.MSG_WAITALL)
+    if not lengths:
+        return None
+    if len(lengths) < _LENGTHS.size:
+        lengths += _recv_exactly(sock, _LENGTHS.size - len(lengths))
+    header_length, payload_length = _LENGTHS.unpack(lengths)
+    header = json.loads(_recv_exactly(sock, header_length).decode('utf-8'))
+    return header, _recv_exactly(sock, payload_length)
+
+
+class _Request:
+    def __init__(self, frames, conf, imgsz):
+        # Frames of one client call, waiting to be put into a batch
+        self.frames = frames
+        self.conf = conf
+        self.imgsz = imgsz
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Serve the detection requests of one client connection until it disconnects
+        model_server = self.server.model_server
+        while True:
+            message = _recv_message(self.request)
+            if message is None:
+                return
+            header, payload = message
+            if header.get("op") == "fingerprint":
+                _send_message(self.request, {"fingerprint": model_server.fingerprint})
+                continue
+            frames, offset = [], 0
+            for shape in header["shapes"]:
+                size = int(np.prod(shape))
+                frames.append(np.frombuffer(payload, dtype=np.uint8, count=size, offset=offset).reshape(shape))
+                offset += size
+
+            try:
+                results = model_server.predict(frames, header["conf"], header["imgsz"])
+            except Exception as error:
+                _send_message(self.request, {"error": f"{type(error).__name__}: {error}"})
+                continue
+            # Each frame's detections as rows of x1, y1, x2, y2, confidence, class ID
+            _send_message(self.request, {"rows": [len(result) for result in results], "names": model_server.names},
+                          results)
+
+
+class ModelServer:
+    def __init__(self, model_path='models/best.pt', address=DEFAULT_ADDRESS, max_batch_size=32, max_wait_seconds=0.01,
+                 model=None):
+        """
+        Long-lived inference service holding the loaded YOLO model, so pipeline runs skip the import of the
+        model libraries and the loading of the weights.
+
+        Requests of all clients go through one queue. The batcher takes the first waiting request and keeps
+        adding requests with the same settings for up to max_wait_seconds, or until max_batch_size frames are
+        collected, then runs the model once on the merged batch. On CPU a few large batches are faster than
+        many small ones.
+
+        Parameters:
+        - model_path (str): Path to the YOLO model weights.
+        - address (str or tuple): Unix socket path, or a (host, port) TCP address on localhost.
+        - max_batch_size (int): Frames after which a batch stops waiting for more requests.
+        - max_wait_seconds (float): Longest time the first request of a batch waits for others to join.
+        - model: Optional ready model with YOLO's predict() instead of loading model_path.
+        """
+        if model is None:
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+            # Clients key their result caches on the weights the server actually runs
+            self.fingerprint = file_fingerprint(model_path)
+        else:
+            fingerprint = getattr(model, 'fingerprint', None)
+            self.fingerprint = fingerprint() if callable(fingerprint) else None
+        self.model = model
+        self.address = parse_address(address)
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.names = None
+
+        self.requests = queue.Queue()
+        self.held = deque()  # Requests whose settings did not match the batch they arrived during
+        self.stopped = threading.Event()
+        self.server = None
+        self.batches = 0
+        self.frames = 0
+        self.requests_served = 0
+        self.inference_seconds = 0.0
+
+    def report(self):
+        # Batches run, frames and requests served, and the frames per batch dynamic batching reached
+        return {
+            "batches": self.batches,
+            "requests": self.requests_served,
+            "frames": self.frames,
+            "mean_batch_size": round(self.frames / self.batches, 2) if self.batches else None,
+            "inference_seconds": round(self.inference_seconds, 4),
+        }
+
+    def predict(self, frames, conf, imgsz=None):
+        # Queue the frames of one client call and wait for their detections (called by the connection threads)
+        request = _Request(frames, conf, imgsz)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _next_request(self, timeout):
+        if self.held:
+            return self.held.popleft()
+        return self.requests.get(timeout=timeout)
+
+    def _collect_batch(self):
+        # Take the first waiting request and merge the requests arriving soon after it into one batch
+        try:
+            first = self._next_request(timeout=0.1)
+        except queue.Empty:
+            return None
+        batch = [first]
+        num_frames = len(first.frames)
+        deadline = time.perf_counter() + self.max_wait_seconds
+        held = []
+        while num_frames < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._next_request(timeout=remaining)
+            except queue.Empty:
+                break
+            if (request.conf, request.imgsz) != (first.conf, first.imgsz):
+                held.append(request)  # Runs in a later batch with its own settings
+                continue
+            batch.append(request)
+            num_frames += len(request.frames)
+        self.held.extend(held)
+        return batch
+
+    def _run_batch(self, batch):
+        # Run the model once on the frames of every request of the batch and hand each request its results
+        frames = [frame for request in batch for frame in request.frames]
+        predict_args = {"conf": batch[0].conf}
+        if batch[0].imgsz is not None:
+            predict_args["imgsz"] = batch[0].imgsz
+        start = time.perf_counter()
+        try:
+            detections = self.model.predict(frames, **predict_args)
+            if self.names is None:
+                self.names = {int(class_id): name for class_id, name in detections[0].names.items()} if detections else None
+            results = [np.column_stack([detection.boxes.xyxy.cpu().numpy(), detection.boxes.conf.cpu().numpy(),
+                                        detection.boxes.cls.cpu().numpy()]).astype(np.float32).reshape(-1, 6)
+                       for detection in detections]
+        except Exception as error:
+            for request in batch:
+                request.error = error
+                request.done.set()
+            return
+        self.inference_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.frames += len(frames)
+        self.requests_served += len(batch)
+
+        offset = 0
+        for request in batch:
+            request.results = results[offset:offset + len(request.frames)]
+            offset += len(request.frames)
+            request.done.set()
+
+    def _batch_loop(self):
+        while not self.stopped.is_set():
+            batch = self._collect_batch()
+            if batch is not None:
+                self._run_batch(batch)
+
+    def start(self):
+        # Start listening and batching on background threads
+        if isinstance(self.address, tuple):
+            server_class = socketserver.ThreadingTCPServer
+        else:
+            server_class = socketserver.ThreadingUnixStreamServer
+            if os.path.exists(self.address):
+                os.remove(self.address)  # Left behind by a server that did not shut down
+        server_class.daemon_threads = True
+        server_class.allow_reuse_address = True
+        self.server = server_class(self.address, _Handler)
+        self.server.model_server = self
+        self.stopped.clear()
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        # Run the server until interrupted
+        self.start()
+        try:
+            while True:
+                time.sleep(60)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if not isinstance(self.address, tuple) and os.path.exists(self.address):
+                os.remove(self.address)
+
+
+class ModelClient:
+    def __init__(self, address=DEFAULT_ADDRESS):
+        """
+        Client of a ModelServer with YOLO's predict(), to pass as the model of a Tracker:
+        Tracker(model_path, model=ModelClient(address)).
+
+        Parameters:
+        - address (str or tuple): Address of the server, see ModelServer.
+        """
+        self.address = parse_address(address)
+        self.sock = None
+        self.lock = threading.Lock()  # One request at a time per connection
+
+    def connect(self):
+        family = socket.AF_INET if isinstance(self.address, tuple) else socket.AF_UNIX
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(self.address)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def request(self, header, buffers=()):
+        # Send one message and wait for the reply on this client's connection
+        with self.lock:
+            if self.sock is None:
+                self.connect()
+            try:
+                _send_message(self.sock, header, buffers)
+                message = _recv_message(self.sock)
+            except OSError:
+                self.close()
+                raise
+        if message is None:
+            self.close()
+            raise ConnectionError("The model server closed the connection")
+        header, payload = message
+        if "error" in header:
+            raise RuntimeError(f"Model server error: {header['error']}")
+        return header, payload
+
+    def fingerprint(self):
+        # Fingerprint of the weights the server runs (see Tracker.cache_key); None if the server cannot tell
+        header, _ = self.request({"op": "fingerprint"})
+        return header["fingerprint"]
+
+    def predict(self, frames, conf=0.25, imgsz=None, **kwargs):
+        # Detect objects in a list of frames on the server; returns one YOLO-shaped result per frame
+        frames = [np.ascontiguousarray(frame, dtype=np.uint8) for frame in frames]
+        header, payload = self.request({"shapes": [frame.shape for frame in frames], "conf": conf, "imgsz": imgsz},
+                                       frames)
+
+        names = {int(class_id): name for class_id, name in (header["names"] or {}).items()}
+        rows = np.frombuffer(payload, dtype=np.float32).reshape(-1, 6)
+        results, offset = [], 0
+        for num_rows in header["rows"]:
+            detections = rows[offset:offset + num_rows]
+            offset += num_rows
+            results.append(DetectionResult(detections[:, :4], detections[:, 4], detections[:, 5], names))
+        return results
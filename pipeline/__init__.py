@@ -0,0 +1,6 @@
+from .streaming_pipeline import StreamingPipeline
+from .detection_pipeline import DetectionPipeline
+from .chunked_pipeline import ChunkedPipeline
+from .batch_runner import BatchRunner
+from .keyframe_detector import KeyframeDetector
+from .live_pipeline import LivePipeline, LiveCapture
\ No newline at end of file
@@ -0,0 +1,226 @@
+import os
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video_stream, get_video_frame_count, get_video_fps, get_iou_matrix
+from camera_movement_estimator import CameraMovementEstimator
+from player_ball_assigner import PlayerBallAssigner
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from track_store import TrackStore
+
+# Pipeline of the worker process, created once per worker so the YOLO model stays loaded
+_worker_pipeline = None
+
+
+def _init_worker(model_path, batch_size):
+    global _worker_pipeline
+    from .streaming_pipeline import StreamingPipeline
+    _worker_pipeline = StreamingPipeline(model_path, batch_size=batch_size)
+
+
+def _analyse_segment(video_path, start_frame, end_frame):
+    """
+    Analyses the frames [start_frame, end_frame) of a video in a worker process.
+
+    Returns a dictionary with the segment's tracks (positions, teams and possession included),
+    camera movement, team colours and the team in control of the ball per frame.
+    """
+    pipeline = _worker_pipeline
+    frames = read_video_stream(video_path, start_frame, end_frame)
+    first_frame = next(frames, None)
+    segment = {"start_frame": start_frame, "tracks": {"players": [], "referees": [], "ball": []},
+               "camera_movement": [], "team_colors": {}, "team_ball_control": []}
+    if first_frame is None:
+        return segment
+
+    # Every segment starts with fresh tracking and camera state, as if it were its own video
+    pipeline.tracker.reset_tracker()
+    pipeline.camera_movement_estimator = CameraMovementEstimator(first_frame)
+    pipeline.team_assigner = None
+
+    # Track, compensate, transform and assign teams frame by frame; only the tracks are kept
+    packets = pipeline.tracker.get_object_tracks_stream(chain([first_frame], frames), pipeline.batch_size)
+    packets = pipeline.camera_movement_estimator.get_camera_movement_stream(packets)
+    for packet in packets:
+        pipeline.add_frame_analysis(packet)
+        for obj_type, frame_track in packet["tracks"].items():
+            segment["tracks"][obj_type].append(frame_track)
+        segment["camera_movement"].append(packet["camera_movement"])
+    segment["team_colors"] = {team: np.asarray(color) for team, color in pipeline.team_assigner.team_colors.items()}
+
+    # Interpolate the ball inside the segment, then assign it to the nearest player
+    if any(1 in ball for ball in segment["tracks"]["ball"]):
+        segment["tracks"]["ball"] = pipeline.tracker.interpolate_ball_positions(segment["tracks"]["ball"])
+    player_assigner = PlayerBallAssigner()
+    _, assigned_teams = player_assigner.assign_ball_to_tracks(segment["tracks"])
+    # 0 until a player of either team has had the ball
+    segment["team_ball_control"] = player_assigner.get_team_ball_control(assigned_teams).tolist()
+
+    return segment
+
+
+def _match_track_ids(previous_frames, current_frames, min_iou=0.5):
+    # Match the track IDs of two segments over their shared frames by how often their boxes overlap
+    votes = {}
+    for previous_track, current_track in zip(previous_frames, current_frames):
+        if not previous_track or not current_track:
+            continue
+        previous_ids = list(previous_track)
+        current_ids = list(current_track)
+        previous_boxes = [previous_track[track_id]['bbox'] for track_id in previous_ids]
+        current_boxes = [current_track[track_id]['bbox'] for track_id in current_ids]
+
+        # Pairwise intersection over union of all boxes in the frame
+        iou = get_iou_matrix(previous_boxes, current_boxes)
+
+        for i, j in zip(*np.nonzero(iou >= min_iou)):
+            pair = (previous_ids[i], current_ids[j])
+            votes[pair] = votes.get(pair, 0) + 1
+
+    # Greedily keep the pairs seen together most often, each ID used once
+    mapping = {}
+    used_previous = set()
+    for (previous_id, current_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if previous_id in used_previous or current_id in mapping:
+            continue
+        mapping[current_id] = previous_id
+        used_previous.add(previous_id)
+    return mapping
+
+
+class BatchRunner:
+    def __init__(self, model_path, num_workers=None, segment_length=None, overlap=48, batch_size=20):
+        """
+        Analyses several videos, or segments of one long video, in parallel worker processes and
+        merges the per-segment results into one consistent result per video.
+
+        Parameters:
+        - model_path (str): Path to the YOLO model weights, loaded once per worker.
+        - num_workers (int): Number of worker processes (defaults to the number of CPUs).
+        - segment_length (int): Frames per segment; None analyses every video as a single segment.
+        - overlap (int): Frames shared by consecutive segments, used to match track IDs across them.
+        - batch_size (int): Number of frames sent to the YOLO model at once.
+        """
+        self.model_path = model_path
+        self.num_workers = num_workers or os.cpu_count()
+        self.segment_length = segment_length
+        self.overlap = overlap
+        self.batch_size = batch_size
+
+    def plan_segments(self, video_path):
+        # Split a video into (start_frame, end_frame) ranges; every segment but the first starts `overlap` frames early
+        if self.segment_length is None:
+            return [(0, None)]
+        frame_count = get_video_frame_count(video_path)
+        segments = []
+        for start in range(0, max(frame_count, 1), self.segment_length):
+            end = start + self.segment_length
+            segments.append((max(start - self.overlap, 0), end if end < frame_count else None))
+        return segments
+
+    def run(self, video_paths):
+        """
+        Analyses a list of videos.
+
+        Parameters:
+        - video_paths (list): Paths of the videos to analyse.
+
+        Returns:
+        - results (dict): Result of each video path, see merge_segments.
+        """
+        video_paths = list(dict.fromkeys(video_paths))  # Every video is analysed once
+        jobs = [(video_path, start, end) for video_path in video_paths for start, end in self.plan_segments(video_path)]
+        with ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker,
+                                 initargs=(self.model_path, self.batch_size)) as executor:
+            futures = [executor.submit(_analyse_segment, *job) for job in jobs]
+            segments_per_video = {video_path: [] for video_path in video_paths}
+            for (video_path, _, _), future in zip(jobs, futures):
+                segments_per_video[video_path].append(future.result())
+
+        return {video_path: self.merge_segments(segments, get_video_fps(video_path))
+                for video_path, segments in segments_per_video.items()}
+
+    def merge_segments(self, segments, frame_rate=24):
+        """
+        Stitches the segments of one video together.
+
+        Track IDs of each segment are matched to the previous segment over their overlap, and new tracks get
+        IDs that are unused so far. Team labels are aligned by team colour. Speed and distance are computed
+        on the merged tracks, at the frame rate of the video.
+
+        Returns:
+        - result (dict): "tracks", "camera_movement", "team_ball_control" (team per frame, 0 before the first
+          possession) and "ball_control" (share of possession of teams 1 and 2).
+        """
+        tracks = {"players": [], "referees": [], "ball": []}
+        camera_movement = []
+        team_ball_control = []
+        reference_colors = segments[0]["team_colors"] if segments else {}
+        next_track_id = 1
+        previous_segment = None
+
+        for segment in segments:
+            if not segment["camera_movement"]:
+                continue  # The container reported more frames than the video has
+
+            # Frames shared with the previous segment are taken from the previous segment
+            skip = max(len(camera_movement) - segment["start_frame"], 0) if previous_segment is not None else 0
+
+            # Team labels of this segment expressed in the labels of the first segment
+            team_map = {1: 1, 2: 2, 0: 0}
+            colors = segment["team_colors"]
+            if reference_colors and colors:
+                same = np.linalg.norm(colors[1] - reference_colors[1]) + np.linalg.norm(colors[2] - reference_colors[2])
+                swapped = np.linalg.norm(colors[1] - reference_colors[2]) + np.linalg.norm(colors[2] - reference_colors[1])
+                if swapped < same:
+                    team_map = {1: 2, 2: 1, 0: 0}
+
+            for obj_type in ("players", "referees"):
+                segment_frames = segment["tracks"][obj_type]
+                mapping = {}
+                if previous_segment is not None and skip > 0:
+                    mapping = _match_track_ids(tracks[obj_type][-skip:], segment_frames[:skip])
+                # Every remaining ID of the segment gets a fresh, unused ID
+                for frame_track in segment_frames:
+                    for track_id in frame_track:
+                        if track_id not in mapping:
+                            mapping[track_id] = next_track_id
+                            next_track_id += 1
+
+                for frame_track in segment_frames[skip:]:
+                    merged_track = {}
+                    for track_id, track_info in frame_track.items():
+                        if 'team' in track_info:
+                            track_info['team'] = team_map[track_info['team']]
+                            track_info['team_color'] = reference_colors.get(track_info['team'], track_info.get('team_color'))
+                        merged_track[mapping[track_id]] = track_info
+                    tracks[obj_type].append(merged_track)
+
+            tracks["ball"].extend(segment["tracks"]["ball"][skip:])
+            camera_movement.extend(segment["camera_movement"][skip:])
+
+            # A segment that starts without a possession continues the previous segment's team
+            for team in segment["team_ball_control"][skip:]:
+                team = team_map[team]
+                if team == 0 and team_ball_control:
+                    team = team_ball_control[-1]
+                team_ball_control.append(team)
+
+            previous_segment = segment
+
+        # Speed and distance are measured over the merged tracks, so distances run across segments
+        tracks = TrackStore.from_tracks(tracks)
+        SpeedAndDistance_Estimator(frame_rate=frame_rate).add_speed_and_distance_to_tracks(tracks)
+
+        team_ball_control = np.array(team_ball_control)
+        team_1_num_frames = int(np.sum(team_ball_control == 1))
+        team_2_num_frames = int(np.sum(team_ball_control == 2))
+        total_frames = max(team_1_num_frames + team_2_num_frames, 1)
+        return {
+            "tracks": tracks.to_tracks(),
+            "camera_movement": camera_movement,
+            "team_ball_control": team_ball_control,
+            "ball_control": {1: team_1_num_frames / total_frames, 2: team_2_num_frames / total_frames},
+        }
@@ -0,0 +1,164 @@
+import json
+import os
+import pickle
+import tempfile
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import read_video_stream
+from camera_movement_estimator import CameraMovementEstimator
+from result_cache import ResultCache
+
+class ChunkedPipeline:
+    def __init__(self, tracker, work_dir, chunk_size=1500, batch_size=20, result_cache=None):
+        """
+        Runs detection, tracking and camera movement estimation over fixed frame ranges and
+        checkpoints every finished chunk, so a crash only loses the chunk in progress.
+
+        Each checkpoint holds the chunk's detections, tracks and camera movement together with the
+        ByteTrack and camera movement state at the end of the chunk. A resumed run restores that
+        state, so the stitched result is the same as a single pass over the whole video.
+
+        Parameters:
+        - tracker (Tracker): Tracker holding the YOLO model and the ByteTrack state.
+        - work_dir (str): Directory for the manifest and the chunk checkpoints of one video.
+        - chunk_size (int): Number of frames per chunk.
+        - batch_size (int): Number of frames sent to the YOLO model at once.
+        - result_cache (ResultCache): Result cache whose memoised video and model fingerprints are shared; by
+          default one is kept in work_dir.
+        """
+        self.tracker = tracker
+        self.work_dir = work_dir
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        # The result cache is only used for its memoised fingerprints, so a resumed run does not re-hash
+        # the whole video and the model weights
+        self.result_cache = ResultCache(work_dir) if result_cache is None else result_cache
+
+    def chunk_path(self, chunk_index):
+        return os.path.join(self.work_dir, f"chunk_{chunk_index:05d}.pkl")
+
+    def prepare_work_dir(self, video_path, camera_movement_estimator):
+        # Start over when the checkpoints belong to another video, model, camera movement settings or chunk size
+        manifest = {
+            "video": self.result_cache.fingerprint(video_path),
+            "model": self.tracker.model_fingerprint(self.result_cache),
+            "conf": self.tracker.conf,
+            "imgsz": self.tracker.imgsz,
+            "roi": None if self.tracker.roi is None else np.asarray(self.tracker.roi).tolist(),
+            "roi_margin": self.tracker.roi_margin,
+            "ball_tracker": self.tracker.ball_tracker.config(),
+            "camera_movement": camera_movement_estimator.config(),
+            "chunk_size": self.chunk_size,
+        }
+        # Compared as it is read back (tuples become lists)
+        manifest = json.loads(json.dumps(manifest))
+        manifest_path = os.path.join(self.work_dir, "manifest.json")
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                # Checkpoints of a model that cannot say which weights it runs are never trusted
+                if json.load(f) == manifest and manifest["model"] is not None:
+                    return
+        for name in os.listdir(self.work_dir):
+            if name.startswith("chunk_"):
+                os.remove(os.path.join(self.work_dir, name))
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+
+    def completed_chunks(self):
+        # Number of consecutive chunks, starting from the first, that already have a checkpoint
+        chunk_index = 0
+        while os.path.exists(self.chunk_path(chunk_index)):
+            chunk_index += 1
+        return chunk_index
+
+    def load_chunk(self, chunk_index):
+        with open(self.chunk_path(chunk_index), 'rb') as f:
+            return pickle.load(f)
+
+    def save_chunk(self, chunk_index, chunk):
+        # Write through a temporary file so an interrupted write never looks like a finished chunk
+        fd, tmp_path = tempfile.mkstemp(dir=self.work_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.chunk_path(chunk_index))
+
+    def process_chunk(self, video_path, chunk_index, camera_movement_estimator):
+        # Detect, track and estimate camera movement for the frames of one chunk
+        start_frame = chunk_index * self.chunk_size
+        frames = read_video_stream(video_path, start_frame, start_frame + self.chunk_size)
+
+        chunk = {"start_frame": start_frame, "detections": [], "tracks": {"players": [], "referees": [], "ball": []},
+                 "camera_movement": []}
+        for frame, detection in self.tracker.detect_frames_stream(frames, self.batch_size):
+            detection_supervision, cls_names_inv = self.tracker.get_frame_detections(detection)
+            frame_tracks = self.tracker.track_frame_detections(detection_supervision, cls_names_inv)
+
+            chunk["detections"].append(detection_supervision)
+            chunk["cls_names_inv"] = cls_names_inv
+            for obj_type, frame_track in frame_tracks.items():
+                chunk["tracks"][obj_type].append(frame_track)
+            chunk["camera_movement"].append(camera_movement_estimator.estimate_frame_movement(frame))
+
+        # State at the end of the chunk, restored when the next chunk is resumed
+        chunk["num_frames"] = len(chunk["camera_movement"])
+        chunk["tracker_state"] = self.tracker.get_tracker_state()
+        chunk["ball_tracker_state"] = self.tracker.ball_tracker.get_state()
+        chunk["camera_state"] = camera_movement_estimator.get_state()
+        return chunk
+
+    def run(self, video_path):
+        """
+        Processes a video chunk by chunk, resuming after the last completed chunk.
+
+        Parameters:
+        - video_path (str): Path to the input video.
+
+        Returns:
+        - (tracks, camera_movement_per_frame): Tracks in the format of Tracker.get_object_tracks and the camera
+          movement per frame, as CameraMovementEstimator.get_camera_movement returns it.
+        """
+        # The feature mask is built from the first frame of the video
+        first_frame = next(read_video_stream(video_path, 0, 1), None)
+        if first_frame is None:
+            return {"players": [], "referees": [], "ball": []}, []
+        camera_movement_estimator = CameraMovementEstimator(first_frame)
+        self.prepare_work_dir(video_path, camera_movement_estimator)
+
+        # Continue from the state saved at the end of the last completed chunk
+        chunk_index = self.completed_chunks()
+        if chunk_index > 0:
+            last_chunk = self.load_chunk(chunk_index - 1)
+            if last_chunk["num_frames"] < self.chunk_size:
+                return self.stitch(chunk_index)  # The video was already fully processed
+            self.tracker.set_tracker_state(last_chunk["tracker_state"])
+            self.tracker.ball_tracker.set_state(last_chunk["ball_tracker_state"])
+            camera_movement_estimator.set_state(last_chunk["camera_state"])
+        else:
+            # A fresh run (e.g. after the checkpoints were wiped) must not carry ByteTrack state over from
+            # an earlier video
+            self.tracker.reset_tracker()
+
+        # Process and checkpoint the remaining chunks until the video runs out of frames
+        while True:
+            chunk = self.process_chunk(video_path, chunk_index, camera_movement_estimator)
+            if chunk["num_frames"] > 0:
+                self.save_chunk(chunk_index, chunk)
+                chunk_index += 1
+            if chunk["num_frames"] < self.chunk_size:
+                break
+
+        return self.stitch(chunk_index)
+
+    def stitch(self, num_chunks):
+        # Concatenate the tracks and camera movement of all chunks
+        tracks = {"players": [], "referees": [], "ball": []}
+        camera_movement_per_frame = []
+        for chunk_index in range(num_chunks):
+            chunk = self.load_chunk(chunk_index)
+            for obj_type, object_tracks in chunk["tracks"].items():
+                tracks[obj_type].extend(object_tracks)
+            camera_movement_per_frame.extend(chunk["camera_movement"])
+        return tracks, camera_movement_per_frame
@@ -0,0 +1,187 @@
+import queue
+import threading
+import time
+import sys
+sys.path.append('../')
+from instrumentation import metrics
+
+# Marker put on a queue when its producer is done
+_END_OF_STREAM = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        # Counters of one pipeline stage; busy time excludes waiting on the neighbouring queues
+        self.name = name
+        self.frames = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def report(self):
+        # Return the counters together with the throughput the stage reached while busy
+        return {
+            "frames": self.frames,
+            "calls": self.calls,
+            "busy_seconds": round(self.busy_seconds, 4),
+            "wait_seconds": round(self.wait_seconds, 4),
+            "frames_per_second": round(self.frames / self.busy_seconds, 2) if self.busy_seconds > 0 else None,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class DetectionPipeline:
+    def __init__(self, tracker, batch_size=20, queue_depth=4):
+        """
+        Overlaps video decoding, YOLO inference and ByteTrack updates on three threads connected by
+        bounded queues, so the CPU decodes the next frames while the model is busy.
+
+        Parameters:
+        - tracker (Tracker): Tracker holding the YOLO model and the ByteTrack state.
+        - batch_size (int): Number of frames sent to the YOLO model at once.
+        - queue_depth (int): Number of batches each queue may hold before the producer waits.
+        """
+        self.tracker = tracker
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.stats = {name: StageStats(name) for name in ("decode", "inference", "tracking")}
+
+    def report(self):
+        # Per-stage throughput of the last run, plus the wall time of the whole run
+        report = {name: stage.report() for name, stage in self.stats.items()}
+        report["wall_seconds"] = round(getattr(self, "wall_seconds", 0.0), 4)
+        return report
+
+    def _put(self, output_queue, item, stage):
+        # Put an item on a bounded queue, giving up when the pipeline is stopped
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stage.wait_seconds += time.perf_counter() - start
+        stage.max_queue_depth = max(stage.max_queue_depth, output_queue.qsize())
+        if stage.name in self.stats:
+            metrics.observe_queue(f"detection_pipeline.{stage.name}", output_queue.qsize())
+
+    def _get(self, input_queue, stage):
+        # Get an item from a queue, returning the end marker when the pipeline is stopped
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = input_queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            item = _END_OF_STREAM
+        stage.wait_seconds += time.perf_counter() - start
+        return item
+
+    def _run_stage(self, target, output_queue):
+        # Run a stage and forward its exception (or the end of the stream) to the next stage
+        try:
+            target()
+        except BaseException as error:
+            self._error = error
+        finally:
+            self._put(output_queue, _END_OF_STREAM, StageStats("end"))
+
+    def _decode(self, frames, frame_queue):
+        # Decode frames and hand them on in batches
+        stage = self.stats["decode"]
+        frames = iter(frames)
+        batch = []
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            frame = next(frames, _END_OF_STREAM)
+            stage.busy_seconds += time.perf_counter() - start
+            if frame is _END_OF_STREAM:
+                break
+            stage.frames += 1
+            batch.append(frame)
+            if len(batch) == self.batch_size:
+                stage.calls += 1
+                self._put(frame_queue, batch, stage)
+                batch = []
+        if batch:
+            stage.calls += 1
+            self._put(frame_queue, batch, stage)
+
+    def _infer(self, frame_queue, detection_queue):
+        # Run the YOLO model on each batch of decoded frames
+        stage = self.stats["inference"]
+        while True:
+            batch = self._get(frame_queue, stage)
+            if batch is _END_OF_STREAM:
+                break
+            start = time.perf_counter()
+            detections = self.tracker.predict(batch)
+            stage.busy_seconds += time.perf_counter() - start
+            stage.frames += len(batch)
+            stage.calls += 1
+            self._put(detection_queue, (batch, detections), stage)
+
+    def _track(self, detection_queue, packet_queue):
+        # Update ByteTrack frame by frame, in order, and build the frame packets
+        stage = self.stats["tracking"]
+        frame_num = 0
+        while True:
+            item = self._get(detection_queue, stage)
+            if item is _END_OF_STREAM:
+                break
+            batch, detections = item
+            start = time.perf_counter()
+            packets = []
+            for frame, detection in zip(batch, detections):
+                packets.append({"frame_num": frame_num, "frame": frame, "tracks": self.tracker.get_frame_tracks(detection)})
+                frame_num += 1
+            stage.busy_seconds += time.perf_counter() - start
+            stage.frames += len(packets)
+            stage.calls += 1
+            self._put(packet_queue, packets, stage)
+
+    def run(self, frames):
+        """
+        Tracks objects over a stream of frames using the three-stage pipeline.
+
+        Parameters:
+        - frames (iterable): Iterable of video frames, e.g. the generator returned by read_video_stream.
+
+        Yields:
+        - packet (dict): Frame packet with "frame_num", "frame" and the frame's "tracks", in input order,
+          exactly as Tracker.get_object_tracks_stream produces them.
+        """
+        self.stats = {name: StageStats(name) for name in self.stats}
+        self._stop = threading.Event()
+        self._error = None
+        frame_queue = queue.Queue(maxsize=self.queue_depth)
+        detection_queue = queue.Queue(maxsize=self.queue_depth)
+        packet_queue = queue.Queue(maxsize=self.queue_depth)
+
+        threads = [
+            threading.Thread(target=self._run_stage, args=(lambda: self._decode(frames, frame_queue), frame_queue), daemon=True),
+            threading.Thread(target=self._run_stage, args=(lambda: self._infer(frame_queue, detection_queue), detection_queue), daemon=True),
+            threading.Thread(target=self._run_stage, args=(lambda: self._track(detection_queue, packet_queue), packet_queue), daemon=True),
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                packets = packet_queue.get()
+                if packets is _END_OF_STREAM:
+                    break
+                yield from packets
+            if self._error is not None:
+                raise self._error
+        finally:
+            # Stop the stages if the consumer exits early, then wait for them to finish
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.wall_seconds = time.perf_counter() - start
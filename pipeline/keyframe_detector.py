@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+import supervision as sv
+
+# Points tracked inside every box, as fractions of its width and height (a 3 x 3 grid around the centre)
+_GRID = np.array([(x, y) for y in (0.25, 0.5, 0.75) for x in (0.25, 0.5, 0.75)], dtype=np.float32)
+
+
+class KeyframeDetector:
+    def __init__(self, tracker, keyframe_interval=5, min_quality=0.8, max_camera_motion=20.0, max_spread=2.0, scale=0.5):
+        """
+        Runs YOLO only on keyframes and moves the boxes of the frames in between with sparse optical flow,
+        before every frame's detections go through ByteTrack as usual.
+
+        A keyframe is run every keyframe_interval frames, and earlier whenever propagation becomes unreliable:
+        when the share of boxes whose flow is consistent drops below min_quality, or when the boxes move more
+        than max_camera_motion pixels at once (a fast camera pan).
+
+        Parameters:
+        - tracker (Tracker): Tracker holding the YOLO model and the ByteTrack state.
+        - keyframe_interval (int): Frames from one scheduled keyframe to the next; 1 detects every frame.
+        - min_quality (float): Quality floor, the smallest share of reliably propagated boxes.
+        - max_camera_motion (float): Median box movement between two frames, in pixels, that forces a keyframe.
+        - max_spread (float): Median deviation of a box's point flows from its movement, in pixels, above which
+          the box is not reliably propagated.
+        - scale (float): Scale of the grey frames the flow is computed on.
+        """
+        self.tracker = tracker
+        self.keyframe_interval = keyframe_interval
+        self.min_quality = min_quality
+        self.max_camera_motion = max_camera_motion
+        self.max_spread = max_spread
+        self.scale = scale
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.reset()
+
+    def reset(self):
+        # Forget the previous frame and the counters of the last run
+        self.previous_gray = None
+        self.previous_detections = None
+        self.cls_names_inv = None
+        self.stats = {"frames": 0, "keyframes": 0, "forced_keyframes": 0, "quality_sum": 0.0, "propagated_frames": 0}
+
+    def report(self):
+        # Inference calls saved by propagation and the average propagation quality
+        frames = self.stats["frames"]
+        propagated = self.stats["propagated_frames"]
+        return {
+            "frames": frames,
+            "inference_calls": self.stats["keyframes"],
+            "forced_keyframes": self.stats["forced_keyframes"],
+            "inference_reduction": round(1 - self.stats["keyframes"] / frames, 4) if frames else None,
+            "mean_quality": round(self.stats["quality_sum"] / propagated, 4) if propagated else None,
+        }
+
+    def to_gray(self, frame):
+        # Grey frame at the flow scale
+        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            frame_gray = cv2.resize(frame_gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return frame_gray
+
+    def propagate(self, frame_gray):
+        """
+        Moves the previous frame's boxes into the current frame.
+
+        Every box moves by the median flow of a grid of points inside it. A box is reliable when most of its
+        points were tracked and their flows agree.
+
+        Returns:
+        - (detections, quality, motion): The moved detections, the share of reliable boxes and the median
+          movement of the boxes in pixels.
+        """
+        detections = self.previous_detections
+        if len(detections) == 0:
+            return detections, 1.0, 0.0
+
+        # Grid points of every box, in the coordinates of the grey frames
+        xyxy = detections.xyxy.astype(np.float32)
+        sizes = xyxy[:, 2:] - xyxy[:, :2]
+        points = (xyxy[:, None, :2] + sizes[:, None, :] * _GRID[None, :, :]) * self.scale
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.previous_gray, frame_gray, points.reshape(-1, 1, 2),
+                                                         None, **self.lk_params)
+
+        # Flow of every point in full-frame pixels; lost points are NaN
+        flows = (new_points.reshape(len(xyxy), -1, 2) - points) / self.scale
+        tracked = status.reshape(len(xyxy), -1) == 1
+        tracked_counts = tracked.sum(axis=1)
+        flows[~tracked] = np.nan
+        flows[tracked_counts == 0] = 0.0  # Boxes without any tracked point stay where they are
+
+        shifts = np.nanmedian(flows, axis=1)
+        spreads = np.nanmedian(np.linalg.norm(flows - shifts[:, None, :], axis=2), axis=1)
+        reliable = (tracked_counts > len(_GRID) // 2) & (spreads <= self.max_spread)
+
+        propagated = sv.Detections(xyxy=(xyxy + np.tile(shifts, 2)).astype(detections.xyxy.dtype),
+                                   confidence=detections.confidence, class_id=detections.class_id)
+        motion = float(np.linalg.norm(np.median(shifts, axis=0)))
+        return propagated, float(reliable.mean()), motion
+
+    def detect(self, frame):
+        # Run YOLO on a single keyframe
+        self.stats["keyframes"] += 1
+        detections, self.cls_names_inv = self.tracker.get_frame_detections(self.tracker.predict([frame])[0])
+        return detections
+
+    def run(self, frames):
+        """
+        Tracks objects over a stream of frames, running YOLO on keyframes only.
+
+        Parameters:
+        - frames (iterable): Iterable of video frames.
+
+        Yields:
+        - packet (dict): Frame packet with "frame_num", "frame", the frame's "tracks" and "keyframe" (whether
+          YOLO ran on the frame), as Tracker.get_object_tracks_stream produces them.
+        """
+        self.reset()
+        frames_since_keyframe = 0
+        for frame_num, frame in enumerate(frames):
+            frame_gray = self.to_gray(frame)
+            is_keyframe = self.previous_detections is None or frames_since_keyframe + 1 >= self.keyframe_interval
+
+            if not is_keyframe:
+                detections, quality, motion = self.propagate(frame_gray)
+                if quality < self.min_quality or motion > self.max_camera_motion:
+                    # Propagation is not good enough on this frame; detect instead
+                    self.stats["forced_keyframes"] += 1
+                    is_keyframe = True
+                else:
+                    self.stats["quality_sum"] += quality
+                    self.stats["propagated_frames"] += 1
+
+            if is_keyframe:
+                detections = self.detect(frame)
+                frames_since_keyframe = 0
+            else:
+                frames_since_keyframe += 1
+
+            self.stats["frames"] += 1
+            self.previous_gray = frame_gray
+            self.previous_detections = detections
+            yield {"frame_num": frame_num, "frame": frame, "keyframe": is_keyframe,
+                   "tracks": self.tracker.track_frame_detections(detections, self.cls_names_inv)}
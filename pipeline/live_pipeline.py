@@ -0,0 +1,244 @@
+from collections import deque
+import os
+import threading
+import time
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from utils import VideoWriter
+from camera_movement_estimator import CameraMovementEstimator
+from instrumentation import metrics
+from .streaming_pipeline import StreamingPipeline
+
+
+class LiveCapture:
+    def __init__(self, source, max_queue_frames=2, realtime=None):
+        """
+        Reads a live source on a background thread and keeps only the newest frames, so a slow consumer
+        never works through a growing backlog of stale frames.
+
+        Parameters:
+        - source (str or int): Anything cv2.VideoCapture opens: an RTSP/UDP/HTTP URL, a camera index, a named
+          pipe or a video file.
+        - max_queue_frames (int): Frames kept waiting; when the queue is full the oldest frame is dropped.
+        - realtime (bool): Release frames at the source frame rate, as a camera would. None paces files only,
+          so a recorded match stands in for a live feed.
+        """
+        self.source = source
+        self.max_queue_frames = max_queue_frames
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise IOError(f"Could not open video source {source}")
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else 25.0
+        self.realtime = isinstance(source, str) and os.path.isfile(source) if realtime is None else realtime
+
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self.finished = False
+        self.stopped = False
+        self.captured = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        # Capture thread: read frames, stamp them with their arrival time and drop the oldest on overflow
+        start = time.perf_counter()
+        frame_num = 0
+        try:
+            while not self.stopped:
+                if self.realtime:
+                    # Wait until the frame would have arrived from a camera
+                    delay = start + frame_num / self.fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                ret, frame = self.capture.read()
+                if not ret:
+                    break
+                with self.condition:
+                    if len(self.frames) >= self.max_queue_frames:
+                        self.frames.popleft()
+                        self.dropped += 1
+                    self.frames.append((frame_num, time.perf_counter(), frame))
+                    self.captured += 1
+                    metrics.observe_queue("live_capture", len(self.frames))
+                    self.condition.notify()
+                frame_num += 1
+        finally:
+            self.capture.release()
+            with self.condition:
+                self.finished = True
+                self.condition.notify()
+
+    def read(self):
+        """
+        Waits for the next frame.
+
+        Returns:
+        - (frame_num, capture_time, frame, waiting): Frame number in the source, time.perf_counter() at capture,
+          the frame and the number of newer frames already waiting; None at the end of the source.
+        """
+        with self.condition:
+            while not self.frames and not self.finished:
+                self.condition.wait()
+            if not self.frames:
+                return None
+            frame_num, capture_time, frame = self.frames.popleft()
+            return frame_num, capture_time, frame, len(self.frames)
+
+    def stop(self):
+        self.stopped = True
+        self.thread.join()
+
+
+class LivePipeline(StreamingPipeline):
+    def __init__(self, model_path, latency_budget=0.5, max_queue_frames=2, realtime=None, latency_history=1000):
+        """
+        Analyses a live feed online and delivers every annotated frame within a latency budget.
+
+        Every stage only looks at frames that have already arrived: frames are detected one at a time, missing
+        balls are filled with the ball tracker's prediction instead of being interpolated towards the next ball,
+        and speeds are measured over the window that has just ended (see
+        SpeedAndDistance_Estimator.add_speed_and_distance_causal). When the analysis falls behind, frames are
+        dropped: the capture keeps only the newest max_queue_frames, and a frame that is already older than the
+        latency budget is skipped whenever a newer one is waiting, so the skip rate follows the load.
+
+        Parameters:
+        - model_path (str): Path to the YOLO model weights.
+        - latency_budget (float): Seconds from capture to delivery of an annotated frame.
+        - max_queue_frames (int): Captured frames kept waiting for the analysis.
+        - realtime (bool): Pace the source at its frame rate (see LiveCapture); None paces files only.
+        - latency_history (int): Number of recent frames the latency percentiles are computed over.
+        """
+        super().__init__(model_path, batch_size=1)
+        self.latency_budget = latency_budget
+        self.max_queue_frames = max_queue_frames
+        self.realtime = realtime
+        self.latencies = deque(maxlen=latency_history)
+        self.capture = None
+        self.delivered = 0
+        self.dropped_late = 0
+        self.over_budget = 0
+
+    def report(self):
+        # Frames captured, delivered and dropped, and the end-to-end latency of the recent frames in seconds
+        latencies = np.array(self.latencies)
+        capture = self.capture
+        return {
+            "captured": 0 if capture is None else capture.captured,
+            "delivered": self.delivered,
+            "dropped_capture": 0 if capture is None else capture.dropped,
+            "dropped_late": self.dropped_late,
+            "over_budget": self.over_budget,
+            "latency_p50": round(float(np.percentile(latencies, 50)), 4) if len(latencies) else None,
+            "latency_p95": round(float(np.percentile(latencies, 95)), 4) if len(latencies) else None,
+            "latency_max": round(float(latencies.max()), 4) if len(latencies) else None,
+        }
+
+    def run(self, source, output_path):
+        # Analyse a live source and write the delivered frames to output_path, at the source frame rate
+        writer = None
+        try:
+            for packet in self.process(source):
+                if writer is None:
+                    frame = packet["frame"]
+                    writer = VideoWriter(output_path, self.capture.fps, (frame.shape[1], frame.shape[0]))
+                writer.write(packet["frame"])
+        finally:
+            if writer is not None:
+                writer.close()
+        return self.report()
+
+    def process(self, source):
+        """
+        Analyses a live source and yields the annotated frames as soon as they are ready.
+
+        Parameters:
+        - source (str or int): Live source, see LiveCapture.
+
+        Yields:
+        - packet (dict): Frame packet with "frame_num", "frame" (annotated), "tracks", "camera_movement",
+          "ball_control", "capture_time" and "latency" (seconds from capture to delivery).
+        """
+        self.capture = LiveCapture(source, self.max_queue_frames, self.realtime)
+        self.speed_and_distance_estimator.set_frame_rate(self.capture.fps)
+        self.latencies.clear()
+        self.delivered = 0
+        self.dropped_late = 0
+        self.over_budget = 0
+
+        # Stateful stages are created per stream
+        self.tracker.reset_tracker()
+        self.camera_movement_estimator = None
+        self.team_assigner = None
+        self.speed_state = {}
+        self.last_ball = None
+        self.last_frame_num = None
+        self.team_ball_control = None
+        self.team_ball_control_frames = {1: 0, 2: 0}
+
+        try:
+            while True:
+                item = self.capture.read()
+                if item is None:
+                    break
+                frame_num, capture_time, frame, waiting = item
+
+                # Skip frames that are already late while a newer one is waiting; the newest is always analysed
+                if waiting and time.perf_counter() - capture_time > self.latency_budget:
+                    self.dropped_late += 1
+                    continue
+
+                packet = self.analyse_frame(frame_num, frame)
+                packet["frame"] = self.renderer.render_frame(packet["frame"], packet["tracks"], packet["ball_control"],
+                                                             packet["camera_movement"], copy=False)
+
+                packet["capture_time"] = capture_time
+                packet["latency"] = time.perf_counter() - capture_time
+                self.latencies.append(packet["latency"])
+                self.delivered += 1
+                if packet["latency"] > self.latency_budget:
+                    self.over_budget += 1
+                yield packet
+        finally:
+            self.capture.stop()
+
+    def analyse_frame(self, frame_num, frame):
+        # Run every stage on one frame, using only this frame and the state left by the earlier ones
+        detection = self.tracker.predict([frame])[0]
+        # Frames dropped as late since the last analysed one still move the ball on
+        frame_step = 1 if self.last_frame_num is None else frame_num - self.last_frame_num
+        self.last_frame_num = frame_num
+        packet = {"frame_num": frame_num, "frame": frame,
+                  "tracks": self.tracker.get_frame_tracks(detection, frame_step=frame_step)}
+
+        if self.camera_movement_estimator is None:
+            self.camera_movement_estimator = CameraMovementEstimator(frame)
+        packet["camera_movement"] = self.camera_movement_estimator.estimate_frame_movement(frame)
+
+        self.add_frame_analysis(packet)
+        self.speed_and_distance_estimator.add_speed_and_distance_causal(frame_num, packet["tracks"]["players"],
+                                                                         self.speed_state)
+        self.predict_ball_position(packet)
+        self.assign_ball_possession(packet)
+        return packet
+
+    def predict_ball_position(self, packet):
+        # Causal gap filling: while the ball tracker is still following the ball, a frame without a ball
+        # detection gets the ball at the tracker's predicted centre, with the size of the last seen ball
+        ball_tracks = packet["tracks"]["ball"]
+        if 1 in ball_tracks:
+            self.last_ball = ball_tracks[1]["bbox"]
+            return
+
+        ball_tracker = self.tracker.ball_tracker
+        if self.last_ball is None or ball_tracker.state is None or ball_tracker.misses > ball_tracker.max_misses:
+            return
+
+        x, y = ball_tracker.state[:2]
+        half_width = (self.last_ball[2] - self.last_ball[0]) / 2
+        half_height = (self.last_ball[3] - self.last_ball[1]) / 2
+        # Predicted balls only carry a bounding box, as interpolated balls do
+        ball_tracks[1] = {"bbox": [x - half_width, y - half_height, x + half_width, y + half_height]}
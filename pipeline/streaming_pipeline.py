@@ -0,0 +1,205 @@
+from collections import deque
+from itertools import chain, islice
+import sys
+sys.path.append('../')
+from utils import read_video_stream, save_video_stream, get_video_fps
+from trackers import Tracker
+from team_assigner import TeamAssigner
+from player_ball_assigner import PlayerBallAssigner
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from ball_tracker import BallTracker
+from annotation_renderer import AnnotationRenderer
+from .detection_pipeline import DetectionPipeline
+from .keyframe_detector import KeyframeDetector
+
+class StreamingPipeline:
+    def __init__(self, model_path, window_size=48, batch_size=20, queue_depth=None, keyframe_interval=None):
+        """
+        Runs the full analysis frame by frame, so memory stays bounded by a window of frames
+        instead of growing with the length of the video.
+
+        Parameters:
+        - model_path (str): Path to the YOLO model weights.
+        - window_size (int): Number of frames a ball gap may be held back waiting for the ball to reappear
+          (see BallTracker.fill_gaps_stream); speed windows hold back one more window of frames after it.
+        - batch_size (int): Number of frames sent to the YOLO model at once.
+        - queue_depth (int): When set, decoding, inference and tracking run on separate threads
+          (see DetectionPipeline) with queues holding this many batches.
+        - keyframe_interval (int): When set, YOLO only runs on keyframes and boxes are propagated with optical
+          flow in between (see KeyframeDetector); takes precedence over queue_depth.
+        """
+        self.tracker = Tracker(model_path)
+        self.view_transformer = ViewTransformer()
+        self.speed_and_distance_estimator = SpeedAndDistance_Estimator()
+        self.player_assigner = PlayerBallAssigner()
+        self.renderer = AnnotationRenderer()
+        self.batch_size = batch_size
+        self.detection_pipeline = None
+        if queue_depth is not None:
+            self.detection_pipeline = DetectionPipeline(self.tracker, batch_size, queue_depth)
+        self.keyframe_detector = None
+        if keyframe_interval is not None:
+            self.keyframe_detector = KeyframeDetector(self.tracker, keyframe_interval)
+
+        # The speed of a frame window can only be measured once its last frame has been seen
+        self.window_size = window_size
+        self.speed_window_size = self.speed_and_distance_estimator.frame_window + 1
+
+    def run(self, video_path, output_path, tracks=None, camera_movement_per_frame=None):
+        # Read, analyse, annotate and write the video in a single streaming pass, at the source frame rate
+        return save_video_stream(self.process(video_path, tracks, camera_movement_per_frame), output_path,
+                                 fps=get_video_fps(video_path))
+
+    def process(self, video_path, tracks=None, camera_movement_per_frame=None):
+        """
+        Analyses a video and yields the annotated frames one by one.
+
+        Parameters:
+        - video_path (str): Path to the input video.
+        - tracks (dict): Optional precomputed tracks (e.g. from ChunkedPipeline); detection is skipped when given.
+        - camera_movement_per_frame (list): Optional precomputed camera movement per frame.
+
+        Yields:
+        - frame (ndarray): Annotated video frame, in input order.
+        """
+        frames = read_video_stream(video_path)
+        first_frame = next(frames, None)
+        if first_frame is None:
+            return
+        frames = chain([first_frame], frames)
+
+        # Speed windows span the same time whatever the frame rate of the video
+        self.speed_and_distance_estimator.set_frame_rate(get_video_fps(video_path))
+        self.speed_window_size = self.speed_and_distance_estimator.frame_window + 1
+
+        # Stateful stages are created per video
+        self.camera_movement_estimator = CameraMovementEstimator(first_frame)
+        self.team_assigner = None
+        self.total_distance = {}
+        self.team_ball_control = None
+        self.team_ball_control_frames = {1: 0, 2: 0}
+
+        # Detect and track objects, then estimate the camera movement, both frame by frame
+        if tracks is not None:
+            packets = ({"frame_num": frame_num, "frame": frame,
+                        "tracks": {obj_type: object_tracks[frame_num] for obj_type, object_tracks in tracks.items()}}
+                       for frame_num, frame in enumerate(frames))
+        elif self.keyframe_detector is not None:
+            packets = self.keyframe_detector.run(frames)
+        elif self.detection_pipeline is not None:
+            packets = self.detection_pipeline.run(frames)
+        else:
+            packets = self.tracker.get_object_tracks_stream(frames, self.batch_size)
+
+        if camera_movement_per_frame is not None:
+            packets = (dict(packet, camera_movement=camera_movement_per_frame[packet["frame_num"]]) for packet in packets)
+        else:
+            packets = self.camera_movement_estimator.get_camera_movement_stream(packets)
+        packets = (self.add_frame_analysis(packet) for packet in packets)
+
+        # Fill ball gaps and finalise frames once enough lookahead is available, then annotate them
+        packets = self.fill_ball_stream(packets)
+        packets = self.finalize_stream(packets)
+        # Decoded frames are not used after annotation, so they are drawn on in place
+        packets = self.renderer.render_stream(packets, copy=False)
+
+        for packet in packets:
+            yield packet["frame"]
+
+    def add_frame_analysis(self, packet):
+        # Run the per-frame stages that need no lookahead: positions, camera compensation,
+        # view transformation and team assignment
+        frame_tracks = packet["tracks"]
+
+        # The single-frame tracks are wrapped as one-frame clips so the existing stages can be reused
+        clip_tracks = {obj_type: [frame_track] for obj_type, frame_track in frame_tracks.items()}
+        self.tracker.add_position_to_tracks(clip_tracks)
+        self.camera_movement_estimator.add_adjust_positions_to_tracks(clip_tracks, [packet["camera_movement"]])
+        self.view_transformer.add_transformed_position_to_tracks(clip_tracks)
+
+        # Team colours are learned from the first frame of the video
+        if self.team_assigner is None:
+            self.team_assigner = TeamAssigner(temporal=True)
+            self.team_assigner.assign_team_color(packet["frame"], frame_tracks["players"])
+
+        # Players whose crop has no usable colour yet are left without a team
+        teams = self.team_assigner.get_player_teams(packet["frame"], frame_tracks["players"], packet["frame_num"])
+        for player_id, team in teams.items():
+            track = frame_tracks["players"][player_id]
+            track['team'] = team
+            track['team_color'] = self.team_assigner.team_colors[team]
+
+        return packet
+
+    def fill_ball_stream(self, packets):
+        # Fill the frames without a ball with the ball tracker's gap filling, which holds back at most
+        # window_size frames waiting for the ball to reappear
+        held = deque()
+
+        def ball_bboxes():
+            for packet in packets:
+                held.append(packet)
+                ball_track = packet["tracks"]["ball"]
+                yield ball_track[1]["bbox"] if 1 in ball_track else None
+
+        for bbox in BallTracker(lookahead=self.window_size).fill_gaps_stream(ball_bboxes()):
+            packet = held.popleft()
+            ball_track = packet["tracks"]["ball"]
+            if bbox is not None and 1 not in ball_track:
+                # Filled balls only carry a bounding box, as in Tracker.interpolate_ball_positions
+                ball_track[1] = {"bbox": bbox}
+            yield packet
+
+    def finalize_stream(self, packets):
+        # Hold back a bounded window of packets so the speed windows can see future frames
+        window = deque()
+        for packet in packets:
+            window.append(packet)
+            if len(window) > self.speed_window_size:
+                yield self.finalize_packet(window)
+
+        # Drain the remaining window at the end of the video
+        while window:
+            yield self.finalize_packet(window)
+
+    def finalize_packet(self, window):
+        # Complete the oldest packet in the window: speed and ball possession
+        packet = window[0]
+        frame_window = self.speed_and_distance_estimator.frame_window
+
+        # Speed windows start every frame_window frames and need their last frame to be available
+        if packet["frame_num"] % frame_window == 0:
+            window_tracks = [p["tracks"]["players"] for p in islice(window, 0, frame_window + 1)]
+            self.speed_and_distance_estimator.add_speed_and_distance_to_window(window_tracks, self.total_distance)
+
+        self.assign_ball_possession(packet)
+
+        return window.popleft()
+
+    def assign_ball_possession(self, packet):
+        # Assign the ball to the nearest player and update the running team ball control
+        player_track = packet["tracks"]["players"]
+        ball_track = packet["tracks"]["ball"]
+
+        assigned_player = -1
+        if 1 in ball_track:
+            assigned_player = self.player_assigner.assign_ball_to_player(player_track, ball_track[1]['bbox'])
+
+        # Update ball ownership status; the previous team keeps control if no player is assigned
+        if assigned_player != -1:
+            player_track[assigned_player]['has_ball'] = True
+            self.team_ball_control = player_track[assigned_player].get('team', self.team_ball_control)
+
+        if self.team_ball_control in self.team_ball_control_frames:
+            self.team_ball_control_frames[self.team_ball_control] += 1
+
+        # Store the ball control fractions of both teams up to this frame
+        team_1_num_frames = self.team_ball_control_frames[1]
+        team_2_num_frames = self.team_ball_control_frames[2]
+        total_frames = team_1_num_frames + team_2_num_frames
+        if total_frames == 0:
+            packet["ball_control"] = (0, 0)
+        else:
+            packet["ball_control"] = (team_1_num_frames / total_frames, team_2_num_frames / total_frames)
@@ -0,0 +1,51 @@
+import numpy as np
+import sys
+sys.path.append('../')
+from pipeline import BatchRunner
+from pipeline.batch_runner import _match_track_ids
+
+
+def player(x, y, team=1):
+    return {"bbox": [x, y, x + 20.0, y + 50.0], "team": team, "team_color": np.array([0.0, 0.0, 200.0 * team])}
+
+
+def make_segment(start_frame, frames):
+    return {"start_frame": start_frame,
+            "tracks": {"players": frames, "referees": [{} for _ in frames], "ball": [{} for _ in frames]},
+            "camera_movement": [[0.0, 0.0] for _ in frames],
+            "team_colors": {1: np.array([0.0, 0.0, 200.0]), 2: np.array([0.0, 0.0, 400.0])},
+            "team_ball_control": [0 for _ in frames]}
+
+
+def test_ids_are_matched_by_overlapping_boxes():
+    previous_frames = [{1: player(100 + frame_num, 100), 2: player(300, 200 + frame_num)} for frame_num in range(4)]
+    # Same players a pixel apart under other IDs, listed in another order, plus a player the previous segment lacks
+    current_frames = [{8: player(301, 200 + frame_num), 7: player(101 + frame_num, 100), 9: player(600, 50)}
+                      for frame_num in range(4)]
+
+    assert _match_track_ids(previous_frames, current_frames) == {7: 1, 8: 2}
+
+
+def test_boxes_below_the_iou_threshold_are_not_matched():
+    previous_frames = [{1: player(100, 100)}]
+    current_frames = [{5: player(112, 100)}]  # Shifted by 12 of its 20 pixels: IoU 0.25
+
+    assert _match_track_ids(previous_frames, current_frames) == {}
+
+
+def test_merged_segments_keep_track_ids_across_the_overlap():
+    # Segment 1 covers frames 0-5, segment 2 frames 3-8; the overlap is frames 3-5
+    first = make_segment(0, [{1: player(10.0 * frame_num, 100), 2: player(400, 10.0 * frame_num)}
+                             for frame_num in range(6)])
+    second = make_segment(3, [{5: player(10.0 * frame_num, 100), 4: player(400, 10.0 * frame_num),
+                               **({6: player(700, 300)} if frame_num >= 7 else {})}
+                              for frame_num in range(3, 9)])
+
+    result = BatchRunner("missing.pt").merge_segments([first, second])
+    players = result["tracks"]["players"]
+
+    assert len(players) == 9
+    assert [sorted(frame) for frame in players] == [[1, 2]] * 7 + [[1, 2, 3]] * 2
+    # Every track follows its own boxes through the seam
+    assert [frame[1]["bbox"][0] for frame in players] == [10.0 * frame_num for frame_num in range(9)]
+    assert [frame[2]["bbox"][1] for frame in players] == [10.0 * frame_num for frame_num in range(9)]
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pytest
+import sys
+sys.path.append('../')
+from pipeline import ChunkedPipeline
+import pipeline.chunked_pipeline as chunked_pipeline
+import result_cache.result_cache as result_cache
+from camera_movement_estimator import CameraMovementEstimator
+from trackers import Tracker
+from utils import read_video
+from benchmark import StubDetector, generate_synthetic_video
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    video_path = str(tmp_path_factory.mktemp("video") / "clip.avi")
+    # Large enough for the camera movement features, with a fast pan so the movement is not zero
+    generate_synthetic_video(video_path, 960, 540, 30, 25, pan_seconds=2.0)
+    return video_path
+
+
+def make_tracker(tmp_path):
+    return Tracker(str(tmp_path / "missing.pt"), model=StubDetector())
+
+
+def test_changed_camera_movement_settings_start_over(tmp_path, clip, monkeypatch):
+    work_dir = str(tmp_path / "work")
+    ChunkedPipeline(make_tracker(tmp_path), work_dir, chunk_size=10).run(clip)
+
+    # Checkpoints made at another scale must not be resumed from
+    monkeypatch.setattr(chunked_pipeline, "CameraMovementEstimator",
+                        lambda frame: CameraMovementEstimator(frame, scale=0.25))
+    pipeline = ChunkedPipeline(make_tracker(tmp_path), work_dir, chunk_size=10)
+    pipeline.run(clip)
+
+    assert pipeline.load_chunk(0)["camera_state"]["old_gray"].shape == (135, 240)
+
+
+def test_fresh_run_does_not_carry_tracker_state_over(tmp_path, clip):
+    tracker = make_tracker(tmp_path)
+    first_tracks, _ = ChunkedPipeline(tracker, str(tmp_path / "first"), chunk_size=10).run(clip)
+    # Same tracker, new work directory: track IDs start from scratch again
+    second_tracks, _ = ChunkedPipeline(tracker, str(tmp_path / "second"), chunk_size=10).run(clip)
+
+    assert any(first_tracks["players"])
+    assert second_tracks == first_tracks
+
+
+def test_resumed_run_does_not_rehash_the_video(tmp_path, clip, monkeypatch):
+    hashed = []
+    file_fingerprint = result_cache.file_fingerprint
+    monkeypatch.setattr(result_cache, "file_fingerprint", lambda path: hashed.append(path) or file_fingerprint(path))
+    work_dir = str(tmp_path / "work")
+    ChunkedPipeline(make_tracker(tmp_path), work_dir, chunk_size=10).run(clip)
+    ChunkedPipeline(make_tracker(tmp_path), work_dir, chunk_size=10).run(clip)
+
+    # The fingerprint is memoised in the work directory's result cache
+    assert hashed == [clip]
+
+
+def single_pass(tmp_path, clip):
+    frames = read_video(clip)
+    tracks = make_tracker(tmp_path).get_object_tracks(frames)
+    camera_movement_per_frame = CameraMovementEstimator(frames[0]).get_camera_movement(frames)
+    return tracks, camera_movement_per_frame
+
+
+def test_stitched_chunks_match_a_single_pass(tmp_path, clip):
+    tracks, camera_movement_per_frame = ChunkedPipeline(make_tracker(tmp_path), str(tmp_path / "work"),
+                                                        chunk_size=7).run(clip)
+    expected_tracks, expected_camera_movement = single_pass(tmp_path, clip)
+
+    assert any(expected_tracks["players"]) and np.any(expected_camera_movement)
+    assert tracks == expected_tracks
+    assert np.array_equal(camera_movement_per_frame, expected_camera_movement)
+
+
+@pytest.mark.parametrize("deleted_chunks", [[2], [1, 2], [0, 1, 2]])
+def test_resume_after_deleted_chunks_matches_a_single_pass(tmp_path, clip, deleted_chunks):
+    work_dir = str(tmp_path / "work")
+    pipeline = ChunkedPipeline(make_tracker(tmp_path), work_dir, chunk_size=10)
+    pipeline.run(clip)
+    for chunk_index in deleted_chunks:
+        os.remove(pipeline.chunk_path(chunk_index))
+
+    # A new process resumes after the last chunk still on disk
+    tracks, camera_movement_per_frame = ChunkedPipeline(make_tracker(tmp_path), work_dir, chunk_size=10).run(clip)
+    expected_tracks, expected_camera_movement = single_pass(tmp_path, clip)
+
+    assert tracks == expected_tracks
+    assert np.array_equal(camera_movement_per_frame, expected_camera_movement)
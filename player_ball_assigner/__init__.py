@@ -1 +1 @@
-from .player_ball_assigner import PlayerBallAssigner
\ No newline at end of file
+from .player_ball_assigner import PlayerBallAssigner, POSSESSION_RUN_DTYPE
\ No newline at end of file
@@ -1,6 +1,13 @@
+import numpy as np
 import sys 
 sys.path.append('../')
 from utils import get_center_of_bbox, measure_distance
+from track_store import TrackStore
+from instrumentation import instrument
+
+# One possession run: frames [start_frame, end_frame] (inclusive) in which the same player holds the ball
+POSSESSION_RUN_DTYPE = np.dtype([('start_frame', np.int32), ('end_frame', np.int32),
+                                 ('player_id', np.int32), ('team', np.int8)])
 
 # Define the PlayerBallAssigner class
 class PlayerBallAssigner():
@@ -37,3 +44,151 @@ class PlayerBallAssigner():
 
         # Return the ID of the assigned player, or -1 if no player is close enough
         return assigned_player
+
+    # Method to assign the ball to the nearest player in many frames at once
+    def assign_ball_to_frames(self, row_frames, player_bboxes, ball_bboxes):
+        """
+        Assigns the ball of every frame to the nearest player, exactly like assign_ball_to_player but for
+        all frames of a clip in one pass.
+
+        Parameters:
+        - row_frames (np.ndarray): Frame (index into ball_bboxes) of every player detection, shape (R,),
+          with the detections of a frame in the order assign_ball_to_player would visit them.
+        - player_bboxes (np.ndarray): Bounding box of every player detection, shape (R, 4).
+        - ball_bboxes (np.ndarray): Bounding box of the ball per frame, shape (F, 4); NaN where there is no ball.
+
+        Returns:
+        - assigned_rows (np.ndarray): Detection row holding the ball in every frame, -1 if no player is close enough.
+        """
+        row_frames = np.asarray(row_frames, dtype=np.intp)
+        player_bboxes = np.asarray(player_bboxes, dtype=np.float64).reshape(-1, 4)
+        ball_bboxes = np.asarray(ball_bboxes, dtype=np.float64).reshape(-1, 4)
+        assigned_rows = np.full(len(ball_bboxes), -1, dtype=np.intp)
+        if len(row_frames) == 0:
+            return assigned_rows
+
+        # Ball centre of the frame of every detection, truncated to whole pixels like get_center_of_bbox
+        ball_positions = np.trunc((ball_bboxes[:, :2] + ball_bboxes[:, 2:]) / 2)[row_frames]
+
+        # Distance from the ball to the left and right bottom corners of every player's bounding box
+        foot_y = player_bboxes[:, 3] - ball_positions[:, 1]
+        distance_left = np.sqrt((player_bboxes[:, 0] - ball_positions[:, 0]) ** 2 + foot_y ** 2)
+        distance_right = np.sqrt((player_bboxes[:, 2] - ball_positions[:, 0]) ** 2 + foot_y ** 2)
+        distance = np.minimum(distance_left, distance_right)
+        # Players too far away (or frames without a ball, whose distances are NaN) can never be assigned
+        distance = np.where(distance < self.max_player_ball_distance, distance, np.inf)
+
+        # The first row of every frame after a stable sort by (frame, distance) is its nearest player;
+        # on equal distances the earlier detection wins, as in assign_ball_to_player
+        order = np.lexsort((distance, row_frames))
+        sorted_frames = row_frames[order]
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = sorted_frames[1:] != sorted_frames[:-1]
+        nearest_rows = order[is_first]
+        nearest_rows = nearest_rows[np.isfinite(distance[nearest_rows])]
+        assigned_rows[row_frames[nearest_rows]] = nearest_rows
+        return assigned_rows
+
+    # Method to assign the ball to a player in every frame of the tracks and mark them with has_ball
+    @instrument("player_ball_assigner.assign_ball_to_tracks", frames="tracks")
+    def assign_ball_to_tracks(self, tracks, start_frame=0, end_frame=None):
+        """
+        Assigns the ball to a player in the frames [start_frame, end_frame) of the tracks and sets
+        'has_ball' on the assigned players.
+
+        Parameters:
+        - tracks (dict or TrackStore): Tracks with teams assigned to the players.
+        - start_frame (int): First frame of the range.
+        - end_frame (int): End of the range (exclusive); None for the end of the tracks.
+
+        Returns:
+        - assigned_players (np.ndarray): Track ID of the player holding the ball per frame of the range, -1 if none.
+        - assigned_teams (np.ndarray): Team of that player per frame of the range, 0 if none.
+        """
+        if end_frame is None:
+            end_frame = len(tracks['players'])
+        num_frames = max(end_frame - start_frame, 0)
+        ball_bboxes = np.full((num_frames, 4), np.nan)
+
+        if isinstance(tracks, TrackStore):
+            # The rows of the range are contiguous, as the rows of a table are ordered by frame
+            table = tracks['players']
+            first_row = table.frame_rows(start_frame)[0] if num_frames else 0
+            last_row = table.frame_rows(end_frame - 1)[1] if num_frames else 0
+            rows = slice(first_row, last_row)
+            row_frames = table.frames[rows] - start_frame
+            player_bboxes = table.column('bbox')[rows]
+            player_ids = table.track_ids[rows]
+            player_teams = table.column('team')[rows]
+
+            ball_table = tracks['ball']
+            ball_frames = ball_table.frames[:ball_table.size]
+            ball_rows = np.nonzero((ball_table.track_ids[:ball_table.size] == 1) &
+                                   (ball_frames >= start_frame) & (ball_frames < end_frame))[0]
+            ball_bboxes[ball_frames[ball_rows] - start_frame] = ball_table.column('bbox')[ball_rows]
+        else:
+            row_frames, player_bboxes, player_ids, player_teams = [], [], [], []
+            for frame_num in range(num_frames):
+                for player_id, player in tracks['players'][start_frame + frame_num].items():
+                    row_frames.append(frame_num)
+                    player_bboxes.append(player['bbox'])
+                    player_ids.append(player_id)
+                    player_teams.append(player.get('team', 0))
+                ball_track = tracks['ball'][start_frame + frame_num]
+                if 1 in ball_track:
+                    ball_bboxes[frame_num] = ball_track[1]['bbox']
+            player_ids = np.array(player_ids, dtype=np.int64)
+            player_teams = np.array(player_teams, dtype=np.int64)
+
+        assigned_rows = self.assign_ball_to_frames(row_frames, player_bboxes, ball_bboxes)
+        has_ball = assigned_rows != -1
+        assigned_players = np.full(num_frames, -1, dtype=np.int64)
+        assigned_teams = np.zeros(num_frames, dtype=np.int64)
+        assigned_players[has_ball] = player_ids[assigned_rows[has_ball]]
+        assigned_teams[has_ball] = player_teams[assigned_rows[has_ball]]
+
+        # Mark the players holding the ball
+        if isinstance(tracks, TrackStore):
+            table.set_column('has_ball', True, rows=first_row + assigned_rows[has_ball])
+        else:
+            for frame_num in np.nonzero(has_ball)[0]:
+                tracks['players'][start_frame + frame_num][assigned_players[frame_num]]['has_ball'] = True
+
+        return assigned_players, assigned_teams
+
+    # Method to get the team in control of the ball per frame; a team keeps control until the other team gets the ball
+    def get_team_ball_control(self, assigned_teams, initial_team=0):
+        assigned_teams = np.asarray(assigned_teams)
+        # Index of the last frame (up to each frame) in which a player had the ball
+        last_assigned = np.where(assigned_teams > 0, np.arange(len(assigned_teams)), -1)
+        last_assigned = np.maximum.accumulate(last_assigned) if len(last_assigned) else last_assigned
+        return np.where(last_assigned >= 0, assigned_teams[np.maximum(last_assigned, 0)], initial_team)
+
+    # Method to split the assignments into runs of consecutive frames in which the same player holds the ball
+    def get_possession_runs(self, assigned_players, assigned_teams, start_frame=0):
+        """
+        Parameters:
+        - assigned_players (np.ndarray): Player holding the ball per frame, -1 if none (see assign_ball_to_tracks).
+        - assigned_teams (np.ndarray): Team of that player per frame.
+        - start_frame (int): Frame number of the first entry, added to the frame numbers of the runs.
+
+        Returns:
+        - runs (np.ndarray): Structured array of POSSESSION_RUN_DTYPE, one entry per run in frame order.
+        """
+        assigned_players = np.asarray(assigned_players)
+        assigned_teams = np.asarray(assigned_teams)
+        if len(assigned_players) == 0:
+            return np.zeros(0, dtype=POSSESSION_RUN_DTYPE)
+
+        # A run starts wherever the assigned player changes; frames without a player are not part of any run
+        starts = np.concatenate([[0], np.nonzero(np.diff(assigned_players) != 0)[0] + 1])
+        ends = np.append(starts[1:], len(assigned_players)) - 1
+        held = assigned_players[starts] != -1
+        starts, ends = starts[held], ends[held]
+
+        runs = np.zeros(len(starts), dtype=POSSESSION_RUN_DTYPE)
+        runs['start_frame'] = starts + start_frame
+        runs['end_frame'] = ends + start_frame
+        runs['player_id'] = assigned_players[starts]
+        runs['team'] = assigned_teams[starts]
+        return runs
\ No newline at end of file
@@ -0,0 +1 @@
+from .result_cache import ResultCache, file_fingerprint, make_key
\ No newline at end of file
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+# Bump when the format of cached results changes, so old entries are never read again
+CACHE_VERSION = 1
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    # Hash the full contents of a file (video or model weights) with SHA-256
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(**parts):
+    # Build a cache key from JSON-serialisable parts (fingerprints and stage parameters)
+    payload = json.dumps({"version": CACHE_VERSION, **parts}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cache_dir='cache', max_bytes=2 * 1024 ** 3):
+        """
+        On-disk cache of stage results, addressed by the hash of their inputs.
+
+        Entries live in <cache_dir>/<stage>/<key>.pkl. Because the key covers the input video,
+        the model weights and the stage parameters, any change to them produces a new key and
+        stale results are never returned. The least recently used entries are evicted once the
+        cache grows beyond max_bytes.
+
+        Parameters:
+        - cache_dir (str): Directory holding the cache.
+        - max_bytes (int): Size limit of all entries together.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fingerprints_path = os.path.join(cache_dir, 'fingerprints.json')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def fingerprint(self, path):
+        # Content hash of a file, remembered per (path, size, modification time) to avoid re-hashing big videos
+        stat = os.stat(path)
+        path_key = os.path.abspath(path)
+        fingerprints = {}
+        if os.path.exists(self.fingerprints_path):
+            try:
+                with open(self.fingerprints_path, 'r') as f:
+                    fingerprints = json.load(f)
+            except (OSError, ValueError):
+                fingerprints = {}
+
+        known = fingerprints.get(path_key)
+        if known is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        sha256 = file_fingerprint(path)
+        fingerprints[path_key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+        self._atomic_write(self.fingerprints_path, json.dumps(fingerprints).encode('utf-8'))
+        return sha256
+
+    def entry_path(self, stage, key):
+        return os.path.join(self.cache_dir, stage, f"{key}.pkl")
+
+    def get(self, stage, key):
+        # Return the cached result of a stage, or None on a miss
+        path = self.entry_path(stage, key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            # Not cached, or just evicted by another worker sharing the cache
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # A truncated or corrupted entry is dropped and treated as a miss
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # Mark the entry as recently used
+        except FileNotFoundError:
+            pass  # Evicted by another worker after it was read; the value is still valid
+        return value
+
+    def put(self, stage, key, value):
+        # Store the result of a stage, then evict old entries if the cache is too big
+        path = self.entry_path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._atomic_write(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict(keep=path)
+
+    def entries(self):
+        # List (last use time, size, path) of every cached entry
+        entries = []
+        for stage in os.listdir(self.cache_dir):
+            stage_dir = os.path.join(self.cache_dir, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for name in os.listdir(stage_dir):
+                if name.endswith('.pkl'):
+                    path = os.path.join(stage_dir, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue  # Evicted by another worker in the meantime
+                    entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def evict(self, keep=None):
+        # Remove the least recently used entries until the cache fits into max_bytes
+        entries = sorted(self.entries())
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total_bytes -= size
+
+    def clear(self):
+        # Remove every cached entry
+        for _, _, path in self.entries():
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _atomic_write(self, path, data):
+        # Write through a temporary file so readers never see a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
@@ -1 +1 @@
-from .speed_and_distance_estimator import SpeedAndDistance_Estimator
+from .speed_and_distance_estimator import SpeedAndDistance_Estimator, PLAYER_STATS_DTYPE
\ No newline at end of file
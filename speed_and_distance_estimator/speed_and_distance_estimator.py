@@ -1,16 +1,68 @@
-import cv2 
+import cv2
+import numpy as np
 import sys  # Import the sys module to manipulate the Python runtime environment
 sys.path.append('../')  # Add the parent directory to the system path to access utility functions
-from utils import measure_distance, get_foot_position  
+from utils import measure_distance, get_foot_position
+from track_store import TrackStore, ObjectTrackTable
+from instrumentation import instrument
+
+# Per-player summary row of SpeedAndDistance_Estimator.get_player_stats
+PLAYER_STATS_DTYPE = np.dtype([("track_id", np.int32), ("top_speed", np.float32),
+                               ("sprints", np.int32), ("distance", np.float32)])
 
 class SpeedAndDistance_Estimator():
-    def __init__(self):
-        # Initialize class parameters for the speed and distance estimator
-        self.frame_window = 5  # Set the number of frames between which the distance is measured
-        self.frame_rate = 24  # Set the frame rate (frames per second) of the video
+    def __init__(self, frame_rate=24, window_seconds=5 / 24, smoothing_seconds=None, sprint_speed=25.0,
+                 min_sprint_seconds=1.0):
+        """
+        Measures the speed and the distance covered of every player from its court positions.
+
+        Speeds are measured over windows of window_seconds, which holds the same stretch of time whatever the
+        frame rate of the broadcast (5 frames at 24 fps, 6 at 30 fps, 10 at 50 fps).
+
+        Parameters:
+        - frame_rate (float): Frame rate of the video, e.g. from utils.get_video_fps.
+        - window_seconds (float): Duration of the windows speeds are measured over.
+        - smoothing_seconds (float): When set, every track's court positions are smoothed with a centred moving
+          average of this duration before measuring, which removes detection jitter from speeds and distances
+          (whole-video tracks only).
+        - sprint_speed (float): Speed in km/h from which a player counts as sprinting.
+        - min_sprint_seconds (float): Shortest run above sprint_speed counted as a sprint.
+        """
+        self.window_seconds = window_seconds
+        self.smoothing_seconds = smoothing_seconds
+        self.sprint_speed = sprint_speed
+        self.min_sprint_seconds = min_sprint_seconds
+        self.set_frame_rate(frame_rate)
+
+    def set_frame_rate(self, frame_rate):
+        # Set the frame rate (frames per second) of the video and the number of frames between which the distance is measured
+        self.frame_rate = frame_rate
+        self.frame_window = max(int(round(self.window_seconds * frame_rate)), 1)
 
+    @instrument("speed_and_distance.add_speed_and_distance_to_tracks", frames="tracks")
     def add_speed_and_distance_to_tracks(self, tracks):
         # Add speed and distance information to the tracks of objects in the video
+        if isinstance(tracks, TrackStore):
+            # Columnar tracks are processed one object type at a time with array operations
+            for object, table in tracks.items():
+                if object == "ball" or object == "referees":
+                    continue
+                self.add_speed_and_distance_to_table(table)
+            return
+
+        if self.smoothing_seconds:
+            # Smoothing needs every track's full series, so the nested tracks go through the columnar path
+            for object, object_tracks in tracks.items():
+                if object == "ball" or object == "referees":
+                    continue
+                table = ObjectTrackTable.from_frames(object_tracks)
+                self.add_speed_and_distance_to_table(table)
+                for frame_num, track in enumerate(table):
+                    for track_id, track_info in track.items():
+                        if 'speed' in track_info:
+                            object_tracks[frame_num][track_id]['speed'] = track_info['speed']
+                            object_tracks[frame_num][track_id]['distance'] = track_info['distance']
+            return
 
         total_distance = {}  # Dictionary to store the total distance covered by each tracked object
 
@@ -26,41 +78,267 @@ class SpeedAndDistance_Estimator():
             for frame_num in range(0, number_of_frames, self.frame_window):
                 last_frame = min(frame_num + self.frame_window, number_of_frames - 1)  # Define the last frame in the current window
 
-                # Iterate over all track IDs in the current frame
-                for track_id, _ in object_tracks[frame_num].items():
-                    if track_id not in object_tracks[last_frame]:  # Check if the track ID exists in the last frame of the window
-                        continue
+                # Measure the speed over the window and accumulate the distance of every track in it
+                self.add_speed_and_distance_to_window(object_tracks[frame_num:last_frame + 1],
+                                                      total_distance.setdefault(object, {}))
+
+    def add_speed_and_distance_to_window(self, window_tracks, total_distance):
+        # Add speed and distance to one frame window, given as the list of per-frame tracks from its
+        # first frame up to and including its last frame; total_distance maps track IDs to metres so far
+        last_frame = len(window_tracks) - 1
+        if last_frame < 1:  # A window needs two frames to measure any movement
+            return
+
+        # Iterate over all track IDs in the first frame of the window
+        for track_id, _ in window_tracks[0].items():
+            if track_id not in window_tracks[last_frame]:  # Check if the track ID exists in the last frame of the window
+                continue
+
+            # Get the transformed start and end positions of the object between the first and last frame
+            start_position = window_tracks[0][track_id]['position_transformed']
+            end_position = window_tracks[last_frame][track_id]['position_transformed']
+
+            # If either position is None (out of bounds), skip to the next track
+            if start_position is None or end_position is None:
+                continue
+
+            # Measure the distance covered between the start and end positions
+            distance_covered = measure_distance(start_position, end_position)
+            time_elapsed = last_frame / self.frame_rate  # Calculate the time elapsed between frames
+            speed_meteres_per_second = distance_covered / time_elapsed  # Calculate speed in meters per second
+            speed_km_per_hour = speed_meteres_per_second * 3.6  # Convert speed to kilometers per hour
+
+            # Initialize or update the total distance for the track ID
+            if track_id not in total_distance:
+                total_distance[track_id] = 0
+
+            # Add the distance covered to the total distance for the track ID
+            total_distance[track_id] += distance_covered
+
+            # Update the speed and distance for each frame in the batch
+            for frame_tracks in window_tracks[:last_frame]:
+                if track_id not in frame_tracks:  # Skip if the track ID is not present in the current frame batch
+                    continue
+                frame_tracks[track_id]['speed'] = speed_km_per_hour  # Assign calculated speed
+                frame_tracks[track_id]['distance'] = total_distance[track_id]  # Assign total distance covered
+
+    def add_speed_and_distance_causal(self, frame_num, frame_tracks, state):
+        """
+        Causal variant for live streams, which only looks at frames that have already been seen.
+
+        Every frame_window frames the speed is measured between the frame the window started on and the current
+        frame, as a window of add_speed_and_distance_to_tracks, but it is assigned from the current frame onwards
+        instead of to the window's own frames. Every frame gets the latest measurement of each of its tracks.
+        Frames may be skipped; the elapsed time is taken from the frame numbers.
+
+        Parameters:
+        - frame_num (int): Number of the frame in the stream.
+        - frame_tracks (dict): Player tracks of the frame, with "position_transformed".
+        - state (dict): Running state of the stream; pass an empty dictionary for the first frame.
+        """
+        total_distance = state.setdefault("total_distance", {})
+        measurements = state.setdefault("measurements", {})  # Track ID -> (speed, distance)
+
+        window_start = state.get("window_start")
+        if window_start is None:
+            state["window_start"] = (frame_num, frame_tracks)
+        elif frame_num - window_start[0] >= self.frame_window:
+            start_frame_num, start_tracks = window_start
+            time_elapsed = (frame_num - start_frame_num) / self.frame_rate
+            for track_id, track in frame_tracks.items():
+                if track_id not in start_tracks:
+                    continue
+                start_position = start_tracks[track_id].get('position_transformed')
+                end_position = track.get('position_transformed')
+                if start_position is None or end_position is None:
+                    continue
+                distance_covered = measure_distance(start_position, end_position)
+                total_distance[track_id] = total_distance.get(track_id, 0) + distance_covered
+                measurements[track_id] = (distance_covered / time_elapsed * 3.6, total_distance[track_id])
+            state["window_start"] = (frame_num, frame_tracks)
+
+        for track_id, track in frame_tracks.items():
+            if track_id in measurements:
+                track['speed'], track['distance'] = measurements[track_id]
+
+    def add_speed_and_distance_to_table(self, table):
+        # Vectorized equivalent of the frame window loop for one ObjectTrackTable
+        number_of_frames = len(table)
+        if number_of_frames < 2 or table.size == 0:
+            return
+
+        frames = table.frames[:table.size].astype(np.int64)
+        track_ids = table.track_ids[:table.size].astype(np.int64)
+        positions = table.column('position_transformed').astype(np.float64)
+        has_position = table.present['position_transformed'][:table.size] & ~np.isnan(positions).any(axis=1)
+        if self.smoothing_seconds:
+            positions = self.smooth_positions(frames, track_ids, positions, has_position, number_of_frames)
+
+        # Identify every row by a single (frame, track_id) key for fast lookups
+        key_scale = int(track_ids.max()) + 1
+        keys = frames * key_scale + track_ids
+        key_order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[key_order]
 
-                    # Get the transformed start and end positions of the object between frame_num and last_frame
-                    start_position = object_tracks[frame_num][track_id]['position_transformed']
-                    end_position = object_tracks[last_frame][track_id]['position_transformed']
+        def find_rows(query_keys):
+            # Return the row of each (frame, track_id) key and whether it exists
+            index = np.minimum(np.searchsorted(sorted_keys, query_keys), len(sorted_keys) - 1)
+            return key_order[index], sorted_keys[index] == query_keys
 
-                    # If either position is None (out of bounds), skip to the next track
-                    if start_position is None or end_position is None:
+        # Rows on the first frame of a window, paired with the same track on the last frame of that window
+        start_rows = np.nonzero(frames % self.frame_window == 0)[0]
+        start_frames = frames[start_rows]
+        last_frames = np.minimum(start_frames + self.frame_window, number_of_frames - 1)
+        end_rows, found = find_rows(last_frames * key_scale + track_ids[start_rows])
+
+        # Keep windows where the track is seen at both ends inside the court
+        valid = found & (last_frames > start_frames) & has_position[start_rows] & has_position[end_rows]
+        start_rows, end_rows = start_rows[valid], end_rows[valid]
+        start_frames, last_frames = start_frames[valid], last_frames[valid]
+
+        # Measure the distance covered and the speed over each window
+        displacement = positions[end_rows] - positions[start_rows]
+        distance_covered = np.sqrt(displacement[:, 0] ** 2 + displacement[:, 1] ** 2)
+        time_elapsed = (last_frames - start_frames) / self.frame_rate
+        speed_km_per_hour = distance_covered / time_elapsed * 3.6
+
+        # Accumulate the total distance of each track over its windows, in frame order
+        window_track_ids = track_ids[start_rows]
+        window_order = np.lexsort((start_frames, window_track_ids))
+        group_starts = np.nonzero(np.diff(window_track_ids[window_order]))[0] + 1
+        total_distance = np.empty_like(distance_covered)
+        for track_windows in np.split(window_order, group_starts):
+            total_distance[track_windows] = np.cumsum(distance_covered[track_windows])
+
+        # Hand every row the values of its window, except rows on the last frame of that window
+        if len(start_rows) == 0:
+            return
+        window_keys = start_frames * key_scale + window_track_ids
+        window_key_order = np.argsort(window_keys)
+        sorted_window_keys = window_keys[window_key_order]
+        row_keys = (frames - frames % self.frame_window) * key_scale + track_ids
+        index = np.minimum(np.searchsorted(sorted_window_keys, row_keys), len(sorted_window_keys) - 1)
+        row_windows = window_key_order[index]
+        rows = (sorted_window_keys[index] == row_keys) & (frames < last_frames[row_windows])
+
+        table.set_column('speed', speed_km_per_hour[row_windows[rows]], rows)
+        table.set_column('distance', total_distance[row_windows[rows]], rows)
+
+    def smooth_positions(self, frames, track_ids, positions, has_position, number_of_frames):
+        # Centred moving average of every track's positions over smoothing_seconds, computed for all rows at
+        # once from running sums over the rows sorted by track and frame; rows without a position stay as they are
+        half_window = int(round(self.smoothing_seconds * self.frame_rate / 2))
+        if half_window < 1:
+            return positions
+
+        # Keys that sort rows by track, then frame, with a gap between tracks wider than the window
+        key_scale = number_of_frames + 2 * half_window + 1
+        order = np.lexsort((frames, track_ids))
+        keys = track_ids[order] * key_scale + frames[order]
+        low = np.searchsorted(keys, keys - half_window, side='left')
+        high = np.searchsorted(keys, keys + half_window, side='right')
+
+        valid = has_position[order]
+        sums = np.concatenate([np.zeros((1, 2)), np.cumsum(np.where(valid[:, None], positions[order], 0.0), axis=0)])
+        counts = np.concatenate([[0], np.cumsum(valid)])
+
+        smoothed = positions.copy()
+        rows = order[valid]
+        smoothed[rows] = (sums[high] - sums[low])[valid] / (counts[high] - counts[low])[valid][:, None]
+        return smoothed
+
+    @instrument("speed_and_distance.get_player_stats", frames="tracks")
+    def get_player_stats(self, tracks, interval_seconds=300.0):
+        """
+        Summarises the speeds and distances of every player, after add_speed_and_distance_to_tracks.
+
+        Parameters:
+        - tracks (dict or TrackStore): Tracks with speed and distance.
+        - interval_seconds (float): Length of the intervals the distance is split into (5 minutes by default).
+
+        Returns:
+        - stats (np.ndarray): One PLAYER_STATS_DTYPE row per player track: top speed (km/h), number of sprints
+          (runs of at least min_sprint_seconds at sprint_speed or faster) and total distance (m).
+        - distance_per_interval (np.ndarray): Distance covered by every player in every interval, of shape
+          (players, intervals).
+        """
+        table = TrackStore.from_tracks(tracks)["players"]
+        measured = table.present['speed'][:table.size] & table.present['distance'][:table.size]
+        frames = table.frames[:table.size][measured].astype(np.int64)
+        track_ids = table.track_ids[:table.size][measured].astype(np.int64)
+        speeds = table.column('speed')[measured]
+        distances = table.column('distance')[measured]
+
+        player_ids, players = np.unique(track_ids, return_inverse=True)
+        stats = np.zeros(len(player_ids), dtype=PLAYER_STATS_DTYPE)
+        stats["track_id"] = player_ids
+
+        # Top speed and total distance; distances are running totals, so the largest is the last
+        top_speeds = np.zeros(len(player_ids))
+        total_distances = np.zeros(len(player_ids))
+        np.maximum.at(top_speeds, players, speeds)
+        np.maximum.at(total_distances, players, distances)
+        stats["top_speed"] = top_speeds
+        stats["distance"] = total_distances
+
+        # Sprints are runs of consecutive frames of one track at sprint speed
+        order = np.lexsort((frames, track_ids))
+        fast = speeds[order] >= self.sprint_speed
+        same_run = np.zeros(len(order), dtype=np.bool_)
+        same_run[1:] = (fast[:-1] & (track_ids[order][1:] == track_ids[order][:-1])
+                        & (frames[order][1:] == frames[order][:-1] + 1))
+        run_starts = np.nonzero(fast & ~same_run)[0]
+        run_lengths = np.bincount(np.cumsum(fast & ~same_run)[fast] - 1, minlength=len(run_starts))
+        min_sprint_frames = max(int(round(self.min_sprint_seconds * self.frame_rate)), 1)
+        sprint_players = players[order][run_starts[run_lengths >= min_sprint_frames]]
+        stats["sprints"] = np.bincount(sprint_players, minlength=len(player_ids))
+
+        # Distance per interval, from the running total reached by the end of each interval
+        interval_frames = max(int(round(interval_seconds * self.frame_rate)), 1)
+        number_of_intervals = max(-(-table.num_frames // interval_frames), 1)
+        reached = np.zeros((len(player_ids), number_of_intervals))
+        np.maximum.at(reached, (players, frames // interval_frames), distances)
+        reached = np.maximum.accumulate(reached, axis=1)
+        distance_per_interval = np.diff(reached, axis=1, prepend=0.0)
+
+        return stats, distance_per_interval
+
+    def draw_frame_speed_and_distance(self, frame, frame_tracks):
+        # Draw speed and distance information of a single frame's tracks in place
+
+        # Iterate through each tracked object in the current frame
+        for object, object_tracks in frame_tracks.items():
+            # Skip ball and referees as we are only interested in players' movements
+            if object == "ball" or object == "referees":
+                continue
+
+            # Iterate through each track ID and its associated information
+            for _, track_info in object_tracks.items():
+                if "speed" in track_info:  # Check if speed data is available
+                    speed = track_info.get('speed', None)  # Get the speed value
+                    distance = track_info.get('distance', None)  # Get the distance value
+                    if speed is None or distance is None:  # Skip if either value is missing
                         continue
 
-                    # Measure the distance covered between the start and end positions
-                    distance_covered = measure_distance(start_position, end_position)
-                    time_elapsed = (last_frame - frame_num) / self.frame_rate  # Calculate the time elapsed between frames
-                    speed_meteres_per_second = distance_covered / time_elapsed  # Calculate speed in meters per second
-                    speed_km_per_hour = speed_meteres_per_second * 3.6  # Convert speed to kilometers per hour
-
-                    # Initialize or update the total distance for the current object and track ID
-                    if object not in total_distance:
-                        total_distance[object] = {}
-                    
-                    if track_id not in total_distance[object]:
-                        total_distance[object][track_id] = 0
-
-                    # Add the distance covered to the total distance for the track ID
-                    total_distance[object][track_id] += distance_covered
-
-                    # Update the speed and distance for each frame in the batch
-                    for frame_num_batch in range(frame_num, last_frame):
-                        if track_id not in tracks[object][frame_num_batch]:  # Skip if the track ID is not present in the current frame batch
-                            continue
-                        tracks[object][frame_num_batch][track_id]['speed'] = speed_km_per_hour  # Assign calculated speed
-                        tracks[object][frame_num_batch][track_id]['distance'] = total_distance[object][track_id]  # Assign total distance covered
+                    # Get the bounding box of the object and calculate the foot position
+                    bbox = track_info['bbox']
+                    position = get_foot_position(bbox)  # Get the position of the object (near foot)
+                    position = list(position)  # Convert the position to a list
+                    position[1] += 40  # Adjust the vertical position to draw text below the bounding box
+
+                    position = tuple(map(int, position))  # Convert position back to a tuple of integers
+
+                    # Draw the speed information on the frame at the calculated position
+                    cv2.putText(frame, f"{speed:.2f} km/h", position,
+                                       cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                                      (74, 7, 20), 2)  # Grey color for speed
+
+                    # Draw the distance information below the speed
+                    cv2.putText(frame, f"{distance:.2f} m", (position[0], position[1] + 20),
+                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                                      (74, 7, 20), 2)  # Grey color for distance
+
+        return frame
 
     def draw_speed_and_distance(self, frames, tracks):
         # Draw speed and distance information on each frame of the video
@@ -69,38 +347,14 @@ class SpeedAndDistance_Estimator():
 
         # Iterate through each frame and add speed and distance data
         for frame_num, frame in enumerate(frames):
-            # Iterate through each tracked object in the current frame
-            for object, object_tracks in tracks.items():
-                # Skip ball and referees as we are only interested in players' movements
-                if object == "ball" or object == "referees":
-                    continue
-
-                # Iterate through each track ID and its associated information
-                for _, track_info in object_tracks[frame_num].items():
-                    if "speed" in track_info:  # Check if speed data is available
-                        speed = track_info.get('speed', None)  # Get the speed value
-                        distance = track_info.get('distance', None)  # Get the distance value
-                        if speed is None or distance is None:  # Skip if either value is missing
-                            continue
-
-                        # Get the bounding box of the object and calculate the foot position
-                        bbox = track_info['bbox']
-                        position = get_foot_position(bbox)  # Get the position of the object (near foot)
-                        position = list(position)  # Convert the position to a list
-                        position[1] += 40  # Adjust the vertical position to draw text below the bounding box
-
-                        position = tuple(map(int, position))  # Convert position back to a tuple of integers
-
-                        # Draw the speed information on the frame at the calculated position
-                        cv2.putText(frame, f"{speed:.2f} km/h", position, 
-                                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, 
-                                          (74, 7, 20), 2)  # Grey color for speed
-
-                        # Draw the distance information below the speed
-                        cv2.putText(frame, f"{distance:.2f} m", (position[0], position[1] + 20), 
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, 
-                                          (74, 7, 20), 2)  # Grey color for distance
-                       
+            frame_tracks = {object: object_tracks[frame_num] for object, object_tracks in tracks.items()}
+            self.draw_frame_speed_and_distance(frame, frame_tracks)
             output_frames.append(frame)  # Add the annotated frame to the output list
 
         return output_frames  # Return the list of frames with drawn speed and distance information
+
+    def draw_speed_and_distance_stream(self, packets):
+        # Draw speed and distance information on a stream of frame packets
+        for packet in packets:
+            self.draw_frame_speed_and_distance(packet["frame"], packet["tracks"])
+            yield packet
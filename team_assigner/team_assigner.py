@@ -1,92 +1,320 @@
-from sklearn.cluster import KMeans
+from collections import deque
+import numpy as np
+import sys
+sys.path.append('../')
+from track_store import TrackStore
+from instrumentation import instrument
+
+
+def two_means(points, offsets, iterations=20):
+    """
+    Clusters several groups of points into two clusters each, all groups at once.
+
+    The points of a group are contiguous and every group holds at least one point. Each group starts
+    from its darkest and brightest point and runs Lloyd iterations until its centers stop moving.
+
+    Parameters:
+    - points (np.ndarray): Points of all groups, shape (P, C).
+    - offsets (np.ndarray): Index of the first point of every group, shape (G,), increasing.
+    - iterations (int): Maximum number of Lloyd iterations.
+
+    Returns:
+    - centers (np.ndarray): Two cluster centers per group, shape (G, 2, C).
+    - labels (np.ndarray): Cluster (0 or 1) of every point, shape (P,).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    num_groups, num_channels = len(offsets), points.shape[1]
+    counts = np.diff(np.append(offsets, len(points)))
+    groups = np.repeat(np.arange(num_groups), counts)
+
+    # Seed every group with its darkest and brightest point
+    order = np.lexsort((points.sum(axis=1), groups))
+    centers = np.stack([points[order[offsets]], points[order[offsets + counts - 1]]], axis=1)
+
+    def assign(centers):
+        # A point is nearer to center 1 than to center 0 when p.(c1 - c0) > (|c1|^2 - |c0|^2) / 2
+        direction = centers[:, 1] - centers[:, 0]
+        threshold = (np.square(centers[:, 1]).sum(axis=1) - np.square(centers[:, 0]).sum(axis=1)) / 2
+        return (np.einsum('ij,ij->i', points, direction[groups]) > threshold[groups]).astype(np.intp)
+
+    for _ in range(iterations):
+        labels = assign(centers)
+
+        # Mean of every (group, cluster) pair; an empty cluster keeps its previous center
+        bins = groups * 2 + labels
+        sizes = np.bincount(bins, minlength=num_groups * 2)
+        sums = np.stack([np.bincount(bins, weights=points[:, channel], minlength=num_groups * 2)
+                         for channel in range(num_channels)], axis=1)
+        previous = centers.reshape(-1, num_channels)
+        new_centers = np.where(sizes[:, None] > 0, sums / np.maximum(sizes, 1)[:, None], previous)
+        new_centers = new_centers.reshape(num_groups, 2, num_channels)
+        if np.array_equal(new_centers, centers):
+            break
+        centers = new_centers
+
+    return centers, assign(centers)
+
 
 # Define the TeamAssigner class
 class TeamAssigner:
-    def __init__(self):
+    def __init__(self, temporal=False, votes_per_track=5, sample_interval=24, max_crops_per_frame=8):
+        """
+        Assigns players to the two teams by the colour of their uniform.
+
+        By default a track is classified once, from its first crop. In temporal mode every track keeps the
+        team votes of its last few crops, sampled across time, and takes the majority; a vote against the
+        majority (e.g. after ByteTrack swapped two IDs) makes the track be sampled again on the next frame.
+
+        Parameters:
+        - temporal (bool): Vote over crops sampled across time instead of trusting the first crop.
+        - votes_per_track (int): Number of recent votes kept per track in temporal mode.
+        - sample_interval (int): Frames between two regular samples of the same track in temporal mode.
+        - max_crops_per_frame (int): Crops re-sampled per frame at most in temporal mode; tracks seen for
+          the first time are always classified on top of it, so every player has a team.
+        """
         # Initialize dictionaries to store team colors and player-to-team assignments
         self.team_colors = {}
         self.player_team_dict = {}
-    
-    # Method to get a KMeans clustering model based on the provided image
-    def get_clustering_model(self, image):
-        # Reshape the image into a 2D array where each row is a pixel and columns are RGB values
-        image_2d = image.reshape(-1, 3)
 
-        # Perform K-means clustering with 2 clusters
-        kmeans = KMeans(n_clusters=2, init="k-means++", n_init=1)
-        kmeans.fit(image_2d)
+        # Temporal voting state: recent team votes and frame of the last sample of every track
+        self.temporal = temporal
+        self.votes_per_track = votes_per_track
+        self.sample_interval = sample_interval
+        self.max_crops_per_frame = max_crops_per_frame
+        self.track_votes = {}
+        self.last_sample_frame = {}
+        self.suspected_swaps = set()
 
-        # Return the trained KMeans model
-        return kmeans
+        # Uniform colour of every track seen so far, as (color, confidence)
+        self.player_color_cache = {}
+        # Cached colours below this confidence are extracted again when the track is seen next
+        self.min_color_confidence = 0.5
+        # Distance between the uniform and background colours at which a crop is fully trusted
+        self.full_confidence_distance = 80.0
 
-    # Method to get the dominant color of the player's uniform within the bounding box (bbox)
-    def get_player_color(self, frame, bbox):
-        # Crop the player's bounding box from the frame
-        image = frame[int(bbox[1]):int(bbox[3]), int(bbox[0]):int(bbox[2])]
+    # Method to get the uniform colours of several players of one frame at once
+    def get_player_colors(self, frame, bboxes):
+        """
+        Extracts the uniform colour of every bounding box of a frame with a single batched clustering.
+
+        The top half of each crop is split into two colour clusters; the cluster holding most of the crop
+        corners is the background, the other one the uniform.
 
-        # Extract the top half of the cropped image (where the uniform is more likely to be visible)
-        top_half_image = image[0:int(image.shape[0]/2), :]
+        Parameters:
+        - frame (np.ndarray): Video frame.
+        - bboxes (list): Bounding boxes (x1, y1, x2, y2) of the players.
 
-        # Get a clustering model for the top half image
-        kmeans = self.get_clustering_model(top_half_image)
+        Returns:
+        - colors (np.ndarray): Uniform colour of every box, shape (N, 3); NaN for boxes without pixels.
+        - confidences (np.ndarray): Confidence of every colour in [0, 1], 0 for boxes without pixels.
+        """
+        colors = np.full((len(bboxes), 3), np.nan)
+        confidences = np.zeros(len(bboxes))
 
-        # Get the cluster labels for each pixel in the top half image
-        labels = kmeans.labels_
+        # Crop the top half of every box (where the uniform is more likely to be visible)
+        crops, indices = [], []
+        for index, bbox in enumerate(bboxes):
+            image = frame[int(bbox[1]):int(bbox[3]), int(bbox[0]):int(bbox[2])]
+            top_half_image = image[0:int(image.shape[0]/2), :]
+            if top_half_image.size > 0:
+                crops.append(top_half_image)
+                indices.append(index)
+        if not crops:
+            return colors, confidences
 
-        # Reshape the labels back to the shape of the top half image
-        clustered_image = labels.reshape(top_half_image.shape[0], top_half_image.shape[1])
+        # Cluster the pixels of all crops together, each crop being its own group
+        heights = np.array([crop.shape[0] for crop in crops])
+        widths = np.array([crop.shape[1] for crop in crops])
+        offsets = np.concatenate([[0], np.cumsum(heights * widths)[:-1]])
+        centers, labels = two_means(np.concatenate([crop.reshape(-1, 3) for crop in crops]), offsets)
 
-        # Determine the cluster representing the player's uniform color by analyzing the corner clusters
-        corner_clusters = [clustered_image[0, 0], clustered_image[0, -1], clustered_image[-1, 0], clustered_image[-1, -1]]
-        non_player_cluster = max(set(corner_clusters), key=corner_clusters.count)
-        player_cluster = 1 - non_player_cluster
+        # The cluster of most corners is the background; on a tie cluster 0 is, as with the single-crop version
+        corners = offsets[:, None] + np.stack([np.zeros_like(widths), widths - 1,
+                                               (heights - 1) * widths, heights * widths - 1], axis=1)
+        corner_votes = labels[corners].sum(axis=1)
+        player_cluster = (corner_votes <= 2).astype(np.intp)
+        group_index = np.arange(len(crops))
+        player_colors = centers[group_index, player_cluster]
+        background_colors = centers[group_index, 1 - player_cluster]
 
-        # Get the RGB color of the player's uniform cluster
-        player_color = kmeans.cluster_centers_[player_cluster]
+        # Confidence grows with the agreement of the corners and the contrast to the background
+        agreement = np.maximum(corner_votes, 4 - corner_votes) / 4
+        contrast = np.linalg.norm(player_colors - background_colors, axis=1) / self.full_confidence_distance
+        colors[indices] = player_colors
+        confidences[indices] = agreement * np.minimum(contrast, 1.0)
+        return colors, confidences
 
-        # Return the player's uniform color
-        return player_color
+    # Method to get the dominant color of the player's uniform within the bounding box (bbox)
+    def get_player_color(self, frame, bbox):
+        colors, _ = self.get_player_colors(frame, [bbox])
+        return colors[0]
+
+    # Method to get the uniform colour of every track of a frame, reusing the cached colours
+    def get_track_colors(self, frame, player_detections):
+        # Only tracks without a confident cached colour are cropped and clustered, all in one batch
+        pending = [player_id for player_id in player_detections
+                   if self.player_color_cache.get(player_id, (None, 0.0))[1] < self.min_color_confidence]
+        if pending:
+            colors, confidences = self.get_player_colors(frame, [player_detections[player_id]['bbox'] for player_id in pending])
+            for player_id, color, confidence in zip(pending, colors, confidences):
+                cached = self.player_color_cache.get(player_id)
+                if cached is None or confidence > cached[1] or np.isnan(cached[0]).any():
+                    self.player_color_cache[player_id] = (color, confidence)
+
+        return {player_id: self.player_color_cache[player_id][0] for player_id in player_detections}
 
     # Method to assign team colors based on player detections in the first frame
+    @instrument("team_assigner.assign_team_color", frames=1)
     def assign_team_color(self, frame, player_detections):
-        
-        player_colors = []
-        # Loop through each player's detection and extract their uniform color
-        for _, player_detection in player_detections.items():
-            bbox = player_detection["bbox"]
-            player_color = self.get_player_color(frame, bbox)
-            player_colors.append(player_color)
-        
-        # Perform K-means clustering on the extracted player colors to identify team clusters
-        kmeans = KMeans(n_clusters=2, init="k-means++", n_init=10)
-        kmeans.fit(player_colors)
-
-        # Store the trained KMeans model
-        self.kmeans = kmeans
+        # Extract the uniform colours of all players in one batch
+        player_colors = np.array(list(self.get_track_colors(frame, player_detections).values())).reshape(-1, 3)
+        player_colors = player_colors[~np.isnan(player_colors).any(axis=1)]
+
+        # Cluster the extracted player colors into the two teams
+        centers, _ = two_means(player_colors, [0])
 
         # Assign the cluster centers as the representative colors for two teams
-        self.team_colors[1] = kmeans.cluster_centers_[0]
-        self.team_colors[2] = kmeans.cluster_centers_[1]
+        self.team_colors[1] = centers[0, 0]
+        self.team_colors[2] = centers[0, 1]
+
+    # Method to get the team of uniform colours, the team whose colour is nearest
+    def predict_team(self, player_colors):
+        team_colors = np.stack([self.team_colors[1], self.team_colors[2]])
+        distances = np.linalg.norm(np.asarray(player_colors)[:, None, :] - team_colors[None, :, :], axis=2)
+        return np.argmin(distances, axis=1) + 1
+
+    # Method to get the team of uniform colours that may be NaN (crops without pixels); those get team 0
+    def predict_usable_teams(self, player_colors):
+        player_colors = np.asarray(player_colors, dtype=np.float64).reshape(-1, 3)
+        usable = ~np.isnan(player_colors).any(axis=1)
+        team_ids = np.zeros(len(player_colors), dtype=np.intp)
+        team_ids[usable] = self.predict_team(player_colors[usable])
+        return team_ids
+
+    # Method to get the team ID of every player of a frame; players without a team yet are left out
+    @instrument("team_assigner.get_player_teams", frames=1)
+    def get_player_teams(self, frame, player_detections, frame_num=None):
+        if self.temporal and frame_num is not None:
+            return self.vote_player_teams(frame, player_detections, frame_num)
+
+        # Players without a team are classified together; one whose crop has no pixels (e.g. off the frame)
+        # stays unassigned and is tried again on the next frame it is seen in
+        new_ids = [player_id for player_id in player_detections if player_id not in self.player_team_dict]
+        if new_ids:
+            colors = self.get_track_colors(frame, {player_id: player_detections[player_id] for player_id in new_ids})
+            team_ids = self.predict_usable_teams([colors[player_id] for player_id in new_ids])
+            for player_id, team_id in zip(new_ids, team_ids):
+                if team_id:
+                    self.player_team_dict[player_id] = int(team_id)
+
+        return {player_id: self.player_team_dict[player_id] for player_id in player_detections
+                if player_id in self.player_team_dict}
+
+    # Method to get the team with most votes; a tie goes to the latest vote
+    def majority_vote(self, votes):
+        team_1_votes = votes.count(1)
+        team_2_votes = len(votes) - team_1_votes
+        if team_1_votes == team_2_votes:
+            return votes[-1]
+        return 1 if team_1_votes > team_2_votes else 2
+
+    # Method to update the team votes of the players of a frame within the per-frame crop budget
+    def vote_player_teams(self, frame, player_detections, frame_num):
+        # Tracks without a vote yet are always sampled
+        new_ids = [player_id for player_id in player_detections if player_id not in self.track_votes]
+
+        # Then suspected ID swaps, then the tracks whose last sample is oldest, up to the budget
+        due_ids = [player_id for player_id in player_detections if player_id in self.track_votes and
+                   (player_id in self.suspected_swaps or frame_num - self.last_sample_frame[player_id] >= self.sample_interval)]
+        due_ids.sort(key=lambda player_id: (player_id not in self.suspected_swaps, self.last_sample_frame[player_id]))
+        sampled_ids = new_ids + due_ids[:max(self.max_crops_per_frame - len(new_ids), 0)]
+
+        if sampled_ids:
+            colors, confidences = self.get_player_colors(frame, [player_detections[player_id]['bbox'] for player_id in sampled_ids])
+            team_ids = self.predict_usable_teams(colors)
+            for player_id, color, confidence, team_id in zip(sampled_ids, colors, confidences, team_ids):
+                self.last_sample_frame[player_id] = frame_num
+                if not team_id:
+                    # A crop without pixels has no colour to vote with; a new track stays unassigned until it has one
+                    continue
+                if confidence < self.min_color_confidence:
+                    # An occluded or unclear crop does not vote; a track without any team still gets this one
+                    self.player_team_dict.setdefault(player_id, int(team_id))
+                    continue
+
+                # The latest confident colour is kept, so the cache follows a swapped ID
+                self.player_color_cache[player_id] = (color, confidence)
+                votes = self.track_votes.setdefault(player_id, deque(maxlen=self.votes_per_track))
+                votes.append(int(team_id))
+                team = self.majority_vote(votes)
+                if team_id != team:
+                    self.suspected_swaps.add(player_id)
+                else:
+                    self.suspected_swaps.discard(player_id)
+                self.player_team_dict[player_id] = team
+
+        return {player_id: self.player_team_dict[player_id] for player_id in player_detections
+                if player_id in self.player_team_dict}
 
-    # Method to get the team ID for a player based on their uniform color
+    # Method to get the team ID for a player based on their uniform color; 0 while it has no team
     def get_player_team(self, frame, player_bbox, player_id):
-        # If the player ID is already assigned to a team, return the team ID
-        if player_id in self.player_team_dict:
-            return self.player_team_dict[player_id]
+        return self.get_player_teams(frame, {player_id: {"bbox": player_bbox}}).get(player_id, 0)
 
-        # Get the player's uniform color
-        player_color = self.get_player_color(frame, player_bbox)
+    # Method to assign a team and team colour to every player in every frame
+    @instrument("team_assigner.add_team_to_tracks", frames="video_frames")
+    def add_team_to_tracks(self, video_frames, tracks):
+        if isinstance(tracks, TrackStore):
+            table = tracks['players']
+            if table.size == 0:
+                return
 
-        # Predict the team ID using the KMeans model
-        team_id = self.kmeans.predict(player_color.reshape(1, -1))[0]
-        team_id += 1
+            team_colors = np.array([self.team_colors[1], self.team_colors[2]])
+            if self.temporal:
+                # The team of a track may change over time, so every row gets the team of its own frame
+                row_teams = np.zeros(table.size, dtype=np.int8)
+                for frame_num, frame_track in enumerate(table):
+                    teams = self.get_player_teams(video_frames[frame_num], frame_track, frame_num)
+                    for player_id, team in teams.items():
+                        row_teams[frame_track.rows[player_id]] = team
+                # Rows of players without a team yet (team 0) are left without one
+                rows = row_teams > 0
+                table.set_column('team', row_teams[rows], rows=rows)
+                table.set_column('team_color', team_colors[row_teams[rows] - 1], rows=rows)
+                return
 
-        # Special condition to manually set the team ID for a specific player ID (91)
-        if player_id == 91:
-            team_id = 1
+            # A track keeps its team once assigned, so it is classified on its first appearance, and on its
+            # following ones only while its crops have no pixels
+            track_ids, row_tracks = np.unique(table.track_ids[:table.size], return_inverse=True)
+            row_tracks = row_tracks.reshape(-1)
+            order = np.argsort(row_tracks, kind='stable')  # Rows of every track, in frame order
+            track_ends = np.cumsum(np.bincount(row_tracks, minlength=len(track_ids)))
+            next_rows = track_ends - np.bincount(row_tracks, minlength=len(track_ids))
+            assigned_frames = np.full(len(track_ids), -1)
+            pending = np.arange(len(track_ids))
+            while len(pending):
+                rows = order[next_rows[pending]]
+                frames = table.frames[rows]
+                for frame_num in np.unique(frames):
+                    frame_rows = rows[frames == frame_num]
+                    self.get_player_teams(video_frames[frame_num],
+                                          {int(table.track_ids[row]): {"bbox": table.get_value(row, 'bbox')} for row in frame_rows})
+                assigned = np.array([int(track_ids[track]) in self.player_team_dict for track in pending])
+                assigned_frames[pending[assigned]] = frames[assigned]
+                next_rows[pending] += 1
+                pending = pending[~assigned & (next_rows[pending] < track_ends[pending])]
+            track_teams = np.array([self.player_team_dict.get(int(track_id), 0) for track_id in track_ids])
 
-        # Store the player's team assignment
-        self.player_team_dict[player_id] = team_id
+            # Broadcast the team of each track to its rows from the frame it was assigned on
+            rows = (track_teams[row_tracks] > 0) & (table.frames[:table.size] >= assigned_frames[row_tracks])
+            table.set_column('team', track_teams[row_tracks[rows]], rows=rows)
+            table.set_column('team_color', team_colors[track_teams[row_tracks[rows]] - 1], rows=rows)
+            return
 
-        # Return the team ID
-        return team_id
+        for frame_num, player_track in enumerate(tracks['players']):
+            # Determine the team of every player of the frame
+            teams = self.get_player_teams(video_frames[frame_num], player_track, frame_num)
+            for player_id, team in teams.items():
+                # Update the player's team and team color in the track
+                tracks['players'][frame_num][player_id]['team'] = team
+                tracks['players'][frame_num][player_id]['team_color'] = self.team_colors[team]
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import sys
+sys.path.append('../')
+from team_assigner import TeamAssigner
+from track_store import TrackStore
+
+RED = (0, 0, 220)
+BLUE = (220, 0, 0)
+ON_FRAME = [10, 10, 30, 50]
+OFF_FRAME = [300, 300, 320, 340]  # Outside the 120x120 frames, so its crop has no pixels
+
+
+def make_frame(color):
+    # Green pitch with one player in a shirt of the given colour at ON_FRAME
+    frame = np.zeros((120, 120, 3), dtype=np.uint8)
+    frame[:] = (0, 160, 0)
+    frame[14:30, 14:26] = color
+    return frame
+
+
+def make_assigner(temporal):
+    team_assigner = TeamAssigner(temporal=temporal)
+    team_assigner.team_colors = {1: np.array(RED, dtype=np.float64), 2: np.array(BLUE, dtype=np.float64)}
+    return team_assigner
+
+
+@pytest.mark.parametrize("temporal", [False, True])
+def test_player_without_pixels_is_left_unassigned_and_retried(temporal):
+    team_assigner = make_assigner(temporal)
+    frame = make_frame(BLUE)
+
+    teams = team_assigner.get_player_teams(frame, {7: {"bbox": OFF_FRAME}}, 0)
+    assert teams == {}
+    assert 7 not in team_assigner.player_team_dict
+
+    # Once the player is on the frame it gets the team of its shirt, not the team 1 of a NaN colour
+    teams = team_assigner.get_player_teams(frame, {7: {"bbox": ON_FRAME}}, 1)
+    assert teams == {7: 2}
+
+
+def make_tracks():
+    # One player whose first appearance is off the frame
+    return {"players": [{7: {"bbox": OFF_FRAME}}, {7: {"bbox": ON_FRAME}}, {7: {"bbox": ON_FRAME}}]}
+
+
+@pytest.mark.parametrize("temporal", [False, True])
+def test_track_store_matches_nested_tracks(temporal):
+    frames = [make_frame(BLUE) for _ in range(3)]
+    nested = make_tracks()
+    store = TrackStore.from_tracks(make_tracks())
+
+    make_assigner(temporal).add_team_to_tracks(frames, nested)
+    make_assigner(temporal).add_team_to_tracks(frames, store)
+
+    # The frame before the track got its team has none; the later frames have team 2
+    assert 'team' not in nested["players"][0][7]
+    assert [frame[7]['team'] for frame in nested["players"][1:]] == [2, 2]
+    for nested_frame, store_frame in zip(nested["players"], store.to_tracks()["players"]):
+        assert sorted(nested_frame[7]) == sorted(store_frame[7])
+        for key in ('team', 'team_color'):
+            if key in nested_frame[7]:
+                assert np.array_equal(nested_frame[7][key], store_frame[7][key])
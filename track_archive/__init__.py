@@ -0,0 +1 @@
+from .track_archive import TrackArchive, export_tracks, load_tracks, ARCHIVE_COLUMNS
\ No newline at end of file
@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import sys
+sys.path.append('../')
+from track_store import TrackStore, ObjectTrackTable
+
+# Bump when the layout of archives changes
+ARCHIVE_VERSION = 1
+
+# Dtypes the columns are written with; coordinates and measurements only need float32
+ARCHIVE_COLUMNS = {
+    "bbox": np.float32,
+    "position": np.float32,
+    "position_adjusted": np.float32,
+    "position_transformed": np.float32,  # NaN stands for None (outside the court)
+    "team": np.int8,
+    "team_color": np.float32,
+    "speed": np.float32,
+    "distance": np.float32,
+    "has_ball": np.bool_,
+}
+
+
+def _track_id_dtype(track_ids):
+    # Track IDs are stored as int16 unless a long match produced larger IDs
+    if len(track_ids) == 0 or (track_ids.min() >= np.iinfo(np.int16).min and track_ids.max() <= np.iinfo(np.int16).max):
+        return np.int16
+    return np.int32
+
+
+def export_tracks(path, tracks, camera_movement=None, team_ball_control=None, possession_runs=None):
+    """
+    Writes tracks and per-frame results as a columnar track archive.
+
+    A path ending in ".npz" writes a single compressed file, convenient for sharing. Any other path is a
+    directory with one .npy file per column, which TrackArchive memory-maps so that opening an archive
+    costs milliseconds and frame ranges are read without touching the rest of the file.
+
+    Parameters:
+    - path (str): Archive directory, or a file path ending in ".npz".
+    - tracks (dict or TrackStore): Tracks of all object types.
+    - camera_movement (list): Optional camera movement per frame.
+    - team_ball_control (np.ndarray): Optional team in control of the ball per frame.
+    - possession_runs (np.ndarray): Optional possession runs (PlayerBallAssigner.get_possession_runs).
+    """
+    tracks = TrackStore.from_tracks(tracks)
+    arrays = {}
+    manifest = {"version": ARCHIVE_VERSION, "objects": {}, "per_frame": []}
+
+    for obj_type, table in tracks.items():
+        frames = table.frames[:table.size]
+        track_ids = table.track_ids[:table.size]
+        arrays[f"{obj_type}/frame"] = frames.astype(np.int32)
+        arrays[f"{obj_type}/track_id"] = track_ids.astype(_track_id_dtype(track_ids))
+
+        # Columns no row has are left out; a presence mask is only written for partly filled columns
+        columns, masks = [], []
+        for name, dtype in ARCHIVE_COLUMNS.items():
+            present = table.present[name][:table.size]
+            if not present.any():
+                continue
+            columns.append(name)
+            arrays[f"{obj_type}/{name}"] = table.column(name).astype(dtype)
+            if not present.all():
+                masks.append(name)
+                arrays[f"{obj_type}/{name}.present"] = present.copy()
+        manifest["objects"][obj_type] = {"num_frames": table.num_frames, "rows": int(table.size),
+                                         "columns": columns, "masks": masks}
+
+    per_frame = {
+        "camera_movement": None if camera_movement is None else np.asarray(camera_movement, dtype=np.float32).reshape(-1, 2),
+        "team_ball_control": None if team_ball_control is None else np.asarray(team_ball_control, dtype=np.int8),
+        "possession_runs": possession_runs,
+    }
+    for name, values in per_frame.items():
+        if values is not None:
+            arrays[name] = values
+            manifest["per_frame"].append(name)
+
+    if path.endswith('.npz'):
+        # Store the manifest as a plain string array, so loading never needs pickle
+        np.savez_compressed(path, manifest=np.array(json.dumps(manifest)), **arrays)
+        return
+
+    # Write into a temporary directory and swap it in, so readers never see a half-written archive
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, suffix='.tmp')
+    try:
+        for key, values in arrays.items():
+            file_path = os.path.join(tmp_dir, key + '.npy')
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            np.save(file_path, values, allow_pickle=False)
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp_dir, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+class TrackArchive:
+    def __init__(self, path, mmap=True):
+        """
+        Read access to a track archive written by export_tracks.
+
+        Directory archives are memory-mapped (unless mmap is False): only the pages of the rows that are
+        read are loaded from disk. Columns of .npz archives are decompressed on first access.
+
+        Parameters:
+        - path (str): Archive directory or .npz file.
+        - mmap (bool): Memory-map the columns of a directory archive.
+        """
+        self.path = path
+        self._arrays = {}
+        if path.endswith('.npz'):
+            self._npz = np.load(path, allow_pickle=False)
+            self.manifest = json.loads(str(self._npz['manifest']))
+        else:
+            self._npz = None
+            self.mmap_mode = 'r' if mmap else None
+            with open(os.path.join(path, 'manifest.json'), 'r') as f:
+                self.manifest = json.load(f)
+        if self.manifest["version"] != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported track archive version {self.manifest['version']}")
+
+    @property
+    def object_types(self):
+        return list(self.manifest["objects"])
+
+    @property
+    def num_frames(self):
+        return max((info["num_frames"] for info in self.manifest["objects"].values()), default=0)
+
+    def array(self, key):
+        # Load (or map) one stored array, once
+        if key not in self._arrays:
+            if self._npz is not None:
+                self._arrays[key] = self._npz[key]
+            else:
+                self._arrays[key] = np.load(os.path.join(self.path, key + '.npy'), mmap_mode=self.mmap_mode, allow_pickle=False)
+        return self._arrays[key]
+
+    def frame_rows(self, obj_type, start_frame=0, end_frame=None):
+        # Row range of the frames [start_frame, end_frame); a binary search over the frame column
+        frames = self.array(f"{obj_type}/frame")
+        end_frame = self.manifest["objects"][obj_type]["num_frames"] if end_frame is None else end_frame
+        return int(np.searchsorted(frames, start_frame)), int(np.searchsorted(frames, end_frame))
+
+    def column(self, obj_type, name, start_frame=0, end_frame=None):
+        """
+        Reads one column of an object type for a range of frames.
+
+        Parameters:
+        - obj_type (str): "players", "referees" or "ball".
+        - name (str): "frame", "track_id" or a column of ARCHIVE_COLUMNS.
+        - start_frame (int): First frame of the range.
+        - end_frame (int): End of the range (exclusive); None for the last frame.
+
+        Returns:
+        - values (np.ndarray): One value per row of the range (a view into the archive where possible).
+        """
+        start, end = self.frame_rows(obj_type, start_frame, end_frame)
+        return self.array(f"{obj_type}/{name}")[start:end]
+
+    def per_frame(self, name, start_frame=0, end_frame=None):
+        # Per-frame result ("camera_movement" or "team_ball_control") for a range of frames, None if not stored
+        if name not in self.manifest["per_frame"]:
+            return None
+        return self.array(name)[start_frame:end_frame]
+
+    def possession_runs(self):
+        return self.array("possession_runs") if "possession_runs" in self.manifest["per_frame"] else None
+
+    def to_track_store(self, start_frame=0, end_frame=None):
+        """
+        Loads the tracks of a range of frames into a TrackStore; frame numbers start at 0 at start_frame.
+        """
+        tables = {}
+        for obj_type, info in self.manifest["objects"].items():
+            last_frame = info["num_frames"] if end_frame is None else min(end_frame, info["num_frames"])
+            start, end = self.frame_rows(obj_type, start_frame, last_frame)
+            columns = {name: self.array(f"{obj_type}/{name}")[start:end] for name in info["columns"]}
+            present = {name: self.array(f"{obj_type}/{name}.present")[start:end] for name in info["masks"]}
+            tables[obj_type] = ObjectTrackTable.from_columns(
+                max(last_frame - start_frame, 0), self.array(f"{obj_type}/frame")[start:end] - start_frame,
+                self.array(f"{obj_type}/track_id")[start:end], columns, present)
+        return TrackStore(tables)
+
+
+def load_tracks(path, start_frame=0, end_frame=None):
+    # Load the tracks of a range of frames of a track archive into a TrackStore
+    return TrackArchive(path).to_track_store(start_frame, end_frame)
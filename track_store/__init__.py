@@ -0,0 +1 @@
+from .track_store import TrackStore, ObjectTrackTable, TRACK_COLUMNS
\ No newline at end of file
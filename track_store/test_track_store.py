@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import sys
+sys.path.append('../')
+from track_store import TrackStore
+
+
+def make_tracks():
+    # Nested tracks with values exact in float32, as the store keeps coordinates in float32
+    return {
+        "players": [
+            {1: {"bbox": [10.0, 20.0, 30.5, 60.25], "position": (20, 60), "team": 1,
+                 "team_color": np.array([1.0, 2.0, 3.0])},
+             4: {"bbox": [100.0, 20.0, 130.0, 80.0], "position_transformed": None, "speed": 3.5}},
+            {},
+            {4: {"bbox": [101.0, 21.0, 131.0, 81.0], "position_transformed": [1.5, 2.25], "has_ball": True,
+                 "note": "extra key"}},
+        ],
+        "ball": [{}, {1: {"bbox": [5.0, 5.0, 9.0, 9.0]}}, {}],
+    }
+
+
+def assert_same_tracks(actual, expected):
+    assert list(actual) == list(expected)
+    for obj_type in expected:
+        assert len(actual[obj_type]) == len(expected[obj_type])
+        for actual_frame, expected_frame in zip(actual[obj_type], expected[obj_type]):
+            assert list(actual_frame) == list(expected_frame)
+            for track_id, expected_info in expected_frame.items():
+                actual_info = actual_frame[track_id]
+                # Keys come in schema order rather than insertion order
+                assert sorted(actual_info) == sorted(expected_info)
+                for key, value in expected_info.items():
+                    if key == "team_color":
+                        assert np.array_equal(actual_info[key], value)
+                    else:
+                        assert actual_info[key] == value
+                        assert type(actual_info[key]) is type(value)
+
+
+def test_views_read_like_nested_tracks():
+    store = TrackStore.from_tracks(make_tracks())
+    assert_same_tracks(store, make_tracks())
+    assert_same_tracks(store.to_tracks(), make_tracks())
+
+
+def test_view_lookups_match_dict_semantics():
+    tracks = make_tracks()
+    store = TrackStore.from_tracks(make_tracks())
+
+    assert len(store["players"]) == len(tracks["players"])
+    assert [len(frame) for frame in store["players"]] == [len(frame) for frame in tracks["players"]]
+    assert 4 in store["players"][0] and 2 not in store["players"][0]
+    assert "speed" in store["players"][0][4] and "team" not in store["players"][0][4]
+    assert store["players"][0][4].get("team") is None
+    assert store["players"][-1][4]["note"] == "extra key"
+    with pytest.raises(KeyError):
+        store["players"][0][2]
+    with pytest.raises(KeyError):
+        store["players"][0][4]["team"]
+    with pytest.raises(IndexError):
+        store["players"][3]
+
+
+def test_view_writes_match_dict_semantics():
+    tracks = make_tracks()
+    store = TrackStore.from_tracks(make_tracks())
+
+    for object_tracks in (tracks, store):
+        object_tracks["players"][0][1]["speed"] = 7.0
+        object_tracks["players"][2][4]["team"] = 2
+        object_tracks["players"][0][4]["position_transformed"] = [3.0, 4.0]
+        del object_tracks["players"][0][1]["position"]
+        del object_tracks["players"][2][4]["note"]
+        object_tracks["players"][2][9] = {"bbox": [1.0, 2.0, 3.0, 4.0]}  # New track in the last frame
+        object_tracks["players"][0][4].update({"distance": 12.5})
+
+    assert_same_tracks(store, tracks)
+    # Columns follow the writes made through the views
+    assert store["players"].column("speed")[0] == 7.0
+    assert not store["players"].present["position"][0]
+
+
+def test_new_tracks_only_go_into_the_last_frame():
+    store = TrackStore.from_tracks(make_tracks())
+    with pytest.raises(KeyError):
+        store["players"][0][9] = {"bbox": [1.0, 2.0, 3.0, 4.0]}
+
+
+def test_none_clears_values_except_the_transformed_position():
+    store = TrackStore.from_tracks(make_tracks())
+    track_info = store["players"][0][1]
+
+    track_info["team"] = None
+    track_info["speed"] = None
+    track_info["position_transformed"] = None
+
+    # No int8 cast error and no NaN read back: the values are gone
+    assert "team" not in track_info and track_info.get("team") is None
+    assert "speed" not in track_info and track_info.get("speed") is None
+    # Outside the court is a stored None, as in the nested tracks
+    assert "position_transformed" in track_info and track_info["position_transformed"] is None
+    assert np.isnan(store["players"].column("position_transformed")[0]).all()
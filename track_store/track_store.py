@@ -0,0 +1,275 @@
+import numpy as np
+from collections.abc import Mapping, MutableMapping
+
+# Columns kept for every detection: name -> (shape of one value, dtype)
+# Coordinates are float32, which is the precision YOLO and OpenCV already produce them in
+TRACK_COLUMNS = {
+    "bbox": ((4,), np.float32),
+    "position": ((2,), np.float32),
+    "position_adjusted": ((2,), np.float32),
+    "position_transformed": ((2,), np.float32),  # NaN stands for None (outside the court)
+    "team": ((), np.int8),
+    "team_color": ((3,), np.float64),
+    "speed": ((), np.float64),
+    "distance": ((), np.float64),
+    "has_ball": ((), np.bool_),
+}
+
+
+class ObjectTrackTable:
+    """
+    Structure-of-arrays storage of one object type (players, referees or ball).
+
+    Every detection is a row; rows are ordered by frame and identified by (frame, track_id).
+    Each column has a matching "present" mask so the dictionary view can tell a missing key
+    apart from a stored value.
+    """
+
+    def __init__(self, num_frames=0, capacity=1024):
+        self.num_frames = num_frames
+        self.size = 0
+        self.frames = np.zeros(capacity, dtype=np.int32)
+        self.track_ids = np.zeros(capacity, dtype=np.int32)
+        self.columns = {name: np.zeros((capacity,) + shape, dtype=dtype) for name, (shape, dtype) in TRACK_COLUMNS.items()}
+        self.present = {name: np.zeros(capacity, dtype=np.bool_) for name in TRACK_COLUMNS}
+        self.extra = {}  # Keys outside the schema, stored per row: row -> {key: value}
+        self._frame_offsets = None
+
+    @classmethod
+    def from_frames(cls, object_tracks):
+        # Build a table from the nested format: a list with one {track_id: track_info} dictionary per frame
+        table = cls(capacity=max(sum(len(track) for track in object_tracks), 1))
+        for track in object_tracks:
+            table.append_frame(track)
+        return table
+
+    @classmethod
+    def from_columns(cls, num_frames, frames, track_ids, columns, present=None):
+        # Build a table from whole columns, e.g. loaded from a track archive; rows must be ordered by frame.
+        # Columns are converted to the dtypes of TRACK_COLUMNS; columns not given are absent from every row
+        size = len(frames)
+        table = cls(num_frames=num_frames, capacity=max(size, 1))
+        table.size = size
+        table.frames[:size] = frames
+        table.track_ids[:size] = track_ids
+        for name, values in columns.items():
+            table.columns[name][:size] = values
+            table.present[name][:size] = True if present is None or name not in present else present[name]
+        return table
+
+    def to_frames(self):
+        # Convert back to the nested list-of-dictionaries format
+        return [{track_id: dict(track_info) for track_id, track_info in frame.items()} for frame in self]
+
+    def _grow(self, min_capacity):
+        # Double the capacity of every column until min_capacity rows fit
+        capacity = len(self.frames)
+        if min_capacity <= capacity:
+            return
+        while capacity < min_capacity:
+            capacity *= 2
+
+        def resize(array):
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self.frames = resize(self.frames)
+        self.track_ids = resize(self.track_ids)
+        self.columns = {name: resize(column) for name, column in self.columns.items()}
+        self.present = {name: resize(mask) for name, mask in self.present.items()}
+
+    def append_frame(self, track=None):
+        # Append a new frame holding the given {track_id: track_info} dictionary
+        frame_num = self.num_frames
+        self.num_frames += 1
+        for track_id, track_info in (track or {}).items():
+            self.add_row(frame_num, track_id, track_info)
+        self._frame_offsets = None
+        return frame_num
+
+    def add_row(self, frame_num, track_id, track_info):
+        # Rows must be added in frame order, so new detections can only go into the last frame
+        if frame_num != self.num_frames - 1:
+            raise KeyError(f"New track {track_id} can only be added to the last frame ({self.num_frames - 1}), not frame {frame_num}")
+        self._grow(self.size + 1)
+        row = self.size
+        self.size += 1
+        self.frames[row] = frame_num
+        self.track_ids[row] = track_id
+        for name in TRACK_COLUMNS:
+            self.present[name][row] = False
+        for key, value in track_info.items():
+            self.set_value(row, key, value)
+        self._frame_offsets = None
+        return row
+
+    def frame_rows(self, frame_num):
+        # Return the (start, end) row range of a frame
+        if self._frame_offsets is None:
+            self._frame_offsets = np.searchsorted(self.frames[:self.size], np.arange(self.num_frames + 1))
+        return int(self._frame_offsets[frame_num]), int(self._frame_offsets[frame_num + 1])
+
+    def column(self, name):
+        # Return a writable view of a column limited to the used rows
+        return self.columns[name][:self.size]
+
+    def set_column(self, name, values, rows=slice(None)):
+        # Write values into a column (for all rows or the selected ones) and mark them as present
+        self.columns[name][:self.size][rows] = values
+        self.present[name][:self.size][rows] = True
+
+    def get_value(self, row, key):
+        # Read one value in the same Python types the nested format used
+        if key not in TRACK_COLUMNS:
+            return self.extra[row][key]
+        if not self.present[key][row]:
+            raise KeyError(key)
+
+        value = self.columns[key][row]
+        if key == "bbox":
+            return value.tolist()
+        if key in ("position", "position_adjusted"):
+            return tuple(value.tolist())
+        if key == "position_transformed":
+            return None if np.isnan(value).any() else value.tolist()
+        if key == "team_color":
+            return value.copy()
+        return value.item()
+
+    def set_value(self, row, key, value):
+        # Write one value. None is a stored value only for the transformed position (as NaN, outside the court);
+        # for any other column it clears the value, so the key reads as missing and .get() returns None
+        if key not in TRACK_COLUMNS:
+            self.extra.setdefault(row, {})[key] = value
+            return
+        if value is None:
+            if key != "position_transformed":
+                self.present[key][row] = False
+                return
+            value = np.nan
+        self.columns[key][row] = value
+        self.present[key][row] = True
+
+    def row_keys(self, row):
+        # Keys stored for a row, in schema order followed by any extra keys
+        keys = [name for name in TRACK_COLUMNS if self.present[name][row]]
+        return keys + list(self.extra.get(row, {}))
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, frame_num):
+        if isinstance(frame_num, slice):
+            return [FrameView(self, index) for index in range(*frame_num.indices(self.num_frames))]
+        if frame_num < 0:
+            frame_num += self.num_frames
+        if not 0 <= frame_num < self.num_frames:
+            raise IndexError(frame_num)
+        return FrameView(self, frame_num)
+
+    def __iter__(self):
+        for frame_num in range(self.num_frames):
+            yield FrameView(self, frame_num)
+
+
+class FrameView(MutableMapping):
+    """Dictionary view {track_id: track_info} of one frame of an ObjectTrackTable."""
+
+    def __init__(self, table, frame_num):
+        self.table = table
+        self.frame_num = frame_num
+        start, end = table.frame_rows(frame_num)
+        self.rows = dict(zip(table.track_ids[start:end].tolist(), range(start, end)))
+
+    def __getitem__(self, track_id):
+        return RowView(self.table, self.rows[track_id])
+
+    def __setitem__(self, track_id, track_info):
+        if track_id in self.rows:
+            row = self.rows[track_id]
+            for key, value in track_info.items():
+                self.table.set_value(row, key, value)
+        else:
+            self.rows[track_id] = self.table.add_row(self.frame_num, track_id, track_info)
+
+    def __delitem__(self, track_id):
+        raise TypeError("Rows cannot be removed from a TrackStore")
+
+    def __contains__(self, track_id):
+        return track_id in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class RowView(MutableMapping):
+    """Dictionary view of one detection, e.g. {"bbox": [...], "position": (...), ...}."""
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.table.get_value(self.row, key)
+
+    def __setitem__(self, key, value):
+        self.table.set_value(self.row, key, value)
+
+    def __delitem__(self, key):
+        if key in TRACK_COLUMNS:
+            self.table.present[key][self.row] = False
+        else:
+            del self.table.extra[self.row][key]
+
+    def __contains__(self, key):
+        if key in TRACK_COLUMNS:
+            return bool(self.table.present[key][self.row])
+        return key in self.table.extra.get(self.row, {})
+
+    def __iter__(self):
+        return iter(self.table.row_keys(self.row))
+
+    def __len__(self):
+        return len(self.table.row_keys(self.row))
+
+
+class TrackStore(Mapping):
+    """
+    Columnar replacement for the nested tracks dictionary.
+
+    tracks["players"][frame_num][track_id]["bbox"] keeps working through dictionary views, while
+    vectorized stages work directly on the NumPy columns of tracks.tables[obj_type].
+    """
+
+    def __init__(self, tables=None):
+        self.tables = dict(tables or {})
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        # Build a store from the nested {obj_type: [ {track_id: track_info}, ... ]} format
+        if isinstance(tracks, TrackStore):
+            return tracks
+        return cls({obj_type: ObjectTrackTable.from_frames(object_tracks) for obj_type, object_tracks in tracks.items()})
+
+    def to_tracks(self):
+        # Convert back to the nested dictionary format, e.g. for pickling
+        return {obj_type: table.to_frames() for obj_type, table in self.tables.items()}
+
+    def __getitem__(self, obj_type):
+        return self.tables[obj_type]
+
+    def __setitem__(self, obj_type, object_tracks):
+        # Accept either a table or a nested list of frames, e.g. the result of interpolate_ball_positions
+        if not isinstance(object_tracks, ObjectTrackTable):
+            object_tracks = ObjectTrackTable.from_frames(object_tracks)
+        self.tables[obj_type] = object_tracks
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def __len__(self):
+        return len(self.tables)
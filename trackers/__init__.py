@@ -1 +1,3 @@
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .inference_report import compare_inference_modes, match_detections
+from .detection_result import DetectionResult
\ No newline at end of file
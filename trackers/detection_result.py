@@ -0,0 +1,37 @@
+class _Array:
+    # Minimal stand-in for the tensors of a YOLO result: supervision reads them with .cpu().numpy()
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class DetectionBoxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = _Array(xyxy)
+        self.conf = _Array(conf)
+        self.cls = _Array(cls)
+        self.id = None
+
+
+class DetectionResult:
+    def __init__(self, xyxy, conf, cls, names):
+        """
+        Detection result of one frame built from plain arrays, shaped like a YOLO result as far as Tracker
+        and supervision read it. Used for detections that do not come from an in-process YOLO model, e.g.
+        from the model server or the benchmark's stub detector.
+
+        Parameters:
+        - xyxy (np.ndarray): Boxes, shape (N, 4), in frame coordinates.
+        - conf (np.ndarray): Confidences, shape (N,).
+        - cls (np.ndarray): Class IDs, shape (N,).
+        - names (dict): Class ID -> class name.
+        """
+        self.names = names
+        self.boxes = DetectionBoxes(xyxy, conf, cls)
+        self.obb = None
+        self.masks = None
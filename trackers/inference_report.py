@@ -0,0 +1,95 @@
+import time
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import get_iou_matrix
+
+
+def match_detections(reference, candidate, min_iou=0.5):
+    """
+    Counts the detections of a frame that two inference modes agree on.
+
+    Boxes of the same class are matched greedily, highest intersection over union first.
+
+    Parameters:
+    - reference (sv.Detections): Detections of the reference mode.
+    - candidate (sv.Detections): Detections of the mode under test.
+    - min_iou (float): Smallest intersection over union for two boxes to match.
+
+    Returns:
+    - matches (int): Number of matched box pairs.
+    """
+    matches = 0
+    for class_id in np.union1d(reference.class_id, candidate.class_id):
+        iou = get_iou_matrix(reference.xyxy[reference.class_id == class_id],
+                             candidate.xyxy[candidate.class_id == class_id])
+        pairs = sorted(zip(*np.nonzero(iou >= min_iou)), key=lambda pair: -iou[pair])
+        used_reference, used_candidate = set(), set()
+        for i, j in pairs:
+            if i in used_reference or j in used_candidate:
+                continue
+            used_reference.add(i)
+            used_candidate.add(j)
+            matches += 1
+    return matches
+
+
+def _full_resolution_imgsz(tracker, frames):
+    # YOLO input size that keeps the frames at their own resolution: the longest frame side, rounded up to
+    # the model's stride (imgsz=None would let YOLO scale them to its default 640)
+    stride = getattr(getattr(tracker.model, "model", None), "stride", None)
+    stride = 32 if stride is None else int(max(stride))
+    longest_side = max(max(frame.shape[:2]) for frame in frames)
+    return -(-longest_side // stride) * stride
+
+
+def compare_inference_modes(tracker, frames, modes, batch_size=20, min_iou=0.5):
+    """
+    Measures the throughput of several inference modes and their agreement with full-resolution inference.
+
+    Parameters:
+    - tracker (Tracker): Tracker holding the YOLO model; its inference mode is restored afterwards.
+    - frames (list): Sample frames of the deployment's videos.
+    - modes (dict): Mode name -> Tracker settings, e.g. {"640": {"imgsz": 640}, "roi": {"roi": polygon}}.
+    - batch_size (int): Number of frames sent to the YOLO model at once.
+    - min_iou (float): Smallest intersection over union for a box to count as found by both modes.
+
+    Returns:
+    - report (dict): Per mode (the reference as "full" first, with its "imgsz"): "frames_per_second",
+      "detections", "precision" and "recall" of its boxes measured against the full-resolution boxes.
+    """
+    settings = {"imgsz": tracker.imgsz, "roi": tracker.roi, "roi_margin": tracker.roi_margin}
+
+    def run_mode(mode):
+        for name, value in {"imgsz": None, "roi": None, **mode}.items():
+            setattr(tracker, name, value)
+        start = time.perf_counter()
+        detections = []
+        for i in range(0, len(frames), batch_size):
+            detections += tracker.predict(frames[i: i+batch_size])
+        seconds = time.perf_counter() - start
+        # get_frame_detections does not touch the ByteTrack state
+        return [tracker.get_frame_detections(detection)[0] for detection in detections], seconds
+
+    try:
+        full_imgsz = _full_resolution_imgsz(tracker, frames)
+        reference, reference_seconds = run_mode({"imgsz": full_imgsz})
+        reference_count = sum(len(detections) for detections in reference)
+        report = {"full": {"imgsz": full_imgsz, "frames_per_second": round(len(frames) / reference_seconds, 2),
+                           "detections": reference_count, "precision": 1.0, "recall": 1.0}}
+
+        for mode_name, mode in modes.items():
+            candidate, seconds = run_mode(mode)
+            candidate_count = sum(len(detections) for detections in candidate)
+            matches = sum(match_detections(ref, cand, min_iou) for ref, cand in zip(reference, candidate))
+            report[mode_name] = {
+                "frames_per_second": round(len(frames) / seconds, 2),
+                "detections": candidate_count,
+                "precision": round(matches / candidate_count, 4) if candidate_count else None,
+                "recall": round(matches / reference_count, 4) if reference_count else None,
+            }
+    finally:
+        for name, value in settings.items():
+            setattr(tracker, name, value)
+
+    return report
@@ -0,0 +1,49 @@
+import os
+import pytest
+import sys
+sys.path.append('../')
+from trackers import Tracker
+from result_cache import ResultCache
+from utils import read_video
+from benchmark import StubDetector, generate_synthetic_video
+
+
+class AnonymousModel:
+    # A model with YOLO's predict() that cannot say which weights it runs
+    def __init__(self):
+        self.detector = StubDetector()
+
+    def predict(self, frames, **kwargs):
+        return self.detector.predict(frames, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    video_path = str(tmp_path_factory.mktemp("video") / "clip.avi")
+    generate_synthetic_video(video_path, 320, 180, 24, 25)
+    return video_path
+
+
+def test_injected_model_with_missing_model_path_runs_and_is_cached(tmp_path, clip):
+    cache = ResultCache(str(tmp_path / "cache"))
+    tracker = Tracker(str(tmp_path / "missing.pt"), model=StubDetector())
+    frames = read_video(clip)
+
+    tracks = tracker.get_object_tracks(frames, cache=cache, video_path=clip)
+
+    assert len(tracks["players"]) == len(frames)
+    assert any(tracks["players"])
+    # The key is built from the detector's own fingerprint, not from the missing weights file
+    assert cache.get("tracks", tracker.cache_key(cache, clip)) is not None
+
+
+def test_injected_model_without_fingerprint_is_not_cached(tmp_path, clip):
+    cache = ResultCache(str(tmp_path / "cache"))
+    tracker = Tracker(str(tmp_path / "missing.pt"), model=AnonymousModel())
+    frames = read_video(clip)
+
+    tracks = tracker.get_object_tracks(frames, cache=cache, video_path=clip)
+
+    assert len(tracks["players"]) == len(frames)
+    assert tracker.cache_key(cache, clip) is None
+    assert not os.path.exists(os.path.join(str(tmp_path / "cache"), "tracks"))
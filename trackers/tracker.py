@@ -1,85 +1,347 @@
-from ultralytics import YOLO  
 import supervision as sv  
 import pickle 
+import copy
 import os 
 import cv2
-import pandas as pd
 import numpy as np
 import sys
 sys.path.append("../")
-from utils import get_center_of_bbox, get_bbox_width, get_foot_position
+from utils import get_center_of_bbox, get_bbox_width, get_foot_position, get_centers_of_bboxes, get_foot_positions, blend_rectangle
+from track_store import TrackStore
+from ball_tracker import BallTracker
+from result_cache import make_key, file_fingerprint
+from instrumentation import instrument
 
 class Tracker:
-    def __init__(self, model_path):
+    def __init__(self, model_path, imgsz=None, roi=None, roi_margin=32, model=None):
+        """
+        Detects players, referees and the ball with YOLO and tracks them with ByteTrack.
+
+        Parameters:
+        - model_path (str): Path to the YOLO model weights.
+        - imgsz (int): Input size YOLO runs at; None keeps the model's default. Smaller sizes are faster on CPU,
+          boxes are reported in frame coordinates either way.
+        - roi (np.ndarray): Optional polygon (e.g. ViewTransformer.pixel_vertices); frames are cropped to its
+          bounding rectangle before inference and the boxes are moved back to frame coordinates.
+        - roi_margin (int): Pixels added around the bounding rectangle of the region of interest.
+        - model: Optional model to use instead of loading model_path, anything with YOLO's predict() (e.g. a
+          ModelClient of the model server or the benchmark's StubDetector). Its results are cached only if it
+          has a fingerprint() method identifying the weights it runs.
+        """
         # Initialize the Tracker class with a YOLO model and a ByteTrack object
-        self.model = YOLO(model_path)  
+        self.model_path = model_path
+        # An injected model may not come from model_path; its results are only cached when it identifies itself
+        self.model_injected = model is not None
+        if model is None:
+            # Imported only when the model is loaded here, so processes using a model server skip the slow import
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+        self.model = model
         self.tracker = sv.ByteTrack() 
+        self.conf = 0.1  # Confidence threshold of the YOLO detections
 
+        # Picks the ball among the ball detections of each frame
+        self.ball_tracker = BallTracker()
+
+        # Inference mode
+        self.imgsz = imgsz
+        self.roi = roi
+        self.roi_margin = roi_margin
+
+    @instrument("tracker.add_position_to_tracks", frames="tracks")
     def add_position_to_tracks(self, tracks):
         """
         Adds the position of detected objects to the tracking information.
         Positions are determined based on the object type (ball or player/referee).
+        All detections of a frame (or of the whole clip for a TrackStore) are computed at once.
         """
         # Iterate through each type of object (e.g., players, referees, ball)
         for obj_type, object_tracks in tracks.items():
+            # Use the center of the bbox for the ball and the foot position for players/referees
+            get_positions = get_centers_of_bboxes if obj_type == 'ball' else get_foot_positions
+
+            if isinstance(tracks, TrackStore):
+                # Columnar tracks: compute the positions of every detection in the clip in one call
+                object_tracks.set_column('position', get_positions(object_tracks.column('bbox')))
+                continue
+
             # Iterate through each frame's tracks
             for frame_num, track in enumerate(object_tracks):
-                # Iterate through each track ID in the current frame
-                for track_id, track_info in track.items():
-                    bbox = track_info['bbox']  # Get bounding box for the track
-                    # Determine position based on object type
-                    if obj_type == 'ball':
-                        position = get_center_of_bbox(bbox)  # Use the center of the bbox for the ball
-                    else:
-                        position = get_foot_position(bbox)  # Use the foot position for players/referees
-                    tracks[obj_type][frame_num][track_id]['position'] = position  # Update position in tracks
-                    
-
-    def interpolate_ball_positions(self, ball_positions):
+                if not track:
+                    continue
+                # Compute the positions of all detections in the frame at once
+                positions = get_positions([track_info['bbox'] for track_info in track.values()]).tolist()
+                for track_info, position in zip(track.values(), positions):
+                    track_info['position'] = tuple(position)  # Update position in tracks
+
+    @instrument("tracker.interpolate_ball_positions", frames="ball_positions")
+    def interpolate_ball_positions(self, ball_positions, lookahead=None):
         """
         Interpolates missing ball positions to ensure continuity in the tracking data.
+
+        Gaps are filled linearly between the balls around them, frames before the first ball take the first
+        ball and frames after the last ball keep it (see BallTracker.fill_gaps_stream).
         
         Parameters:
         - ball_positions (list): List of dictionaries containing ball bounding boxes for each frame.
+        - lookahead (int): Longest gap that is interpolated; longer gaps hold the last known ball.
+          None interpolates every gap.
         
         Returns:
         - ball_positions (list): List of dictionaries with interpolated ball positions.
         """
-        ball_positions = [x.get(1, {}).get('bbox', []) for x in ball_positions]  # Extract bounding boxes
-        df_ball_positions = pd.DataFrame(ball_positions, columns=['x1', 'y1', 'x2', 'y2'])  # Create DataFrame
-
-        # Interpolate missing values
-        df_ball_positions = df_ball_positions.interpolate()  # Interpolate missing values
-        df_ball_positions = df_ball_positions.bfill()  # Backfill any remaining missing values
+        ball_bboxes = (list(x[1]['bbox']) if 1 in x else None for x in ball_positions)  # Extract bounding boxes
+        gap_filler = BallTracker(lookahead=lookahead)
+
+        # Convert back to original format; frames stay empty only if the clip has no ball at all
+        return [{1: {"bbox": bbox}} if bbox is not None else {} for bbox in gap_filler.fill_gaps_stream(ball_bboxes)]
+
+    def get_roi_rect(self, frame_shape):
+        # Bounding rectangle (x1, y1, x2, y2) of the region of interest plus its margin, clipped to the frame
+        frame_height, frame_width = frame_shape[:2]
+        polygon = np.asarray(self.roi, dtype=np.float64).reshape(-1, 2)
+        x1 = min(max(int(np.floor(polygon[:, 0].min())) - self.roi_margin, 0), frame_width - 1)
+        y1 = min(max(int(np.floor(polygon[:, 1].min())) - self.roi_margin, 0), frame_height - 1)
+        x2 = max(min(int(np.ceil(polygon[:, 0].max())) + self.roi_margin, frame_width), x1 + 1)
+        y2 = max(min(int(np.ceil(polygon[:, 1].max())) + self.roi_margin, frame_height), y1 + 1)
+        return x1, y1, x2, y2
+
+    @instrument("tracker.predict", frames="frames")
+    def predict(self, frames):
+        """
+        Runs the YOLO model on a batch of frames in the configured inference mode.
 
-        # Convert back to original format
-        ball_positions = [{1: {"bbox": x}} for x in df_ball_positions.to_numpy().tolist()]  
+        With a region of interest the model only sees the cropped frames; every result then carries the
+        crop's top-left corner as roi_offset, which get_frame_detections adds back to the boxes.
 
-        return ball_positions
+        Parameters:
+        - frames (list): Batch of video frames.
 
-    def detect_frames(self, frames):
+        Returns:
+        - detections (list): YOLO detection result per frame.
+        """
+        if isinstance(frames, np.ndarray):
+            frames = list(frames)  # A slice of cached frames is one array; YOLO expects a list of frames
+        predict_args = {"conf": self.conf}
+        if self.imgsz is not None:
+            predict_args["imgsz"] = self.imgsz  # YOLO scales the boxes back to the size of its input
+        if self.roi is None:
+            return self.model.predict(frames, **predict_args)
+
+        roi_rects = [self.get_roi_rect(frame.shape) for frame in frames]
+        crops = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for frame, (x1, y1, x2, y2) in zip(frames, roi_rects)]
+        detections = self.model.predict(crops, **predict_args)
+        for detection, roi_rect in zip(detections, roi_rects):
+            detection.roi_offset = roi_rect[:2]
+        return detections
+
+    def detect_frames(self, frames, batch_size=20):
         # Detect objects in the given frames using the YOLO model
-        batch_size = 20  
         detections = []  
         for i in range(0, len(frames), batch_size):
             # Predict detections for a batch of frames
-            detections_batch = self.model.predict(frames[i: i+batch_size], conf=0.1)
+            detections_batch = self.predict(frames[i: i+batch_size])
 
             # Append the batch detections to the overall list
-            detections = detections + detections_batch  
-        return detections  
-    
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
-        # Track objects across frames and optionally read/write tracks from/to a stub file
-        
+            detections = detections + detections_batch
+        return detections
+
+    def detect_frames_stream(self, frames, batch_size=20):
+        """
+        Detects objects in a stream of frames, holding at most one batch of frames in memory.
+
+        Parameters:
+        - frames (iterable): Iterable of video frames, e.g. the generator returned by read_video_stream.
+        - batch_size (int): Number of frames sent to the YOLO model at once.
+
+        Yields:
+        - (frame, detection): Each frame together with its YOLO detection result.
+        """
+        batch = []
+        for frame in frames:
+            batch.append(frame)
+            if len(batch) == batch_size:
+                # Predict detections for a full batch and hand them on frame by frame
+                yield from zip(batch, self.predict(batch))
+                batch = []
+
+        # Flush the last, possibly incomplete, batch
+        if batch:
+            yield from zip(batch, self.predict(batch))
+
+    def get_frame_detections(self, detection):
+        """
+        Converts a single frame's YOLO detection into supervision format, with goalkeepers counted as players.
+
+        Parameters:
+        - detection: YOLO detection result for one frame.
+
+        Returns:
+        - (detection_supervision, cls_names_inv): The supervision detections and the class name -> class ID lookup.
+        """
+        # Invert the class names dictionary for easier lookup
+        cls_names = detection.names
+        cls_names_inv = {v: k for k, v in cls_names.items()}
+
+        # Convert YOLO detections to supervision format
+        detection_supervision = sv.Detections.from_ultralytics(detection)
+
+        # Boxes detected in a region of interest are moved back to frame coordinates
+        roi_offset = getattr(detection, 'roi_offset', None)
+        if roi_offset is not None and len(detection_supervision) > 0:
+            x_offset, y_offset = roi_offset
+            detection_supervision.xyxy = detection_supervision.xyxy + np.array(
+                [x_offset, y_offset, x_offset, y_offset], dtype=detection_supervision.xyxy.dtype)
+
+        # Convert 'goalkeeper' class to 'player' class for tracking purposes
+        for object_ind, class_id in enumerate(detection_supervision.class_id):
+            if cls_names[class_id] == "goalkeeper":
+                detection_supervision.class_id[object_ind] = cls_names_inv["player"]
+
+        return detection_supervision, cls_names_inv
+
+    def track_frame_detections(self, detection_supervision, cls_names_inv, frame_step=1):
+        """
+        Updates the ByteTrack state with one frame's supervision detections and builds the frame's tracks.
+
+        Parameters:
+        - detection_supervision (sv.Detections): Detections of the frame, as returned by get_frame_detections.
+        - cls_names_inv (dict): Class name -> class ID lookup.
+        - frame_step (int): Frames since the previously tracked frame, more than 1 when frames were skipped.
+
+        Returns:
+        - frame_tracks (dict): Dictionary with "players", "referees" and "ball" track dictionaries for the frame.
+        """
+        # Update the tracker with the current frame's detections
+        detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
+
+        # Initialize empty dictionaries for the current frame's tracked objects
+        frame_tracks = {
+            "players": {},
+            "referees": {},
+            "ball": {}
+        }
+
+        # Process tracked objects
+        for frame_detection in detection_with_tracks:
+            bbox = frame_detection[0].tolist()  # Get the bounding box coordinates
+            cls_id = frame_detection[3]  # Get the class ID of the object
+            track_id = frame_detection[4]  # Get the tracking ID
+
+            # Store player tracks
+            if cls_id == cls_names_inv['player']:
+                frame_tracks["players"][track_id] = {"bbox": bbox}
+
+            # Store referee tracks
+            if cls_id == cls_names_inv['referee']:
+                frame_tracks["referees"][track_id] = {"bbox": bbox}
+
+        # Process the ball's bounding box separately: every ball detection is a candidate and the
+        # ball tracker picks the one that fits the ball's motion
+        is_ball = detection_supervision.class_id == cls_names_inv['ball']
+        ball_confidences = None if detection_supervision.confidence is None else detection_supervision.confidence[is_ball]
+        bbox = self.ball_tracker.update(detection_supervision.xyxy[is_ball], ball_confidences, frame_step)
+
+        # Store ball tracks
+        if bbox is not None:
+            frame_tracks["ball"][1] = {"bbox": bbox}
+
+        return frame_tracks
+
+    @instrument("tracker.get_frame_tracks", frames=1)
+    def get_frame_tracks(self, detection, frame_step=1):
+        """
+        Converts a single frame's YOLO detection into tracks, updating the ByteTrack state.
+
+        Parameters:
+        - detection: YOLO detection result for one frame.
+        - frame_step (int): Frames since the previously tracked frame, more than 1 when frames were skipped.
+
+        Returns:
+        - frame_tracks (dict): Dictionary with "players", "referees" and "ball" track dictionaries for the frame.
+        """
+        return self.track_frame_detections(*self.get_frame_detections(detection), frame_step=frame_step)
+
+    def reset_tracker(self):
+        # Start tracking from scratch, e.g. for an unrelated video or segment
+        self.tracker = sv.ByteTrack()
+        self.ball_tracker.reset()
+
+    def get_tracker_state(self):
+        # Snapshot of the ByteTrack state (active, lost and removed tracks, ID counters), e.g. for a checkpoint
+        return copy.deepcopy(vars(self.tracker))
+
+    def set_tracker_state(self, state):
+        # Restore a snapshot taken with get_tracker_state, so tracking continues with the same IDs
+        self.tracker.__dict__.update(copy.deepcopy(state))
+
+    def get_object_tracks_stream(self, frames, batch_size=20):
+        """
+        Tracks objects over a stream of frames without keeping the whole video in memory.
+
+        Parameters:
+        - frames (iterable): Iterable of video frames.
+        - batch_size (int): Number of frames sent to the YOLO model at once.
+
+        Yields:
+        - packet (dict): Frame packet with "frame_num", "frame" and the frame's "tracks".
+        """
+        for frame_num, (frame, detection) in enumerate(self.detect_frames_stream(frames, batch_size)):
+            yield {"frame_num": frame_num, "frame": frame, "tracks": self.get_frame_tracks(detection)}
+
+    def model_fingerprint(self, cache=None):
+        """
+        Identifies the weights detections come from: the contents of model_path when the model was loaded from
+        it, otherwise the injected model's own fingerprint(). None when an injected model cannot tell.
+        """
+        if not self.model_injected:
+            return cache.fingerprint(self.model_path) if cache is not None else file_fingerprint(self.model_path)
+        fingerprint = getattr(self.model, 'fingerprint', None)
+        return fingerprint() if callable(fingerprint) else None
+
+    def cache_key(self, cache, video_path):
+        """
+        Builds the result cache key of the tracking stage for a video.
+
+        The key covers the contents of the video and the model weights as well as the detection
+        parameters, so a new upload, retrained weights or another threshold never hit an old entry.
+        Returns None (nothing is cached) when the weights of an injected model are unknown.
+        """
+        model = self.model_fingerprint(cache)
+        if model is None:
+            return None
+        return make_key(stage="tracks",
+                        video=cache.fingerprint(video_path),
+                        model=model,
+                        conf=self.conf,
+                        imgsz=self.imgsz,
+                        roi=None if self.roi is None else np.asarray(self.roi).tolist(),
+                        roi_margin=self.roi_margin,
+                        tracker=type(self.tracker).__name__,
+                        ball_tracker=self.ball_tracker.config())
+
+    @instrument("tracker.get_object_tracks", frames="frames")
+    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None, cache=None, video_path=None):
+        # Track objects across frames and optionally read/write tracks from/to a stub file,
+        # or from/to a ResultCache keyed by the contents of video_path
+
         # Check if we should read tracks from a stub file
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
             with open(stub_path, 'rb') as f:
-                tracks = pickle.load(f) 
-            return tracks 
+                tracks = pickle.load(f)
+            return tracks
+
+        # Check if the tracks of this exact video, model and parameters are cached
+        key = None
+        if cache is not None and video_path is not None:
+            key = self.cache_key(cache, video_path)
+        if key is not None:
+            tracks = cache.get("tracks", key)
+            if tracks is not None:
+                return tracks
 
         # Get detections from frames
-        detections = self.detect_frames(frames)  
+        detections = self.detect_frames(frames)
 
         # Initialize a dictionary to store tracks for players, referees, and the ball
         tracks = {
@@ -88,55 +350,21 @@ class Tracker:
             "ball": []
         }
 
-        for frame_num, detection in enumerate(detections):
-            # Invert the class names dictionary for easier lookup
-            cls_names = detection.names
-            cls_names_inv = {v: k for k, v in cls_names.items()}
-
-            # Convert YOLO detections to supervision format
-            detection_supervision = sv.Detections.from_ultralytics(detection)
-
-            # Convert 'goalkeeper' class to 'player' class for tracking purposes
-            for object_ind, class_id in enumerate(detection_supervision.class_id):
-                if cls_names[class_id] == "goalkeeper":
-                    detection_supervision.class_id[object_ind] = cls_names_inv["player"]
-
-            # Update the tracker with the current frame's detections
-            detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
-
-            # Initialize empty dictionaries for the current frame's tracked objects
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
-
-            # Process tracked objects
-            for frame_detection in detection_with_tracks:
-                bbox = frame_detection[0].tolist()  # Get the bounding box coordinates
-                cls_id = frame_detection[3]  # Get the class ID of the object
-                track_id = frame_detection[4]  # Get the tracking ID
-
-                # Store player tracks
-                if cls_id == cls_names_inv['player']:
-                    tracks["players"][frame_num][track_id] = {"bbox": bbox}
-                
-                # Store referee tracks
-                if cls_id == cls_names_inv['referee']:
-                    tracks["referees"][frame_num][track_id] = {"bbox": bbox}
-            
-            # Process the ball's bounding box separately
-            for frame_detection in detection_supervision:
-                bbox = frame_detection[0].tolist()  # Get the bounding box coordinates
-                cls_id = frame_detection[3]  # Get the class ID of the object
-
-                # Store ball tracks
-                if cls_id == cls_names_inv['ball']:
-                    tracks["ball"][frame_num][1] = {"bbox": bbox}
+        for detection in detections:
+            # Track the objects of the current frame and append them per object type
+            frame_tracks = self.get_frame_tracks(detection)
+            for obj_type, frame_track in frame_tracks.items():
+                tracks[obj_type].append(frame_track)
 
         # Optionally save the tracks to a stub file
         if stub_path is not None:
             with open(stub_path, 'wb') as f:
                 pickle.dump(tracks, f)  # Save the tracks dictionary to a file
 
+        # Optionally store the tracks in the result cache
+        if key is not None:
+            cache.put("tracks", key, tracks)
+
         return tracks  # Return the dictionary of tracks
     
     
@@ -230,36 +458,39 @@ class Tracker:
 
         return frame
     
-    def draw_team_ball_control(self, frame, frame_num, team_ball_control):
+    def get_ball_control_percentages(self, team_ball_control):
         """
-        Draws the ball control statistics for both teams on the frame.
+        Computes the running ball control share of both teams for every frame at once.
         
         Parameters:
-        - frame (ndarray): The video frame to draw on.
-        - frame_num (int): The current frame number.
-        - team_ball_control (pd.Series): Series indicating which team had ball control in each frame.
+        - team_ball_control (ndarray): Team (1 or 2) in control of the ball in each frame.
         
         Returns:
-        - frame (ndarray): The annotated frame.
+        - ball_control (ndarray): Array of shape (N, 2) with the share of Team A and Team B
+          over frames 0..frame_num, for each frame_num (0 while no team had the ball yet).
         """
-        # Create an overlay rectangle for the text with deeper white background
-        overlay = frame.copy()
+        team_ball_control = np.asarray(team_ball_control)
 
-        # Define the rectangle's position and size (top area of the frame)
-        cv2.rectangle(overlay, (1050, 0), (1600, 100), (255, 255, 255), -1)  # Rectangle just above the text
+        # Cumulative number of frames each team had ball control, up to and including each frame
+        team_num_frames = np.stack([np.cumsum(team_ball_control == 1), np.cumsum(team_ball_control == 2)], axis=1)
+        total_frames = team_num_frames.sum(axis=1, keepdims=True)
+        return np.divide(team_num_frames, total_frames, out=np.zeros(team_num_frames.shape), where=total_frames > 0)
 
-        # Adjust the alpha value for deeper opacity
+    def draw_ball_control_percentages(self, frame, team_1, team_2):
+        """
+        Draws already computed ball control fractions for both teams on the frame.
+        
+        Parameters:
+        - frame (ndarray): The video frame to draw on.
+        - team_1 (float): Fraction of frames Team A had ball control so far.
+        - team_2 (float): Fraction of frames Team B had ball control so far.
+        
+        Returns:
+        - frame (ndarray): The annotated frame.
+        """
+        # Blend a deeper white background into the panel area only (top area of the frame)
         alpha = 0.9  # Higher alpha for a more opaque white background
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)  # Blend the overlay with the original frame
-
-        # Slice control data up to current frame
-        team_ball_control_till_frame = team_ball_control[:frame_num + 1]  
-
-        # Calculate the number of frames each team had ball control
-        team_1_num_frames = team_ball_control_till_frame[team_ball_control_till_frame == 1].shape[0]
-        team_2_num_frames = team_ball_control_till_frame[team_ball_control_till_frame == 2].shape[0]
-        team_1 = team_1_num_frames / (team_1_num_frames + team_2_num_frames)
-        team_2 = team_2_num_frames / (team_1_num_frames + team_2_num_frames)
+        blend_rectangle(frame, (1050, 0), (1600, 100), (255, 255, 255), alpha)
 
         # Display the ball control percentages on the frame
         # Using red color for Team 1 Ball Control within the white transparent rectangle
@@ -270,8 +501,40 @@ class Tracker:
 
         return frame
 
+    def draw_frame_tracks(self, frame, frame_tracks):
+        """
+        Draws the players, referees and ball of a single frame.
+        
+        Parameters:
+        - frame (ndarray): The video frame to draw on.
+        - frame_tracks (dict): Dictionary with the "players", "referees" and "ball" tracks of this frame.
+        
+        Returns:
+        - frame (ndarray): The annotated frame.
+        """
+        player_dict = frame_tracks["players"]  # Get player tracks for the current frame
+        ball_dict = frame_tracks["ball"]  # Get ball tracks for the current frame
+        referee_dict = frame_tracks["referees"]  # Get referee tracks for the current frame
+
+        # Draw Players
+        for track_id, player in player_dict.items():
+            color = player.get("team_color", (0, 255, 0))  # Get color for the player, default is red
+            frame = self.draw_ellipse(frame, player["bbox"], color, track_id)  # Draw ellipse around player
+
+            if player.get('has_ball', False):
+                frame = self.draw_triangle(frame, player["bbox"], (0, 0, 255))  # Draw triangle if player has the ball
+
+        # Draw Referee
+        for _, referee in referee_dict.items():
+            frame = self.draw_ellipse(frame, referee["bbox"], (255, 0, 0))  # Draw ellipse around referee
+
+        # Draw Ball
+        for track_id, ball in ball_dict.items():
+            frame = self.draw_triangle(frame, ball["bbox"], (0, 255, 0))  # Draw triangle around ball
+
+        return frame
     
-    
+    @instrument("tracker.draw_annotations", frames="video_frames")
     def draw_annotations(self, video_frames, tracks, team_ball_control):
         """
         Draws annotations on video frames including object tracking and ball control statistics.
@@ -279,40 +542,46 @@ class Tracker:
         Parameters:
         - video_frames (list): List of video frames (images) to annotate.
         - tracks (dict): Dictionary containing tracking information for players, referees, and ball.
-        - team_ball_control (pd.Series): Series indicating which team had ball control in each frame.
+        - team_ball_control (ndarray): Team (1 or 2) in control of the ball in each frame.
         
         Returns:
         - output_video_frames (list): List of annotated video frames.
         """
         output_video_frames = []  # List to store annotated frames
 
+        # Compute the running ball control shares once for the whole video
+        ball_control = self.get_ball_control_percentages(team_ball_control)
+
         # Process each frame
         for frame_num, frame in enumerate(video_frames):
             frame = frame.copy()  # Make a copy of the frame to draw on
 
-            player_dict = tracks["players"][frame_num]  # Get player tracks for the current frame
-            ball_dict = tracks["ball"][frame_num]  # Get ball tracks for the current frame
-            referee_dict = tracks["referees"][frame_num]  # Get referee tracks for the current frame
-
-            # Draw Players
-            for track_id, player in player_dict.items():
-                color = player.get("team_color", (0, 255, 0))  # Get color for the player, default is red
-                frame = self.draw_ellipse(frame, player["bbox"], color, track_id)  # Draw ellipse around player
-
-                if player.get('has_ball', False):
-                    frame = self.draw_triangle(frame, player["bbox"], (0, 0, 255))  # Draw triangle if player has the ball
-
-            # Draw Referee
-            for _, referee in referee_dict.items():
-                frame = self.draw_ellipse(frame, referee["bbox"], (255, 0, 0))  # Draw ellipse around referee
-
-            # Draw Ball
-            for track_id, ball in ball_dict.items():
-                frame = self.draw_triangle(frame, ball["bbox"], (0, 255, 0))  # Draw triangle around ball
+            # Draw the players, referees and ball of the current frame
+            frame_tracks = {obj_type: object_tracks[frame_num] for obj_type, object_tracks in tracks.items()}
+            frame = self.draw_frame_tracks(frame, frame_tracks)
 
             # Draw team ball control
-            frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
+            team_1, team_2 = ball_control[frame_num]
+            frame = self.draw_ball_control_percentages(frame, team_1, team_2)
 
             output_video_frames.append(frame)  # Add the annotated frame to the output list
 
-        return output_video_frames
\ No newline at end of file
+        return output_video_frames
+
+    def draw_annotations_stream(self, packets):
+        """
+        Draws object tracks and ball control statistics on a stream of frame packets.
+        
+        Parameters:
+        - packets (iterable): Frame packets with "frame", "tracks" and "ball_control" (Team A and Team B fractions).
+        
+        Yields:
+        - packet (dict): The same packet with "frame" replaced by the annotated copy.
+        """
+        for packet in packets:
+            frame = packet["frame"].copy()  # Make a copy of the frame to draw on
+            frame = self.draw_frame_tracks(frame, packet["tracks"])
+
+            team_1, team_2 = packet["ball_control"]
+            packet["frame"] = self.draw_ball_control_percentages(frame, team_1, team_2)
+            yield packet
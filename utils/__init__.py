@@ -1,2 +1,4 @@
-from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance, measure_xy_distance, get_foot_position
\ No newline at end of file
+from .video_utils import read_video, save_video, read_video_stream, save_video_stream, get_video_frame_count, get_video_fps
+from .video_writer import VideoWriter, find_ffmpeg
+from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance, measure_xy_distance, get_foot_position, get_centers_of_bboxes, get_foot_positions, get_iou_matrix
+from .drawing_utils import blend_rectangle
\ No newline at end of file
@@ -1,3 +1,5 @@
+import numpy as np
+
 # This function calculates the center point of a bounding box.
 # The bounding box is defined by its corners (x1, y1) and (x2, y2).
 # The center is found by averaging the x-coordinates and y-coordinates of the corners.
@@ -29,3 +31,30 @@ def measure_xy_distance(p1, p2):
 def get_foot_position(bbox):
     x1, y1, x2, y2 = bbox
     return int((x1 + x2) / 2), int(y2)
+
+# This function calculates the center points of many bounding boxes at once.
+# bboxes is an array of shape (N, 4); the result is an (N, 2) integer array, truncated like get_center_of_bbox.
+def get_centers_of_bboxes(bboxes):
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    centers = np.stack([(bboxes[:, 0] + bboxes[:, 2]) / 2, (bboxes[:, 1] + bboxes[:, 3]) / 2], axis=1)
+    return np.trunc(centers).astype(np.int64)
+
+# This function calculates the foot positions of many bounding boxes at once.
+# bboxes is an array of shape (N, 4); the result is an (N, 2) integer array, truncated like get_foot_position.
+def get_foot_positions(bboxes):
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    feet = np.stack([(bboxes[:, 0] + bboxes[:, 2]) / 2, bboxes[:, 3]], axis=1)
+    return np.trunc(feet).astype(np.int64)
+
+# This function calculates the intersection over union of every box in boxes_a with every box in boxes_b.
+# It returns a matrix of shape (len(boxes_a), len(boxes_b)).
+def get_iou_matrix(boxes_a, boxes_b):
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
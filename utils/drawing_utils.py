@@ -0,0 +1,16 @@
+import cv2
+import numpy as np
+
+# This function blends a filled rectangle into the frame, in place, touching only the rectangle's pixels.
+# It gives the same result as drawing the rectangle on a full copy of the frame and blending the whole frame,
+# without copying or blending the rest of the image. Corners are inclusive, like cv2.rectangle.
+def blend_rectangle(frame, top_left, bottom_right, color, alpha):
+    x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+    x2, y2 = min(bottom_right[0] + 1, frame.shape[1]), min(bottom_right[1] + 1, frame.shape[0])
+    if x1 >= x2 or y1 >= y2:
+        return frame
+    region = frame[y1:y2, x1:x2]
+    overlay = np.empty_like(region)
+    overlay[:] = color
+    frame[y1:y2, x1:x2] = cv2.addWeighted(overlay, alpha, region, 1 - alpha, 0)
+    return frame
@@ -1,23 +1,67 @@
 import cv2
+from .video_writer import VideoWriter
+
+def read_video_stream(video_path, start_frame=0, end_frame=None):
+    # Open the video file and yield its frames one at a time, so only a single decoded frame is held in memory.
+    # Optionally only the frames in [start_frame, end_frame) are yielded
+    video_capture = cv2.VideoCapture(video_path)
+    try:
+        # Skip to the first requested frame; grab() avoids converting the skipped frames
+        for _ in range(start_frame):
+            if not video_capture.grab():
+                return
+
+        frame_num = start_frame
+        while end_frame is None or frame_num < end_frame:
+            # Capture frame-by-frame from the video
+            ret, frame = video_capture.read()
+            if not ret:  # If no more frames are left to read, stop the generator
+                break
+            yield frame
+            frame_num += 1
+    finally:
+        video_capture.release()  # Release the capture even if the consumer stops early
+
+def get_video_frame_count(video_path):
+    # Number of frames reported by the container (may be approximate for some codecs)
+    video_capture = cv2.VideoCapture(video_path)
+    frame_count = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_capture.release()
+    return frame_count
 
 def read_video(video_path):
-    # Open the video file using the specified path
+    # Read every frame of the video into a list
+    return list(read_video_stream(video_path))  # Return the list of frames
+
+def get_video_fps(video_path, default=24.0):
+    # Frame rate reported by the container, or the default if it reports none
     video_capture = cv2.VideoCapture(video_path)
-    frames = []  # Initialize an empty list to store video frames
-    while True:
-        # Capture frame-by-frame from the video
-        ret, frame = video_capture.read()
-        if not ret:  # If no more frames are left to read, break the loop
-            break
-        frames.append(frame)  # Append each captured frame to the frames list
-    return frames  # Return the list of frames
+    fps = video_capture.get(cv2.CAP_PROP_FPS)
+    video_capture.release()
+    return fps if fps > 0 else default
 
-# XVID is a codec. A codec is a piece of software or hardware that compresses and decompresses digital video.
-def save_video(output_video_frames, output_video_path):
-    # Define the codec and create a VideoWriter object to save the video
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, 
-                          (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
+def save_video_stream(output_video_frames, output_video_path, fps=24):
+    # Write frames to the output video as they are produced; the writer is created from the first frame's size.
+    # MP4 paths are encoded to H.264 directly, on a background thread (see VideoWriter)
+    out = None
+    frame_count = 0
     for frame in output_video_frames:
+        if out is None:
+            if output_video_path.endswith('.mp4'):
+                out = VideoWriter(output_video_path, fps, (frame.shape[1], frame.shape[0]))
+            else:
+                # Define the codec and create a VideoWriter object to save the video
+                # XVID is a codec. A codec is a piece of software or hardware that compresses and decompresses digital video.
+                fourcc = cv2.VideoWriter_fourcc(*'XVID')
+                out = cv2.VideoWriter(output_video_path, fourcc, fps, (frame.shape[1], frame.shape[0]))
         out.write(frame)  # Write each frame to the output video file
-    out.release()  # Release the VideoWriter object to close the video file
+        frame_count += 1
+    if isinstance(out, VideoWriter):
+        out.close()  # Wait for the encoder to finish the file
+    elif out is not None:
+        out.release()  # Release the VideoWriter object to close the video file
+    return frame_count  # Return the number of frames written
+
+def save_video(output_video_frames, output_video_path, fps=24):
+    # Save a list of annotated frames as a new video file
+    save_video_stream(output_video_frames, output_video_path, fps)
@@ -0,0 +1,153 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+import sys
+sys.path.append('../')
+from instrumentation import metrics
+
+# Marker put on the frame queue when no more frames follow
+_END_OF_STREAM = object()
+
+
+def find_ffmpeg():
+    # Path of an ffmpeg executable: $FFMPEG_BINARY, ffmpeg on the PATH or the one bundled with imageio-ffmpeg
+    # (installed together with moviepy); None if there is none
+    path = os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return None
+
+
+class VideoWriter:
+    def __init__(self, output_path, fps, frame_size, crf=23, preset='veryfast', queue_depth=8):
+        """
+        Encodes frames straight to an H.264 MP4 file on a background thread, so encoding runs while the
+        next frames are rendered and no AVI to MP4 conversion is needed afterwards.
+
+        Raw BGR frames are piped into an ffmpeg subprocess (libx264, yuv420p, fast start, so browsers can play
+        the file while it downloads). Without ffmpeg, OpenCV's MP4 writer is used instead (H.264 if OpenCV
+        was built with it, MPEG-4 otherwise).
+
+        Parameters:
+        - output_path (str): Path of the MP4 file.
+        - fps (float): Frame rate of the output, normally that of the source video.
+        - frame_size (tuple): (width, height) of the frames.
+        - crf (int): x264 quality, lower is better (18 is visually lossless, 23 the x264 default).
+        - preset (str): x264 speed preset.
+        - queue_depth (int): Number of frames that may wait for the encoder before write() blocks.
+        """
+        self.output_path = output_path
+        self.fps = fps
+        self.frame_size = tuple(int(size) for size in frame_size)
+        self.frame_queue = queue.Queue(maxsize=queue_depth)
+        self.frames = 0
+        self.encode_seconds = 0.0
+        self._error = None
+        self._closed = False
+
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is not None:
+            self.backend = "ffmpeg"
+            width, height = self.frame_size
+            command = [ffmpeg, '-y', '-loglevel', 'error',
+                       '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+                       '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+                       '-movflags', '+faststart', output_path]
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.encode = self._encode_ffmpeg
+        else:
+            self.backend = "opencv"
+            self.process = None
+            for codec in ('avc1', 'mp4v'):
+                self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, self.frame_size)
+                if self.writer.isOpened():
+                    break
+            else:
+                raise RuntimeError(f"Could not open a video writer for {output_path}")
+            self.encode = self.writer.write
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _encode_ffmpeg(self, frame):
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def _run(self):
+        # Encoder thread: take frames off the queue until the end marker (or the first error)
+        while True:
+            frame = self.frame_queue.get()
+            if frame is _END_OF_STREAM:
+                break
+            if self._error is not None:
+                continue  # Keep draining the queue so write() never blocks on a failed encoder
+            start = time.perf_counter()
+            try:
+                self.encode(frame)
+            except BaseException as error:
+                self._error = error
+            seconds = time.perf_counter() - start
+            self.encode_seconds += seconds
+            if metrics.enabled:
+                metrics.record("video_writer.encode", seconds, 1)
+
+    def write(self, frame):
+        # Queue a frame for encoding; waits only while the encoder is queue_depth frames behind
+        if self._error is not None:
+            raise self._error
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            raise ValueError(f"Frame size {frame.shape[1]}x{frame.shape[0]} does not match the video size "
+                             f"{self.frame_size[0]}x{self.frame_size[1]}")
+        self.frame_queue.put(frame)
+        self.frames += 1
+        metrics.observe_queue("video_writer", self.frame_queue.qsize())
+
+    def close(self):
+        # Encode the remaining frames and finish the file
+        if self._closed:
+            return
+        self._closed = True
+        self.frame_queue.put(_END_OF_STREAM)
+        self.thread.join()
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            stderr = self.process.stderr.read().decode(errors='replace')
+            if self.process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed to encode {self.output_path}: {stderr.strip()}")
+        else:
+            self.writer.release()
+        if self._error is not None:
+            raise self._error
+
+    def report(self):
+        # Frames written and the time the encoder thread spent encoding them
+        return {
+            "backend": self.backend,
+            "frames": self.frames,
+            "encode_seconds": round(self.encode_seconds, 4),
+            "frames_per_second": round(self.frames / self.encode_seconds, 2) if self.encode_seconds > 0 else None,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # On an error in the producer, still stop the encoder thread and the subprocess
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,100 @@
+import numpy as np
+import cv2
+import pytest
+import sys
+sys.path.append('../')
+from view_transformer import ViewTransformer
+from camera_movement_estimator import CameraMovementEstimator
+from trackers import Tracker
+from track_store import TrackStore
+from utils import get_center_of_bbox, get_foot_position
+from benchmark import StubDetector
+
+
+def make_tracks(num_frames=20, seed=0):
+    # Fixed synthetic tracks over a 1920x1080 frame, including feet on two court corners
+    rng = np.random.default_rng(seed)
+    tracks = {"players": [], "referees": [], "ball": []}
+    for frame_num in range(num_frames):
+        players = {}
+        for track_id in range(1, 1 + int(rng.integers(0, 16))):
+            x1, y1 = rng.uniform(0, 1800), rng.uniform(0, 980)
+            players[track_id] = {"bbox": [x1, y1, x1 + rng.uniform(10, 120), y1 + rng.uniform(20, 100)]}
+        players[100] = {"bbox": [90.0, 935.0, 130.0, 1035.0]}  # Foot on the (110, 1035) corner
+        players[101] = {"bbox": [890.0, 160.0, 930.0, 260.0]}  # Foot on the (910, 260) corner
+        tracks["players"].append(players)
+        tracks["referees"].append({200: {"bbox": [1000.0, 500.0, 1040.5, 600.7]}})
+        tracks["ball"].append({1: {"bbox": [500.2, 600.9, 520.6, 620.1]}} if frame_num % 3 else {})
+    return tracks
+
+
+def make_camera_movement(num_frames=20, seed=1):
+    # Quarter pixels are exact in float32 as in float64, so both precisions give the same adjusted positions
+    rng = np.random.default_rng(seed)
+    return (np.round(rng.uniform(-30, 30, size=(num_frames, 2)) * 4) / 4).tolist()
+
+
+def per_frame_loop(tracks, camera_movement_per_frame, view_transformer):
+    # The per-detection loops the vectorized stages replaced
+    for obj_type, object_tracks in tracks.items():
+        for frame_num, track in enumerate(object_tracks):
+            for track_info in track.values():
+                bbox = track_info['bbox']
+                position = get_center_of_bbox(bbox) if obj_type == 'ball' else get_foot_position(bbox)
+                track_info['position'] = position
+
+                camera_movement = camera_movement_per_frame[frame_num]
+                position_adjusted = (position[0] - camera_movement[0], position[1] - camera_movement[1])
+                track_info['position_adjusted'] = position_adjusted
+
+                position_transformed = view_transformer.transform_point(np.array(position_adjusted))
+                if position_transformed is not None:
+                    position_transformed = position_transformed.squeeze().tolist()
+                track_info['position_transformed'] = position_transformed
+    return tracks
+
+
+def vectorized_stages(tracks, camera_movement_per_frame, view_transformer):
+    tracker = Tracker("missing.pt", model=StubDetector())
+    tracker.add_position_to_tracks(tracks)
+    camera_movement_estimator = CameraMovementEstimator(np.zeros((1080, 1920, 3), dtype=np.uint8))
+    camera_movement_estimator.add_adjust_positions_to_tracks(tracks, camera_movement_per_frame)
+    view_transformer.add_transformed_position_to_tracks(tracks)
+    return tracks
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_vectorized_stages_match_per_frame_loop(columnar):
+    view_transformer = ViewTransformer()
+    camera_movement_per_frame = make_camera_movement()
+    tracks = make_tracks()
+    if columnar:
+        # A TrackStore keeps coordinates in float32, so the loop gets the boxes as the store holds them
+        tracks = TrackStore.from_tracks(tracks)
+        expected = per_frame_loop(tracks.to_tracks(), camera_movement_per_frame, view_transformer)
+    else:
+        expected = per_frame_loop(make_tracks(), camera_movement_per_frame, view_transformer)
+
+    tracks = vectorized_stages(tracks, camera_movement_per_frame, view_transformer)
+    if columnar:
+        tracks = tracks.to_tracks()
+
+    assert tracks == expected
+    # The synthetic set covers positions both inside and outside the court
+    transformed = [track_info['position_transformed'] for frame in expected["players"] for track_info in frame.values()]
+    assert any(position is None for position in transformed) and any(position is not None for position in transformed)
+
+
+def test_points_inside_court_matches_point_polygon_test():
+    view_transformer = ViewTransformer()
+    vertices = view_transformer.pixel_vertices
+    # Every vertex with its neighbours, points along every edge and a coarse grid over the frame
+    points = [vertex + offset for vertex in vertices for offset in np.mgrid[-2:3, -2:3].reshape(2, -1).T]
+    for start, end in zip(vertices, np.roll(vertices, -1, axis=0)):
+        points += [start + (end - start) * t for t in np.linspace(0, 1, 41)]
+    points += list(np.mgrid[0:1920:37, 0:1080:29].reshape(2, -1).T)
+    points = np.array(points, dtype=np.float64)
+
+    expected = [cv2.pointPolygonTest(vertices, (int(x), int(y)), False) >= 0 for x, y in points]
+    assert view_transformer.points_inside_court(points).tolist() == expected
+
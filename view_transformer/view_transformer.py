@@ -1,5 +1,9 @@
-import numpy as np  
-import cv2 
+import numpy as np
+import cv2
+import sys
+sys.path.append('../')
+from track_store import TrackStore
+from instrumentation import instrument
 
 class ViewTransformer():
     def __init__(self):
@@ -7,11 +11,11 @@ class ViewTransformer():
         court_length = 23.32  # Define the length of the court in the real world (meters)
 
         # Define the pixel coordinates of the four vertices on the video frame (the court corners)
-        self.pixel_vertices = np.array([[110, 1035], 
-                                        [265, 275], 
-                                        [910, 260], 
+        self.pixel_vertices = np.array([[110, 1035],
+                                        [265, 275],
+                                        [910, 260],
                                         [1640, 915]])
-        
+
         # Define the corresponding real-world coordinates (target vertices) for the four corners of the court
         self.target_vertices = np.array([
             [0, court_width],  # Bottom-left corner in the real world
@@ -31,7 +35,7 @@ class ViewTransformer():
     def transform_point(self, point):
         p = (int(point[0]), int(point[1]))  # Convert the point to integer format for OpenCV functions
         # Check if the point lies inside the polygon formed by pixel vertices (court boundaries)
-        is_inside = cv2.pointPolygonTest(self.pixel_vertices, p, False) >= 0 
+        is_inside = cv2.pointPolygonTest(self.pixel_vertices, p, False) >= 0
         if not is_inside:  # If the point is outside the polygon, return None
             return None
 
@@ -41,20 +45,81 @@ class ViewTransformer():
         tranform_point = cv2.perspectiveTransform(reshaped_point, self.persepctive_trasnformer)
         return tranform_point.reshape(-1, 2)  # Reshape the transformed point back to a 2D format
 
+    # Test many points against the court polygon at once
+    def points_inside_court(self, points):
+        """
+        Vectorized version of cv2.pointPolygonTest(self.pixel_vertices, point, False) >= 0.
+        Points are truncated to integers first, as in transform_point, and points on an edge count as inside.
+
+        Parameters:
+        - points (ndarray): Array of shape (N, 2) with pixel coordinates.
+
+        Returns:
+        - is_inside (ndarray): Boolean array of shape (N,).
+        """
+        points = np.trunc(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        x, y = points[:, 0:1], points[:, 1:2]
+
+        # Edges of the polygon, each from the previous vertex v0 to the vertex v (same order as OpenCV)
+        vertices = self.pixel_vertices.astype(np.float64)
+        v0 = np.roll(vertices, 1, axis=0)
+        v0x, v0y = v0[:, 0], v0[:, 1]
+        vx, vy = vertices[:, 0], vertices[:, 1]
+
+        # Edges that cannot be crossed by a ray going right from the point
+        skip = ((v0y <= y) & (vy <= y)) | ((v0y > y) & (vy > y)) | ((v0x < x) & (vx < x))
+        # A skipped edge can still contain the point as its end vertex or as a horizontal segment
+        on_skipped_edge = skip & (y == vy) & ((x == vx) | ((y == v0y) & (((v0x <= x) & (x <= vx)) | ((vx <= x) & (x <= v0x)))))
+
+        # Side of the point relative to each remaining edge; zero means the point lies on the edge
+        dist = (y - v0y) * (vx - v0x) - (x - v0x) * (vy - v0y)
+        on_crossed_edge = ~skip & (dist == 0)
+        dist = np.where(vy < v0y, -dist, dist)
+        crossings = np.sum(~skip & (dist > 0), axis=1)
+
+        on_edge = np.any(on_skipped_edge | on_crossed_edge, axis=1)
+        return on_edge | (crossings % 2 == 1)
+
+    # Transform many points from pixel space to real-world coordinates at once
+    def transform_points(self, points):
+        """
+        Transforms an array of points with a single perspectiveTransform call.
+
+        Parameters:
+        - points (ndarray): Array of shape (N, 2) with pixel coordinates.
+
+        Returns:
+        - transformed_points (ndarray): Float32 array of shape (N, 2); rows outside the court are NaN.
+        """
+        points = np.asarray(points).reshape(-1, 2)
+        transformed_points = np.full(points.shape, np.nan, dtype=np.float32)
+        is_inside = self.points_inside_court(points)
+        if is_inside.any():
+            # Apply the perspective transformation to all points inside the court
+            reshaped_points = points[is_inside].reshape(-1, 1, 2).astype(np.float32)
+            transformed_points[is_inside] = cv2.perspectiveTransform(reshaped_points, self.persepctive_trasnformer).reshape(-1, 2)
+        return transformed_points
 
     # Transform the adjusted positions of tracked objects to real-world coordinates
+    @instrument("view_transformer.add_transformed_position_to_tracks", frames="tracks")
     def add_transformed_position_to_tracks(self, tracks):
 
         # Loop through each tracked object
         for object, object_tracks in tracks.items():
+            if isinstance(tracks, TrackStore):
+                # Columnar tracks: transform every adjusted position in the clip in one call
+                object_tracks.set_column('position_transformed', self.transform_points(object_tracks.column('position_adjusted')))
+                continue
+
             for frame_num, track in enumerate(object_tracks):
-                # Loop through each track ID and its associated position
-                for track_id, track_info in track.items():
-                    position = track_info['position_adjusted']  # Get the adjusted position of the object
-                    position = np.array(position)  # Convert the position to a NumPy array
-                    # Transform the position to real-world coordinates
-                    position_transformed = self.transform_point(position)
-                    if position_transformed is not None:  # If transformation is successful
-                        position_transformed = position_transformed.squeeze().tolist()  # Flatten and convert to list
-                    # Add the transformed position to the track
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_transformed
\ No newline at end of file
+                if not track:
+                    continue
+                # Transform the adjusted positions of all objects in the frame to real-world coordinates
+                positions = np.array([track_info['position_adjusted'] for track_info in track.values()])
+                positions_transformed = self.transform_points(positions)
+                for track_info, position_transformed in zip(track.values(), positions_transformed):
+                    # Add the transformed position to the track, None if it lies outside the court
+                    if np.isnan(position_transformed).any():
+                        track_info['position_transformed'] = None
+                    else:
+                        track_info['position_transformed'] = position_transformed.tolist()